@@ -1,19 +1,23 @@
+import argparse
+import csv
 import sys
+import os
+import pathlib
+import re
 import sqlite3
 import xml.etree.ElementTree as ET
 import json
 import logging
-
-from PyQt6.QtCore import Qt
-from PyQt6.QtWidgets import (
-    QApplication, QMainWindow, QWidget, QVBoxLayout, QPushButton, QFileDialog,
-    QMessageBox, QTabWidget, QLabel, QTableWidget, QTableWidgetItem, QDialog, QTextEdit,
-    QScrollArea
-)
-import cartopy.crs as ccrs
-import cartopy.feature as cfeature
-from matplotlib.figure import Figure  
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+import hashlib
+import math
+import io
+import multiprocessing
+import operator
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
 
 
 # Logging setup
@@ -30,671 +34,2997 @@ def is_number(value, allow_float=True):
         return True
     except (ValueError, TypeError):
         return False
-class MplCanvas(FigureCanvas):
-    def __init__(self, parent=None, width=5, height=4, dpi=100):
-        self.fig = Figure(figsize=(width, height), dpi=dpi) 
-        self.axes = self.fig.add_subplot(111)
-        super().__init__(self.fig)
 
-class DatabaseApp(QMainWindow):
-    def __init__(self):
-        super().__init__()
-        self.setWindowTitle("Database Management System")
-        self.setGeometry(400, 250, 500, 300)
-        
-        # connect to DataBase
-        self.conn = sqlite3.connect('project.db')
-        self.cursor = self.conn.cursor()
-        self.create_tables()
-
-        # tabs
-        self.tabs = QTabWidget(self)
-        self.setCentralWidget(self.tabs)
-
-        # upload tab
-        upload_tab = QWidget()
-        upload_layout = QVBoxLayout()
-        upload_layout.addWidget(QLabel("Upload your data files here:"))
-        btn_xml = QPushButton("Upload XML")
-        btn_xml.clicked.connect(self.upload_xml)
-        btn_json = QPushButton("Upload JSON")
-        btn_json.clicked.connect(self.upload_json)
-        upload_layout.addSpacing(10)
-        upload_layout.addWidget(btn_xml)
-        upload_layout.addWidget(btn_json)
-        upload_layout.addStretch()
-        upload_tab.setLayout(upload_layout)
-        self.tabs.addTab(upload_tab, "Upload Files")
-
-        # view tab
-        views_tab = QWidget()
-        views_layout = QVBoxLayout()
-        views_layout.addWidget(QLabel("View pre-defined data summaries:"))
-        btn_view1 = QPushButton("Show Facilities by State")
-        btn_view1.clicked.connect(lambda: self.show_view('FacilitiesByState', ['State', 'FacilityCount']))
-        btn_view2 = QPushButton("Show Avg Salary by Job")
-        btn_view2.clicked.connect(lambda: self.show_view('View_AvgSalaryByJob', ['Job Title', 'Avg Salary', 'Employee Count']))
-        btn_view3 = QPushButton("Show Programs by Interest Type")
-        btn_view3.clicked.connect(lambda: self.show_view('CountProgramsByInterestType', ['Interest Type ID', 'Program Count', 'Program Common Name']))
-        views_layout.addSpacing(10)
-        views_layout.addWidget(btn_view1)
-        views_layout.addWidget(btn_view2)
-        views_layout.addWidget(btn_view3)
-        views_layout.addStretch()
-        views_tab.setLayout(views_layout)
-        self.tabs.addTab(views_tab, "Views")
-
-        # SQL tab
-        sql_tab = QWidget()
-        sql_layout = QVBoxLayout()
-        sql_layout.addWidget(QLabel("Run custom SQL queries:"))
-        self.sql_entry = QTextEdit()
-        sql_layout.addWidget(self.sql_entry)
-        btn_run = QPushButton("Run Query")
-        btn_run.clicked.connect(self.run_sql_query)
-        sql_layout.addSpacing(10)
-        sql_layout.addWidget(btn_run)
-        sql_layout.addStretch()
-        sql_tab.setLayout(sql_layout)
-        self.tabs.addTab(sql_tab, "SQL Query")
-        
-        vis_tab = QWidget()
-        vis_layout = QVBoxLayout()
-        vis_layout.addWidget(QLabel("Visualize data:"))
-        btn_chart2 = QPushButton("Avg Salary by Job Title")
-        btn_chart2.clicked.connect(self.plot_avg_salary_by_job)
-        btn_chart3 = QPushButton("Employees by Gender")
-        btn_chart3.clicked.connect(self.plot_gender_distribution)
-        btn_programs = QPushButton("Programs by InterestType")
-        btn_programs.clicked.connect(self.plot_programs_by_interest)
-        btn_avg_exp_by_dept = QPushButton("Avg Experience by Department")
-        btn_avg_exp_by_dept.clicked.connect(self.plot_avg_experience_by_department)
-        btn_facilities_per_state = QPushButton("Facilities per State (Bar)")
-        btn_facilities_per_state.clicked.connect(self.plot_facilities_per_state)
-        btn_employee_dept_pie = QPushButton("Employee Dept Distribution (Pie)")
-        btn_employee_dept_pie.clicked.connect(self.plot_employee_dept_pie)
-        btn_employee_job_pie = QPushButton("Employee job Distribution (Pie)")
-        btn_employee_job_pie.clicked.connect(self.plot_employee_job_pie)
-        btn_age_histogram = QPushButton("Age Distribution (Histogram)")
-        btn_age_histogram.clicked.connect(self.plot_age_histogram)
-        btn_salary_vs_exp_line = QPushButton("Salary vs Experience (Line)")
-        btn_salary_vs_exp_line.clicked.connect(self.plot_salary_vs_exp_line)
-        btn_facilities_map = QPushButton("Facilities on Map")
-        btn_facilities_map.clicked.connect(self.plot_facilities_scatter)
-        
-        
-        vis_layout.addSpacing(10)
-        vis_layout.addWidget(btn_chart2)
-        vis_layout.addWidget(btn_chart3)
-        vis_layout.addWidget(btn_programs)
-        vis_layout.addWidget(btn_avg_exp_by_dept)        
-        vis_layout.addWidget(btn_facilities_per_state)
-        vis_layout.addWidget(btn_employee_dept_pie)
-        vis_layout.addWidget(btn_employee_job_pie)
-        vis_layout.addWidget(btn_age_histogram)
-        vis_layout.addWidget(btn_salary_vs_exp_line)
-        vis_layout.addWidget(btn_facilities_map)
-        vis_layout.addStretch()
-        vis_tab.setLayout(vis_layout)
-        self.tabs.addTab(vis_tab, "Visualization")
-
-
-        # help
-        
-
-    def create_tables(self):
-        # Table Facilities
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Facilities (
-                registry_id TEXT PRIMARY KEY,
-                facility_site_name TEXT,
-                location_address_text TEXT,
-                electronic_address TEXT,
-                electronic_address_typename TEXT
-            )
-        ''')
-        # Table Coordinates
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Coordinates (
-                registry_id TEXT PRIMARY KEY,
-                latitude_measure REAL,
-                longitude_measure REAL,
-                horizontal_coordinate_reference_system_datum_name TEXT,
-                horizontal_collection_method_name TEXT
-            )
-        ''')
-        # Table Locations
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Locations (
-                registry_id TEXT PRIMARY KEY,
-                location_zip_code TEXT,
-                locality_name TEXT,
-                location_address_state_code TEXT
-            )
-        ''')
-        # Table ProgramAttributes
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS ProgramAttributes (
-                interest_type_id TEXT PRIMARY KEY,
-                program_common_name TEXT,
-                program_acronym_name TEXT,
-                program_description TEXT,
-                electronic_address TEXT,
-                electronic_address_typename TEXT,
-                FOREIGN KEY (interest_type_id) REFERENCES ProgramInterestTypes (interest_type_id)
-            )
-        ''')
-        # Table Programs
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Programs (
-                program_identifier TEXT,
-                program_full_name TEXT,
-                interest_type_id TEXT,
-                PRIMARY KEY (program_identifier, program_full_name),
-                FOREIGN KEY (interest_type_id) REFERENCES ProgramInterestTypes (interest_type_id)
-            )
-        ''')
-        # Table FacilityPrograms
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS FacilityPrograms (
-                registry_id TEXT,
-                program_identifier TEXT,
-                program_full_name TEXT,
-                PRIMARY KEY (registry_id, program_identifier, program_full_name),
-                FOREIGN KEY (registry_id) REFERENCES Facilities (registry_id),
-                FOREIGN KEY (program_identifier, program_full_name) REFERENCES Programs (program_identifier, program_full_name)
-            )
-        ''')
-        # Table JobTitles
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS JobTitles (
-                job_title TEXT PRIMARY KEY,
-                department TEXT
-            )
-        ''')
-        # Table Employees
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Employees (
-                id INTEGER PRIMARY KEY,
-                first_name TEXT,
-                last_name TEXT,
-                email TEXT,
-                phone TEXT,
-                gender TEXT,
-                age INTEGER,
-                job_title TEXT,
-                years_of_experience INTEGER,
-                salary REAL,
-                FOREIGN KEY (job_title) REFERENCES JobTitles(job_title)
-            )
-        ''')
-        self.conn.commit()
-
-        # Create Views
-
-        # View FacilitiesByState
-        self.cursor.execute('''
-            CREATE VIEW IF NOT EXISTS FacilitiesByState AS
-            SELECT 
-                l.location_address_state_code AS State,
-                COUNT(f.registry_id) AS FacilityCount
-            FROM Locations l
-            JOIN Facilities f ON l.registry_id = f.registry_id
-            WHERE l.location_address_state_code IS NOT NULL
-            GROUP BY l.location_address_state_code
-            ORDER BY FacilityCount DESC
-        ''')
-        # View View_AvgSalaryByJob
-        self.cursor.execute('''
-            CREATE VIEW IF NOT EXISTS View_AvgSalaryByJob AS
-            SELECT job_title,
-                   AVG(salary) AS avg_salary,
-                   COUNT(*) AS employee_count
-            FROM Employees
-            GROUP BY job_title
-        ''')
-        # View CountProgramsByInterestType
-        self.cursor.execute('''
-            CREATE VIEW IF NOT EXISTS CountProgramsByInterestType AS
-            SELECT 
-                interest_type_id,
-                COUNT(program_identifier) AS ProgramCount
-            FROM Programs 
-     
-            GROUP BY interest_type_id
-            ORDER BY ProgramCount DESC
-        ''')
-        self.conn.commit()
-
-    def upload_xml(self):
-        file_path, _ = QFileDialog.getOpenFileName(self, "Open XML", "", "XML Files (*.xml)")
-        if not file_path:
+
+# Secondary indexes for the joins and group-bys of the built-in views and charts
+SECONDARY_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_employees_job_title_salary ON Employees (job_title, salary)",
+    "CREATE INDEX IF NOT EXISTS idx_employees_job_title_years_of_experience ON Employees (job_title, years_of_experience)",
+    "CREATE INDEX IF NOT EXISTS idx_jobtitles_department_job_title ON JobTitles (department, job_title)",
+    "CREATE INDEX IF NOT EXISTS idx_locations_location_address_state_code_registry_id ON Locations (location_address_state_code, registry_id)",
+    "CREATE INDEX IF NOT EXISTS idx_programs_interest_type_id_program_identifier ON Programs (interest_type_id, program_identifier)",
+    "CREATE INDEX IF NOT EXISTS idx_coordinates_grid_cell ON Coordinates (grid_cell, latitude_measure, longitude_measure)",
+]
+
+# Facilities map grid: cells of GRID_CELL_DEGREES numbered row by row from the south-west corner
+GRID_CELL_DEGREES = 0.05
+GRID_COLUMNS = int(360 / GRID_CELL_DEGREES)
+GRID_CELL_SQL = (f"CAST((latitude_measure + 90) / {GRID_CELL_DEGREES} AS INTEGER) * {GRID_COLUMNS}"
+                 f" + CAST((longitude_measure + 180) / {GRID_CELL_DEGREES} AS INTEGER)")
+
+
+def create_schema(conn):
+    cursor = conn.cursor()
+    # Table Facilities
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Facilities (
+            registry_id TEXT PRIMARY KEY,
+            facility_site_name TEXT,
+            location_address_text TEXT,
+            electronic_address TEXT,
+            electronic_address_typename TEXT
+        )
+    ''')
+    # Table Coordinates
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Coordinates (
+            registry_id TEXT PRIMARY KEY,
+            latitude_measure REAL,
+            longitude_measure REAL,
+            horizontal_coordinate_reference_system_datum_name TEXT,
+            horizontal_collection_method_name TEXT
+        )
+    ''')
+    # Spatial grid cell of each facility, computed by SQLite (added to databases created before it existed)
+    if 'grid_cell' not in [row[1] for row in cursor.execute("PRAGMA table_xinfo(Coordinates)")]:
+        cursor.execute(f"ALTER TABLE Coordinates ADD COLUMN grid_cell INTEGER GENERATED ALWAYS AS ({GRID_CELL_SQL}) VIRTUAL")
+    # Table Locations
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Locations (
+            registry_id TEXT PRIMARY KEY,
+            location_zip_code TEXT,
+            locality_name TEXT,
+            location_address_state_code TEXT
+        )
+    ''')
+    # Table ProgramAttributes
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ProgramAttributes (
+            interest_type_id TEXT PRIMARY KEY,
+            program_common_name TEXT,
+            program_acronym_name TEXT,
+            program_description TEXT,
+            electronic_address TEXT,
+            electronic_address_typename TEXT,
+            FOREIGN KEY (interest_type_id) REFERENCES ProgramInterestTypes (interest_type_id)
+        )
+    ''')
+    # Table Programs
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Programs (
+            program_identifier TEXT,
+            program_full_name TEXT,
+            interest_type_id TEXT,
+            PRIMARY KEY (program_identifier, program_full_name),
+            FOREIGN KEY (interest_type_id) REFERENCES ProgramInterestTypes (interest_type_id)
+        )
+    ''')
+    # Table FacilityPrograms
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS FacilityPrograms (
+            registry_id TEXT,
+            program_identifier TEXT,
+            program_full_name TEXT,
+            PRIMARY KEY (registry_id, program_identifier, program_full_name),
+            FOREIGN KEY (registry_id) REFERENCES Facilities (registry_id),
+            FOREIGN KEY (program_identifier, program_full_name) REFERENCES Programs (program_identifier, program_full_name)
+        )
+    ''')
+    # Table JobTitles
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS JobTitles (
+            job_title TEXT PRIMARY KEY,
+            department TEXT
+        )
+    ''')
+    # Table Employees
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Employees (
+            id INTEGER PRIMARY KEY,
+            first_name TEXT,
+            last_name TEXT,
+            email TEXT,
+            phone TEXT,
+            gender TEXT,
+            age INTEGER,
+            job_title TEXT,
+            years_of_experience INTEGER,
+            salary REAL,
+            FOREIGN KEY (job_title) REFERENCES JobTitles(job_title)
+        )
+    ''')
+    # Table ImportHashes (content hash per imported record, for incremental imports)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ImportHashes (
+            entity TEXT,
+            key TEXT,
+            hash TEXT,
+            deleted INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (entity, key)
+        )
+    ''')
+    # Table SlowQueries (profiles of queries over the slow-query threshold)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS SlowQueries (
+            id INTEGER PRIMARY KEY,
+            query TEXT NOT NULL,
+            recorded TEXT NOT NULL,
+            seconds REAL NOT NULL,
+            rows INTEGER,
+            vm_steps INTEGER,
+            plan TEXT
+        )
+    ''')
+    # Table QueryLog (queries run from the SQL tab, input for the index advisor)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS QueryLog (
+            query TEXT PRIMARY KEY,
+            runs INTEGER NOT NULL DEFAULT 0,
+            last_run TEXT
+        )
+    ''')
+    for sql in SECONDARY_INDEXES:
+        cursor.execute(sql)
+    create_spatial_index(conn)
+    create_search_index(conn)
+    if summaries_enabled(conn):
+        create_summary_triggers(conn)
+    conn.commit()
+
+    # Create Views
+
+    # View FacilitiesByState
+    cursor.execute('''
+        CREATE VIEW IF NOT EXISTS FacilitiesByState AS
+        SELECT 
+            l.location_address_state_code AS State,
+            COUNT(f.registry_id) AS FacilityCount
+        FROM Locations l
+        JOIN Facilities f ON l.registry_id = f.registry_id
+        WHERE l.location_address_state_code IS NOT NULL
+        GROUP BY l.location_address_state_code
+        ORDER BY FacilityCount DESC
+    ''')
+    # View View_AvgSalaryByJob
+    cursor.execute('''
+        CREATE VIEW IF NOT EXISTS View_AvgSalaryByJob AS
+        SELECT job_title,
+               AVG(salary) AS avg_salary,
+               COUNT(*) AS employee_count
+        FROM Employees
+        GROUP BY job_title
+    ''')
+    # View CountProgramsByInterestType
+    cursor.execute('''
+        CREATE VIEW IF NOT EXISTS CountProgramsByInterestType AS
+        SELECT 
+            interest_type_id,
+            COUNT(program_identifier) AS ProgramCount
+        FROM Programs 
+ 
+        GROUP BY interest_type_id
+        ORDER BY ProgramCount DESC
+    ''')
+    conn.commit()
+
+
+# Materialized summaries
+# Optional tables holding the aggregates of the predefined views, kept current
+# by triggers on the base tables. Employees and Programs keep running sums and
+# counts per group; FacilitiesByState counts Locations rows that have a matching
+# facility, like the view's join.
+SUMMARY_TABLES = {
+    'FacilitiesByState_Summary': '''
+        CREATE TABLE IF NOT EXISTS FacilitiesByState_Summary (
+            State TEXT PRIMARY KEY,
+            FacilityCount INTEGER NOT NULL
+        )
+    ''',
+    'AvgSalaryByJob_Summary': '''
+        CREATE TABLE IF NOT EXISTS AvgSalaryByJob_Summary (
+            job_title TEXT PRIMARY KEY,
+            salary_sum REAL NOT NULL,
+            salary_count INTEGER NOT NULL,
+            employee_count INTEGER NOT NULL
+        )
+    ''',
+    'ProgramsByInterestType_Summary': '''
+        CREATE TABLE IF NOT EXISTS ProgramsByInterestType_Summary (
+            interest_type_id TEXT PRIMARY KEY,
+            ProgramCount INTEGER NOT NULL,
+            row_count INTEGER NOT NULL
+        )
+    ''',
+}
+
+SUMMARY_TRIGGERS = [
+    # FacilitiesByState
+    '''
+    CREATE TRIGGER IF NOT EXISTS summary_locations_insert AFTER INSERT ON Locations
+    WHEN NEW.location_address_state_code IS NOT NULL
+        AND EXISTS (SELECT 1 FROM Facilities WHERE registry_id = NEW.registry_id)
+    BEGIN
+        INSERT INTO FacilitiesByState_Summary (State, FacilityCount)
+        SELECT NEW.location_address_state_code, 0
+        WHERE NOT EXISTS (SELECT 1 FROM FacilitiesByState_Summary WHERE State = NEW.location_address_state_code);
+        UPDATE FacilitiesByState_Summary SET FacilityCount = FacilityCount + 1 WHERE State = NEW.location_address_state_code;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS summary_locations_delete AFTER DELETE ON Locations
+    WHEN OLD.location_address_state_code IS NOT NULL
+        AND EXISTS (SELECT 1 FROM Facilities WHERE registry_id = OLD.registry_id)
+    BEGIN
+        UPDATE FacilitiesByState_Summary SET FacilityCount = FacilityCount - 1 WHERE State = OLD.location_address_state_code;
+        DELETE FROM FacilitiesByState_Summary WHERE State = OLD.location_address_state_code AND FacilityCount <= 0;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS summary_locations_update AFTER UPDATE OF registry_id, location_address_state_code ON Locations
+    BEGIN
+        UPDATE FacilitiesByState_Summary SET FacilityCount = FacilityCount - 1
+        WHERE State = OLD.location_address_state_code
+            AND EXISTS (SELECT 1 FROM Facilities WHERE registry_id = OLD.registry_id);
+        DELETE FROM FacilitiesByState_Summary WHERE State = OLD.location_address_state_code AND FacilityCount <= 0;
+        INSERT INTO FacilitiesByState_Summary (State, FacilityCount)
+        SELECT NEW.location_address_state_code, 0
+        WHERE NEW.location_address_state_code IS NOT NULL
+            AND EXISTS (SELECT 1 FROM Facilities WHERE registry_id = NEW.registry_id)
+            AND NOT EXISTS (SELECT 1 FROM FacilitiesByState_Summary WHERE State = NEW.location_address_state_code);
+        UPDATE FacilitiesByState_Summary SET FacilityCount = FacilityCount + 1
+        WHERE State = NEW.location_address_state_code
+            AND EXISTS (SELECT 1 FROM Facilities WHERE registry_id = NEW.registry_id);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS summary_facilities_insert AFTER INSERT ON Facilities
+    BEGIN
+        INSERT INTO FacilitiesByState_Summary (State, FacilityCount)
+        SELECT l.location_address_state_code, 0 FROM Locations l
+        WHERE l.registry_id = NEW.registry_id AND l.location_address_state_code IS NOT NULL
+            AND NOT EXISTS (SELECT 1 FROM FacilitiesByState_Summary WHERE State = l.location_address_state_code);
+        UPDATE FacilitiesByState_Summary SET FacilityCount = FacilityCount + 1
+        WHERE State = (SELECT location_address_state_code FROM Locations WHERE registry_id = NEW.registry_id);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS summary_facilities_delete AFTER DELETE ON Facilities
+    BEGIN
+        UPDATE FacilitiesByState_Summary SET FacilityCount = FacilityCount - 1
+        WHERE State = (SELECT location_address_state_code FROM Locations WHERE registry_id = OLD.registry_id);
+        DELETE FROM FacilitiesByState_Summary WHERE FacilityCount <= 0;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS summary_facilities_update AFTER UPDATE OF registry_id ON Facilities
+    BEGIN
+        UPDATE FacilitiesByState_Summary SET FacilityCount = FacilityCount - 1
+        WHERE State = (SELECT location_address_state_code FROM Locations WHERE registry_id = OLD.registry_id);
+        INSERT INTO FacilitiesByState_Summary (State, FacilityCount)
+        SELECT l.location_address_state_code, 0 FROM Locations l
+        WHERE l.registry_id = NEW.registry_id AND l.location_address_state_code IS NOT NULL
+            AND NOT EXISTS (SELECT 1 FROM FacilitiesByState_Summary WHERE State = l.location_address_state_code);
+        UPDATE FacilitiesByState_Summary SET FacilityCount = FacilityCount + 1
+        WHERE State = (SELECT location_address_state_code FROM Locations WHERE registry_id = NEW.registry_id);
+        DELETE FROM FacilitiesByState_Summary WHERE FacilityCount <= 0;
+    END
+    ''',
+    # View_AvgSalaryByJob; job_title may be NULL, hence IS comparisons
+    '''
+    CREATE TRIGGER IF NOT EXISTS summary_employees_insert AFTER INSERT ON Employees
+    BEGIN
+        INSERT INTO AvgSalaryByJob_Summary (job_title, salary_sum, salary_count, employee_count)
+        SELECT NEW.job_title, 0, 0, 0
+        WHERE NOT EXISTS (SELECT 1 FROM AvgSalaryByJob_Summary WHERE job_title IS NEW.job_title);
+        UPDATE AvgSalaryByJob_Summary
+        SET salary_sum = salary_sum + IFNULL(NEW.salary, 0),
+            salary_count = salary_count + (NEW.salary IS NOT NULL),
+            employee_count = employee_count + 1
+        WHERE job_title IS NEW.job_title;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS summary_employees_delete AFTER DELETE ON Employees
+    BEGIN
+        UPDATE AvgSalaryByJob_Summary
+        SET salary_sum = salary_sum - IFNULL(OLD.salary, 0),
+            salary_count = salary_count - (OLD.salary IS NOT NULL),
+            employee_count = employee_count - 1
+        WHERE job_title IS OLD.job_title;
+        DELETE FROM AvgSalaryByJob_Summary WHERE job_title IS OLD.job_title AND employee_count <= 0;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS summary_employees_update AFTER UPDATE OF job_title, salary ON Employees
+    BEGIN
+        UPDATE AvgSalaryByJob_Summary
+        SET salary_sum = salary_sum - IFNULL(OLD.salary, 0),
+            salary_count = salary_count - (OLD.salary IS NOT NULL),
+            employee_count = employee_count - 1
+        WHERE job_title IS OLD.job_title;
+        DELETE FROM AvgSalaryByJob_Summary WHERE job_title IS OLD.job_title AND employee_count <= 0;
+        INSERT INTO AvgSalaryByJob_Summary (job_title, salary_sum, salary_count, employee_count)
+        SELECT NEW.job_title, 0, 0, 0
+        WHERE NOT EXISTS (SELECT 1 FROM AvgSalaryByJob_Summary WHERE job_title IS NEW.job_title);
+        UPDATE AvgSalaryByJob_Summary
+        SET salary_sum = salary_sum + IFNULL(NEW.salary, 0),
+            salary_count = salary_count + (NEW.salary IS NOT NULL),
+            employee_count = employee_count + 1
+        WHERE job_title IS NEW.job_title;
+    END
+    ''',
+    # CountProgramsByInterestType; COUNT(program_identifier) skips NULLs
+    '''
+    CREATE TRIGGER IF NOT EXISTS summary_programs_insert AFTER INSERT ON Programs
+    BEGIN
+        INSERT INTO ProgramsByInterestType_Summary (interest_type_id, ProgramCount, row_count)
+        SELECT NEW.interest_type_id, 0, 0
+        WHERE NOT EXISTS (SELECT 1 FROM ProgramsByInterestType_Summary WHERE interest_type_id IS NEW.interest_type_id);
+        UPDATE ProgramsByInterestType_Summary
+        SET ProgramCount = ProgramCount + (NEW.program_identifier IS NOT NULL), row_count = row_count + 1
+        WHERE interest_type_id IS NEW.interest_type_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS summary_programs_delete AFTER DELETE ON Programs
+    BEGIN
+        UPDATE ProgramsByInterestType_Summary
+        SET ProgramCount = ProgramCount - (OLD.program_identifier IS NOT NULL), row_count = row_count - 1
+        WHERE interest_type_id IS OLD.interest_type_id;
+        DELETE FROM ProgramsByInterestType_Summary WHERE interest_type_id IS OLD.interest_type_id AND row_count <= 0;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS summary_programs_update AFTER UPDATE OF interest_type_id, program_identifier ON Programs
+    BEGIN
+        UPDATE ProgramsByInterestType_Summary
+        SET ProgramCount = ProgramCount - (OLD.program_identifier IS NOT NULL), row_count = row_count - 1
+        WHERE interest_type_id IS OLD.interest_type_id;
+        DELETE FROM ProgramsByInterestType_Summary WHERE interest_type_id IS OLD.interest_type_id AND row_count <= 0;
+        INSERT INTO ProgramsByInterestType_Summary (interest_type_id, ProgramCount, row_count)
+        SELECT NEW.interest_type_id, 0, 0
+        WHERE NOT EXISTS (SELECT 1 FROM ProgramsByInterestType_Summary WHERE interest_type_id IS NEW.interest_type_id);
+        UPDATE ProgramsByInterestType_Summary
+        SET ProgramCount = ProgramCount + (NEW.program_identifier IS NOT NULL), row_count = row_count + 1
+        WHERE interest_type_id IS NEW.interest_type_id;
+    END
+    ''',
+]
+
+SUMMARY_REBUILD = {
+    'FacilitiesByState_Summary': '''
+        INSERT INTO FacilitiesByState_Summary (State, FacilityCount)
+        SELECT State, FacilityCount FROM FacilitiesByState
+    ''',
+    'AvgSalaryByJob_Summary': '''
+        INSERT INTO AvgSalaryByJob_Summary (job_title, salary_sum, salary_count, employee_count)
+        SELECT job_title, IFNULL(SUM(salary), 0), COUNT(salary), COUNT(*) FROM Employees GROUP BY job_title
+    ''',
+    'ProgramsByInterestType_Summary': '''
+        INSERT INTO ProgramsByInterestType_Summary (interest_type_id, ProgramCount, row_count)
+        SELECT interest_type_id, COUNT(program_identifier), COUNT(*) FROM Programs GROUP BY interest_type_id
+    ''',
+}
+
+# Same columns and order as the views they stand in for
+SUMMARY_QUERIES = {
+    'FacilitiesByState': "SELECT State, FacilityCount FROM FacilitiesByState_Summary ORDER BY FacilityCount DESC",
+    'View_AvgSalaryByJob': "SELECT job_title, salary_sum / salary_count AS avg_salary, employee_count FROM AvgSalaryByJob_Summary ORDER BY job_title",
+    'CountProgramsByInterestType': "SELECT interest_type_id, ProgramCount FROM ProgramsByInterestType_Summary ORDER BY ProgramCount DESC",
+}
+
+# Base tables each summary is derived from, through the triggers
+SUMMARY_SOURCES = {
+    'FacilitiesByState_Summary': ('Locations', 'Facilities'),
+    'AvgSalaryByJob_Summary': ('Employees',),
+    'ProgramsByInterestType_Summary': ('Programs',),
+}
+
+
+def summaries_enabled(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'FacilitiesByState_Summary'").fetchone() is not None
+
+
+def rebuild_summaries(conn):
+    for table, sql in SUMMARY_REBUILD.items():
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(sql)
+    conn.commit()
+
+
+def drop_summary_triggers(conn):
+    for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'summary\\_%' ESCAPE '\\'").fetchall():
+        conn.execute(f"DROP TRIGGER {name}")
+
+
+def create_summary_triggers(conn):
+    # Replaces any existing ones, so a database keeps up with SUMMARY_TRIGGERS
+    drop_summary_triggers(conn)
+    for sql in SUMMARY_TRIGGERS:
+        conn.execute(sql)
+
+
+def enable_summaries(conn):
+    for sql in SUMMARY_TABLES.values():
+        conn.execute(sql)
+    create_summary_triggers(conn)
+    rebuild_summaries(conn)
+
+
+def disable_summaries(conn):
+    drop_summary_triggers(conn)
+    for table in SUMMARY_TABLES:
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.commit()
+
+
+def view_query(view_name, materialized=False):
+    if materialized:
+        return SUMMARY_QUERIES[view_name]
+    return f"SELECT * FROM {view_name}"
+
+
+# Chart queries (Facilities per State and Avg Salary by Job read the views)
+CHART_QUERIES = {
+    'employee_dept_pie': "SELECT department, COUNT(*) FROM Employees e JOIN JobTitles j ON e.job_title = j.job_title GROUP BY department",
+    'employee_job_pie': "SELECT job_title, COUNT(*) FROM Employees GROUP BY job_title",
+    'age_histogram': "SELECT age, COUNT(*) FROM Employees WHERE age IS NOT NULL GROUP BY age",
+    'salary_vs_exp_line': "SELECT years_of_experience, AVG(salary) FROM Employees WHERE years_of_experience IS NOT NULL AND salary IS NOT NULL group by years_of_experience",
+    # departments as numbers (their position in 'departments') so the rows load as numeric arrays
+    'salary_by_department': """
+        WITH departments AS (
+            SELECT department, ROW_NUMBER() OVER (ORDER BY department) - 1 AS code
+            FROM (SELECT DISTINCT department FROM JobTitles WHERE department IS NOT NULL)
+        )
+        SELECT d.code, e.salary
+        FROM Employees e
+        JOIN JobTitles j ON e.job_title = j.job_title
+        JOIN departments d ON d.department = j.department
+        WHERE e.salary IS NOT NULL
+    """,
+    'departments': "SELECT DISTINCT department FROM JobTitles WHERE department IS NOT NULL ORDER BY department",
+    'salary_by_experience': "SELECT years_of_experience, salary FROM Employees WHERE years_of_experience IS NOT NULL AND salary IS NOT NULL",
+    'gender_distribution': "SELECT gender, COUNT(*) FROM Employees GROUP BY gender",
+    'programs_by_interest': "SELECT interest_type_id, COUNT(*) FROM Programs GROUP BY interest_type_id",
+    'avg_experience_by_department': """
+        SELECT j.department, AVG(e.years_of_experience)
+        FROM Employees e
+        JOIN JobTitles j ON e.job_title = j.job_title
+        GROUP BY j.department
+    """,
+}
+
+
+# XML ingest
+XML_BATCH_SIZE = 10000
+
+# Declarative mapping of a FacilitySite element to table rows: each table's
+# columns in insert order, with the path of their value below FacilitySite
+# ('@name' for one of its attributes). As with find(), only the first child
+# with a tag counts. XML_CONVERTERS turns the text of a path into its column
+# value and raises ValueError for text that cannot be; the facility is then
+# skipped. A new EPA field is one more column here (and in the schema).
+XML_MAPPING = {
+    'Facilities': {
+        'registry_id': '@registryId',
+        'facility_site_name': 'FacilitySiteName',
+        'location_address_text': 'LocationAddressText',
+        'electronic_address': 'GeneralProfileElectronicAddress/ElectronicAddressText',
+        'electronic_address_typename': 'GeneralProfileElectronicAddress/ElectronicAddressTypeName',
+    },
+    'Coordinates': {
+        'registry_id': '@registryId',
+        'latitude_measure': 'LatitudeMeasure',
+        'longitude_measure': 'LongitudeMeasure',
+        'horizontal_coordinate_reference_system_datum_name': 'HorizontalCoordinateReferenceSystemDatumName',
+        'horizontal_collection_method_name': 'HorizontalCollectionMethodName',
+    },
+    'Locations': {
+        'registry_id': '@registryId',
+        'location_zip_code': 'LocationZIPCode',
+        'locality_name': 'LocalityName',
+        'location_address_state_code': 'LocationAddressStateCode',
+    },
+    'Programs': {
+        'program_identifier': 'Program/ProgramIdentifier',
+        'program_full_name': 'Program/ProgramFullName',
+        'interest_type_id': 'Program/ProgramInterestType',
+    },
+    'ProgramAttributes': {
+        'interest_type_id': 'Program/ProgramInterestType',
+        'program_common_name': 'Program/ProgramCommonName',
+        'program_acronym_name': 'Program/ProgramAcronymName',
+        'program_description': 'Program/ProgramDescription',
+        'electronic_address': 'Program/ProgramProfileElectronicAddress/ElectronicAddressText',
+        'electronic_address_typename': 'Program/ProgramProfileElectronicAddress/ElectronicAddressTypeName',
+    },
+    'FacilityPrograms': {
+        'registry_id': '@registryId',
+        'program_identifier': 'Program/ProgramIdentifier',
+        'program_full_name': 'Program/ProgramFullName',
+    },
+}
+XML_CONVERTERS = {
+    'LatitudeMeasure': lambda text: float(text) if text else None,
+    'LongitudeMeasure': lambda text: float(text) if text else None,
+    'Program/ProgramInterestType': lambda text: text or None,
+}
+# The program tables only get rows from a facility's first Program, if it has
+# a ProgramIdentifier; Programs and ProgramAttributes once per XML_PROGRAM_KEY
+XML_PROGRAM = 'Program'
+XML_PROGRAM_KEY = ('Program/ProgramIdentifier', 'Program/ProgramFullName')
+XML_PROGRAM_TABLES = ('Programs', 'ProgramAttributes')
+XML_LINK_TABLES = ('FacilityPrograms',)
+
+XML_INSERT_SQL = {table: f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+                  for table, columns in XML_MAPPING.items()}
+
+
+class XmlExtractor:
+    # XML_MAPPING as a tree of dispatch dicts, one per element with mapped
+    # children, that extract walks visiting each child element once. Every path
+    # gets a slot in a flat list of values; a dispatch dict maps a child's tag to
+    # (slot, dispatch dict of its own children), None for a value. Children are
+    # visited last to first, so the first child with a tag is the one kept. A
+    # nested element marks its slot True, so the absence of e.g. Program can be
+    # told apart from an empty one. Rows are picked from the slots with one
+    # itemgetter per table.
+    def __init__(self, mapping, converters=None):
+        self.slots = {}
+        self.attributes = []
+        self.dispatch = {}
+        for columns in mapping.values():
+            for path in columns.values():
+                self.add_path(path)
+        for path in converters or {}:
+            if path not in self.slots:
+                raise ValueError(f"converter for unmapped path {path}")
+        self.converters = [(self.slots[path], path, convert) for path, convert in (converters or {}).items()]
+        self.getters = {}
+        for table, columns in mapping.items():
+            slots = [self.slots[path] for path in columns.values()]
+            getter = operator.itemgetter(*slots)
+            # itemgetter of one item returns it bare
+            self.getters[table] = getter if len(slots) > 1 else (lambda values, getter=getter: (getter(values),))
+
+    def slot(self, path):
+        if path not in self.slots:
+            self.slots[path] = len(self.slots)
+        return self.slots[path]
+
+    def add_path(self, path):
+        if path.startswith('@'):
+            if path not in self.slots:
+                self.attributes.append((path[1:], self.slot(path)))
             return
-        try:
-            program_interest_types = {}
-            facilities = []
-            coordinates = []
-            locations = []
-            programs = []
-            program_attributes = []
-            facility_programs = []
-            processed_programs = {}
-            parser = ET.XMLParser(encoding='utf-8')
-            tree = ET.parse(file_path, parser=parser)
-            root = tree.getroot()
-            facility_sites = root.findall('.//FacilitySite')
-            logging.debug(f"Found {len(facility_sites)} FacilitySite elements")
-            for facility in facility_sites:
+        tags = path.split('/')
+        dispatch = self.dispatch
+        for depth, tag in enumerate(tags[:-1], 1):
+            if tag not in dispatch:
+                dispatch[tag] = (self.slot('/'.join(tags[:depth])), {})
+            elif dispatch[tag][1] is None:
+                raise ValueError(f"{'/'.join(tags[:depth])} is mapped as a value and as an element")
+            dispatch = dispatch[tag][1]
+        if dispatch.get(tags[-1], (None, None))[1] is not None:
+            raise ValueError(f"{path} is mapped as a value and as an element")
+        dispatch[tags[-1]] = (self.slot(path), None)
+
+    def visit(self, element, dispatch, values):
+        nested = None
+        for child in reversed(element):
+            target = dispatch.get(child.tag)
+            if target is None:
+                continue
+            slot, children = target
+            if children is None:
+                values[slot] = child.text
+            else:
+                if nested is None:
+                    nested = {}
+                nested[slot] = child, children
+        if nested:
+            for slot, (child, children) in nested.items():
+                values[slot] = True
+                self.visit(child, children, values)
+
+    def extract(self, element):
+        # Returns the values of every slot, None where the path is absent; raises
+        # ValueError naming the path whose text its converter rejected
+        values = [None] * len(self.slots)
+        for name, slot in self.attributes:
+            values[slot] = element.get(name)
+        self.visit(element, self.dispatch, values)
+        for slot, path, convert in self.converters:
+            if values[slot] is not None:
                 try:
-                    registry_id = facility.get('registryId')
-                    if not registry_id:
-                        logging.error("Missing facility_id (registryId) in XML record.")
-                        continue
-                    logging.debug(f"Processing facility with registryId={registry_id}")
-                    lat_text = facility.find('LatitudeMeasure').text if facility.find('LatitudeMeasure') is not None else None
-                    lon_text = facility.find('LongitudeMeasure').text if facility.find('LongitudeMeasure') is not None else None
-                    if lat_text and not is_number(lat_text, allow_float=True):
-                        logging.error(f"Invalid latitude for registryId={registry_id}")
-                        continue
-                    if lon_text and not is_number(lon_text, allow_float=True):
-                        logging.error(f"Invalid longitude for registryId={registry_id}")
-                        continue
-                    facility_addr = facility.find('GeneralProfileElectronicAddress')
-                    electronicfacility_text = facility_addr.find('ElectronicAddressText').text if facility_addr is not None and facility_addr.find('ElectronicAddressText') is not None else None
-                    electronicfacility_type = facility_addr.find('ElectronicAddressTypeName').text if facility_addr is not None and facility_addr.find('ElectronicAddressTypeName') is not None else None
-                    facilities.append((registry_id, facility.find('FacilitySiteName').text if facility.find('FacilitySiteName') is not None else None, facility.find('LocationAddressText').text if facility.find('LocationAddressText') is not None else None, electronicfacility_text, electronicfacility_type))
-                    coordinates.append((registry_id, float(lat_text) if lat_text else None, float(lon_text) if lon_text else None, facility.find('HorizontalCoordinateReferenceSystemDatumName').text if facility.find('HorizontalCoordinateReferenceSystemDatumName') is not None else None, facility.find('HorizontalCollectionMethodName').text if facility.find('HorizontalCollectionMethodName') is not None else None))
-                    locations.append((registry_id, facility.find('LocationZIPCode').text if facility.find('LocationZIPCode') is not None else None, facility.find('LocalityName').text if facility.find('LocalityName') is not None else None, facility.find('LocationAddressStateCode').text if facility.find('LocationAddressStateCode') is not None else None))
-                    program = facility.find('Program' )
-                    if program is not None:
-                        program_identifier = program.find('ProgramIdentifier').text if program.find('ProgramIdentifier' ) is not None else None
-                        if program_identifier is None:
-                            logging.error(f"Missing program_identifier for registryId={registry_id}")
-                            continue
-                        program_full_name = program.find('ProgramFullName' ).text if program.find('ProgramFullName' ) is not None else None
-                        program_key = (program_identifier, program_full_name)
-                        if program_key not in processed_programs:
-                            program_interest = program.find('ProgramInterestType' )
-                            interest_type_id = None
-                            if program_interest is not None and program_interest.text:
-                                if program_interest.text not in program_interest_types:
-                                    program_interest_types[program_interest.text] = program_interest.text
-                                interest_type_id = program_interest_types[program_interest.text]
-                            programs.append((program_identifier, program_full_name, interest_type_id))
-                            profile_addr = program.find('ProgramProfileElectronicAddress' )
-                            electronic_text = profile_addr.find('ElectronicAddressText' ).text if profile_addr is not None and profile_addr.find('ElectronicAddressText' ) is not None else None
-                            electronic_type = profile_addr.find('ElectronicAddressTypeName' ).text if profile_addr is not None and profile_addr.find('ElectronicAddressTypeName' ) is not None else None
-                            program_attributes.append((interest_type_id, program.find('ProgramCommonName' ).text if program.find('ProgramCommonName' ) is not None else None, program.find('ProgramAcronymName' ).text if program.find('ProgramAcronymName' ) is not None else None, program.find('ProgramDescription' ).text if program.find('ProgramDescription' ) is not None else None, electronic_text, electronic_type))
-                            processed_programs[program_key] = None
-                        facility_programs.append((registry_id, program_identifier, program_full_name))
-                except Exception as e:
-                    logging.error(f"Error processing facility registryId={registry_id}: {str(e)}")
-                    continue
-            logging.debug(f"Facilities to insert: {len(facilities)}")
-            logging.debug(f"Coordinates to insert: {len(coordinates)}")
-            logging.debug(f"Locations to insert: {len(locations)}")
-            logging.debug(f"Programs to insert: {len(programs)}")
-            logging.debug(f"ProgramAttributes to insert: {len(program_attributes)}")
-            logging.debug(f"FacilityPrograms to insert: {len(facility_programs)}")
-            try:
-                # self.cursor.execute('BEGIN TRANSACTION')
-                self.cursor.executemany("INSERT OR IGNORE INTO Facilities (registry_id, facility_site_name, location_address_text, electronic_address, electronic_address_typename) VALUES (?, ?, ?, ?, ?)", facilities)
-                self.cursor.executemany("INSERT OR IGNORE INTO Coordinates (registry_id, latitude_measure, longitude_measure, horizontal_coordinate_reference_system_datum_name, horizontal_collection_method_name) VALUES (?, ?, ?, ?, ?)", coordinates)
-                self.cursor.executemany("INSERT OR IGNORE INTO Locations (registry_id, location_zip_code, locality_name, location_address_state_code) VALUES (?, ?, ?, ?)", locations)
-                self.cursor.executemany("INSERT OR IGNORE INTO Programs (program_identifier, program_full_name, interest_type_id) VALUES (?, ?, ?)", programs)
-                self.cursor.executemany("INSERT OR IGNORE INTO ProgramAttributes (interest_type_id, program_common_name, program_acronym_name, program_description, electronic_address, electronic_address_typename) VALUES (?, ?, ?, ?, ?, ?)", program_attributes)
-                self.cursor.executemany("INSERT OR IGNORE INTO FacilityPrograms (registry_id, program_identifier, program_full_name) VALUES (?, ?, ?)", facility_programs)
-                self.conn.commit()
-            except sqlite3.Error as e:
-                print(f"Database error occurred: {e}")
-                # self.conn.rollback()
-            except Exception as e:
-                print(f"An error occurred: {e}")
-                # self.conn.rollback()
-            QMessageBox.information(self, "Success", "XML file processed successfully!", QMessageBox.Icon.Information)
-        except Exception as e:
-            logging.error(f"Error processing XML: {str(e)}")
-            QMessageBox.critical(self, "Error", f"Error processing XML: {str(e)}", QMessageBox.Icon.Critical)
-
-    def upload_json(self):
-        file_path, _ = QFileDialog.getOpenFileName(self, "Open JSON", "", "JSON Files (*.json)")
-        if not file_path:
+                    values[slot] = convert(values[slot])
+                except ValueError:
+                    raise ValueError(f"Invalid {path}") from None
+        return values
+
+
+XML_EXTRACTOR = XmlExtractor(XML_MAPPING, XML_CONVERTERS)
+# (table, row getter) by when the rows are added
+XML_FACILITY_ROWS = [(table, getter) for table, getter in XML_EXTRACTOR.getters.items()
+                     if table not in XML_PROGRAM_TABLES + XML_LINK_TABLES]
+XML_PROGRAM_ROWS = [(table, XML_EXTRACTOR.getters[table]) for table in XML_PROGRAM_TABLES]
+XML_LINK_ROWS = [(table, XML_EXTRACTOR.getters[table]) for table in XML_LINK_TABLES]
+XML_PROGRAM_SLOT = XML_EXTRACTOR.slots[XML_PROGRAM]
+XML_PROGRAM_KEY_GETTER = operator.itemgetter(*[XML_EXTRACTOR.slots[path] for path in XML_PROGRAM_KEY])
+
+
+def new_xml_rows():
+    return {table: [] for table in XML_INSERT_SQL}
+
+
+def parse_facility_site(facility, rows, processed_programs):
+    # Appends the rows of one FacilitySite element to `rows`
+    registry_id = facility.get('registryId')
+    try:
+        if not registry_id:
+            logging.error("Missing facility_id (registryId) in XML record.")
             return
         try:
-            job_titles = set()
-            employees = []
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            for employee in data:
-                try:
-                    emp_id = employee.get('id')
-                    if emp_id is None:
-                        logging.error("Missing id in JSON record.")
-                        continue
-                    if not is_number(employee.get('age'), allow_float=False):
-                        logging.error(f"Invalid age for employee id={emp_id}")
-                        continue
-                    if not is_number(employee.get('salary'), allow_float=True):
-                        logging.error(f"Invalid salary for employee id={emp_id}")
-                        continue
-                    job_titles.add((employee['job_title'], employee['department']))
-                    employees.append((
-                        employee['id'],
-                        employee['first_name'],
-                        employee['last_name'],
-                        employee['email'],
-                        employee['phone'],
-                        employee['gender'],
-                        int(employee.get('age')),
-                        employee['job_title'],
-                        employee['years_of_experience'],
-                        float(employee.get('salary'))
-                    ))
-                except KeyError as e:
-                    logging.error(f"Missing key {e} in JSON employee record with id={employee.get('id')}")
-                    continue
+            values = XML_EXTRACTOR.extract(facility)
+        except ValueError as e:
+            logging.error(f"{e} for registryId={registry_id}")
+            return
+        for table, row in XML_FACILITY_ROWS:
+            rows[table].append(row(values))
+        if values[XML_PROGRAM_SLOT] is None:
+            return
+        program_key = XML_PROGRAM_KEY_GETTER(values)
+        if program_key[0] is None:
+            logging.error(f"Missing program_identifier for registryId={registry_id}")
+            return
+        if program_key not in processed_programs:
+            for table, row in XML_PROGRAM_ROWS:
+                rows[table].append(row(values))
+            processed_programs[program_key] = None
+        for table, row in XML_LINK_ROWS:
+            rows[table].append(row(values))
+    except Exception as e:
+        logging.error(f"Error processing facility registryId={registry_id}: {str(e)}")
+
+
+def insert_xml_rows(cursor, rows):
+    for table, sql in XML_INSERT_SQL.items():
+        if rows[table]:
+            cursor.executemany(sql, rows[table])
+
+
+def load_xml_dom(conn, file_path, progress=None):
+    # Parses the whole document up front, then inserts everything in one transaction
+    rows = new_xml_rows()
+    processed_programs = {}
+    parser = ET.XMLParser(encoding='utf-8')
+    tree = ET.parse(file_path, parser=parser)
+    root = tree.getroot()
+    facility_sites = root.findall('.//FacilitySite')
+    logging.debug(f"Found {len(facility_sites)} FacilitySite elements")
+    for i, facility in enumerate(facility_sites, 1):
+        parse_facility_site(facility, rows, processed_programs)
+        if progress and i % XML_BATCH_SIZE == 0:
+            progress(i)
+    for table in XML_INSERT_SQL:
+        logging.debug(f"{table} to insert: {len(rows[table])}")
+    try:
+        insert_xml_rows(conn.cursor(), rows)
+        conn.commit()
+    except sqlite3.Error as e:
+        logging.error(f"Error inserting XML rows: {str(e)}")
+        conn.rollback()
+        raise
+    if progress:
+        progress(len(facility_sites))
+    return {table: len(table_rows) for table, table_rows in rows.items()}
+
+
+def iter_facility_sites(file_path):
+    # Yields FacilitySite elements one at a time; each one is cleared and
+    # detached from its parent once the caller is done with it, so the
+    # partially built tree never grows beyond a single record.
+    stack = []
+    for event, elem in ET.iterparse(file_path, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            continue
+        stack.pop()
+        if elem.tag == 'FacilitySite':
+            yield elem
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+
+
+def stream_xml(conn, file_path, batch_size=XML_BATCH_SIZE, single_transaction=False, progress=None):
+    # Incremental parse with iterparse, flushing rows every `batch_size` facilities.
+    # processed_programs only dedups within a batch; INSERT OR IGNORE covers
+    # duplicates across batches, so memory stays bounded.
+    # With single_transaction the batches are only committed at the end of the file.
+    rows = new_xml_rows()
+    counts = {table: 0 for table in XML_INSERT_SQL}
+    processed_programs = {}
+    cursor = conn.cursor()
+    pending = 0
+
+    def flush():
+        try:
+            insert_xml_rows(cursor, rows)
+            if not single_transaction:
+                conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        for table, table_rows in rows.items():
+            counts[table] += len(table_rows)
+            table_rows.clear()
+        processed_programs.clear()
+        if progress:
+            progress(counts['Facilities'])
+
+    try:
+        for facility in iter_facility_sites(file_path):
+            parse_facility_site(facility, rows, processed_programs)
+            pending += 1
+            if pending >= batch_size:
+                flush()
+                pending = 0
+        flush()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    for table in XML_INSERT_SQL:
+        logging.debug(f"{table} inserted: {counts[table]}")
+    return counts
+
+
+# Parallel XML ingest: a pool parses raw chunks, one process writes
+XML_CHUNK_BYTES = 4 * 1024 * 1024
+FACILITY_START = re.compile(rb'<FacilitySite[\s>/]')
+FACILITY_END = b'</FacilitySite>'
+
+
+def iter_xml_chunks(file_path, chunk_bytes=XML_CHUNK_BYTES):
+    # Yields raw byte slices that each hold a run of whole FacilitySite elements.
+    # Assumes FacilitySite elements are siblings, as in the EPA export.
+    buffer = b''
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                break
+            buffer += block
+            start = FACILITY_START.search(buffer)
+            end = buffer.rfind(FACILITY_END)
+            if start is None or end < start.start():
+                continue
+            end += len(FACILITY_END)
+            yield buffer[start.start():end]
+            buffer = buffer[end:]
+
+
+_xml_queue = None
+
+
+def _init_xml_worker(queue):
+    global _xml_queue
+    _xml_queue = queue
+
+
+def parse_xml_bytes(chunk):
+    # Rows of a run of whole FacilitySite elements, as cut by iter_xml_chunks
+    rows = new_xml_rows()
+    processed_programs = {}
+    parser = ET.XMLParser(encoding='utf-8')
+    root = ET.fromstring(b'<FacilitySiteChunk>' + chunk + b'</FacilitySiteChunk>', parser=parser)
+    for facility in root.iter('FacilitySite'):
+        parse_facility_site(facility, rows, processed_programs)
+    return rows
+
+
+def parse_xml_chunk(seq, chunk):
+    # Runs in a pool worker; rows go straight to the writer queue
+    rows = parse_xml_bytes(chunk)
+    _xml_queue.put((seq, rows))
+    return len(rows['Facilities'])
+
+
+def xml_writer(db_path, queue, results, batch_size=XML_BATCH_SIZE, pragmas=None, single_transaction=False):
+    # Single writer process. Chunks are applied in file order so the global
+    # processed_programs dedup picks the same first occurrence as a serial import.
+    conn = sqlite3.connect(db_path, timeout=60)
+    apply_pragmas(conn, pragmas or {})
+    cursor = conn.cursor()
+    rows = new_xml_rows()
+    counts = {table: 0 for table in XML_INSERT_SQL}
+    processed_programs = set()
+    pending = {}
+    next_seq = 0
+    total = None
+    batched = 0
+    error = None
+
+    def flush():
+        nonlocal error
+        if error is None:
             try:
-                self.cursor.execute('BEGIN TRANSACTION')
-                self.cursor.executemany("INSERT OR IGNORE INTO JobTitles (job_title, department) VALUES (?, ?)", list(job_titles))
-                self.cursor.executemany("INSERT OR IGNORE INTO Employees (id, first_name, last_name, email, phone, gender, age, job_title, years_of_experience, salary) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", employees)
-                self.conn.commit()
-                QMessageBox.information(self, "Success", "JSON file processed successfully!", QMessageBox.Icon.Information)
+                insert_xml_rows(cursor, rows)
+                if not single_transaction:
+                    conn.commit()
+                for table, table_rows in rows.items():
+                    counts[table] += len(table_rows)
             except sqlite3.Error as e:
-                print(f"Database error occurred: {e}")
-                self.conn.rollback()
-            except Exception as e:
-                print(f"An error occurred: {e}")
-                self.conn.rollback()
-        except Exception as e:
-            logging.error(f"Error processing JSON: {str(e)}")
-            QMessageBox.critical(self, "Error", f"Error processing JSON: {str(e)}", QMessageBox.Icon.Critical)
-
-    def show_view(self, view_name, columns):
+                # Keep draining the queue so the workers never block on it
+                conn.rollback()
+                error = str(e)
+        for table_rows in rows.values():
+            table_rows.clear()
+
+    while total is None or next_seq < total:
+        seq, chunk_rows = queue.get()
+        if seq is None:
+            total = chunk_rows
+            continue
+        pending[seq] = chunk_rows
+        while next_seq in pending:
+            chunk_rows = pending.pop(next_seq)
+            next_seq += 1
+            if chunk_rows is None:
+                continue
+            # Programs and ProgramAttributes rows are appended in pairs
+            for program, attributes in zip(chunk_rows['Programs'], chunk_rows['ProgramAttributes']):
+                program_key = (program[0], program[1])
+                if program_key not in processed_programs:
+                    processed_programs.add(program_key)
+                    rows['Programs'].append(program)
+                    rows['ProgramAttributes'].append(attributes)
+            for table in ('Facilities', 'Coordinates', 'Locations', 'FacilityPrograms'):
+                rows[table].extend(chunk_rows[table])
+            batched += len(chunk_rows['Facilities'])
+            if batched >= batch_size:
+                flush()
+                batched = 0
+    flush()
+    if error is None:
+        conn.commit()
+    conn.close()
+    results.put((counts, error))
+
+
+def parallel_xml(conn, file_path, workers=None, batch_size=XML_BATCH_SIZE, single_transaction=False, progress=None):
+    db_path = conn.execute('PRAGMA database_list').fetchone()[2]
+    workers = workers or os.cpu_count() or 1
+    queue = multiprocessing.Queue(maxsize=workers * 2)
+    results = multiprocessing.Queue()
+    # The writer connection mirrors the caller's settings, e.g. inside bulk_load()
+    pragmas = read_pragmas(conn, SESSION_PRAGMAS)
+    writer = multiprocessing.Process(target=xml_writer,
+                                     args=(db_path, queue, results, batch_size, pragmas, single_transaction))
+    writer.start()
+    # Bounds the number of chunks held in memory at once
+    in_flight = threading.BoundedSemaphore(workers * 2)
+    errors = []
+    parsed = [0]
+
+    def done(facilities):
+        parsed[0] += facilities
+        in_flight.release()
+
+    def failed(seq):
+        def handler(e):
+            logging.error(f"Error parsing XML chunk {seq}: {str(e)}")
+            errors.append(e)
+            queue.put((seq, None))
+            in_flight.release()
+        return handler
+
+    total = 0
+    with multiprocessing.Pool(workers, initializer=_init_xml_worker, initargs=(queue,)) as pool:
         try:
-            self.cursor.execute(f"SELECT * FROM {view_name}")
-            rows = self.cursor.fetchall()
-
-            dialog = QDialog(self)
-            dialog.setWindowTitle(view_name)
-            dialog.resize(700, 500)
-
-            layout = QVBoxLayout()
-            table = QTableWidget()
-            table.setRowCount(len(rows))
-            table.setColumnCount(len(columns))
-            table.setHorizontalHeaderLabels(columns)
-            table.horizontalHeader().setStretchLastSection(True)
-            table.setStyleSheet("QTableWidget { border: 1px solid #ccc; }")
-
-            for i, row in enumerate(rows):
-                for j, val in enumerate(row):
-                    item = QTableWidgetItem(str(val))
-                    item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                    table.setItem(i, j, item)
-
-            layout.addWidget(table)
-            dialog.setLayout(layout)
-            dialog.exec()
-        except Exception as e:
-            QMessageBox.critical(self, "Error", str(e), QMessageBox.Icon.Critical)
-
-    def run_sql_query(self):
-        query = self.sql_entry.toPlainText().strip()
-        if not query:
-            QMessageBox.warning(self, "Warning", "Please enter a SQL query.", QMessageBox.StandardButton.Ok)
-            return
+            for seq, chunk in enumerate(iter_xml_chunks(file_path)):
+                in_flight.acquire()
+                pool.apply_async(parse_xml_chunk, (seq, chunk), callback=done, error_callback=failed(seq))
+                total = seq + 1
+                if progress:
+                    progress(parsed[0])
+        except BaseException:
+            # Abandon the import; the writer's open transaction is rolled back
+            writer.terminate()
+            writer.join()
+            raise
+        pool.close()
+        pool.join()
+    queue.put((None, total))
+    counts, error = results.get()
+    writer.join()
+    for table in XML_INSERT_SQL:
+        logging.debug(f"{table} inserted: {counts[table]}")
+    if error:
+        raise sqlite3.Error(error)
+    if errors:
+        raise errors[0]
+    return counts
+
+
+# Partitioned layout
+# Optionally, Facilities, Coordinates, Locations and FacilityPrograms are also
+# kept in one database file per census division (by location_address_state_code)
+# in <db>.shards/ next to the database. Aggregates fan out over a process pool,
+# one shard per task, each returning a partial result; the partials are loaded
+# into an in-memory table and combined by a merge query. A shard holds whole
+# states, so per-state counts merge by concatenation and others by summing.
+# Shards are filled from the database by partition_database, one process per
+# shard, or straight from the XML by partitioned_xml, where every parser
+# process writes its chunk's facilities to their shards (WAL, so only writers
+# of the same shard wait for each other). partitioned_xml then copies the
+# shards' facility rows into the database and writes the programs there, so the
+# views, charts, map and searches see the same data as after a regular import.
+SHARDED_TABLES = ('Facilities', 'Coordinates', 'Locations', 'FacilityPrograms')
+SHARD_REGIONS = {
+    'new_england': ('CT', 'ME', 'MA', 'NH', 'RI', 'VT'),
+    'mid_atlantic': ('NJ', 'NY', 'PA'),
+    'east_north_central': ('IL', 'IN', 'MI', 'OH', 'WI'),
+    'west_north_central': ('IA', 'KS', 'MN', 'MO', 'NE', 'ND', 'SD'),
+    'south_atlantic': ('DE', 'DC', 'FL', 'GA', 'MD', 'NC', 'SC', 'VA', 'WV'),
+    'east_south_central': ('AL', 'KY', 'MS', 'TN'),
+    'west_south_central': ('AR', 'LA', 'OK', 'TX'),
+    'mountain': ('AZ', 'CO', 'ID', 'MT', 'NV', 'NM', 'UT', 'WY'),
+    'pacific': ('AK', 'CA', 'HI', 'OR', 'WA'),
+    'other': (),  # territories, unknown states and facilities without a location
+}
+SHARD_OF_STATE = {state: region for region, states in SHARD_REGIONS.items() for state in states}
+SHARD_PRAGMAS = {'journal_mode': 'WAL', 'synchronous': 'NORMAL'}
+
+# name: (partial query run on every shard, merge query over their rows in `partials`)
+SHARD_AGGREGATES = {
+    'FacilitiesByState': (
+        '''SELECT l.location_address_state_code AS State, COUNT(f.registry_id) AS FacilityCount
+           FROM Locations l JOIN Facilities f ON l.registry_id = f.registry_id
+           WHERE l.location_address_state_code IS NOT NULL
+           GROUP BY l.location_address_state_code''',
+        "SELECT State, SUM(FacilityCount) AS FacilityCount FROM partials GROUP BY State ORDER BY FacilityCount DESC",
+    ),
+    'ProgramsByState': (
+        '''SELECT l.location_address_state_code AS State, COUNT(*) AS ProgramCount,
+                  COUNT(DISTINCT fp.registry_id) AS FacilityCount
+           FROM FacilityPrograms fp JOIN Locations l ON l.registry_id = fp.registry_id
+           WHERE l.location_address_state_code IS NOT NULL
+           GROUP BY l.location_address_state_code''',
+        '''SELECT State, SUM(ProgramCount) AS ProgramCount, SUM(FacilityCount) AS FacilityCount
+           FROM partials GROUP BY State ORDER BY ProgramCount DESC''',
+    ),
+    'FacilitiesByProgram': (
+        "SELECT program_full_name AS Program, COUNT(*) AS FacilityCount FROM FacilityPrograms GROUP BY program_full_name",
+        "SELECT Program, SUM(FacilityCount) AS FacilityCount FROM partials GROUP BY Program ORDER BY FacilityCount DESC",
+    ),
+}
+
+
+def shard_dir(db_path):
+    return os.path.splitext(db_path)[0] + '.shards'
 
+
+def shard_paths(db_path):
+    # {region: path} of the shards that exist
+    directory = shard_dir(db_path)
+    return {region: os.path.join(directory, f'{region}.db') for region in SHARD_REGIONS
+            if os.path.exists(os.path.join(directory, f'{region}.db'))}
+
+
+def shard_of(state):
+    return SHARD_OF_STATE.get(state, 'other')
+
+
+def shard_schema():
+    # {name: sql} of the sharded tables and their indexes as create_schema defines
+    # them; not read from the database, whose indexes a bulk load has dropped
+    schema = sqlite3.connect(':memory:')
+    create_schema(schema)
+    definitions = dict(schema.execute(f'''
+        SELECT name, sql FROM sqlite_master
+        WHERE type IN ('table', 'index') AND sql IS NOT NULL AND tbl_name IN ({', '.join('?' * len(SHARDED_TABLES))})
+        ORDER BY type DESC
+    ''', SHARDED_TABLES).fetchall())
+    schema.close()
+    return definitions
+
+
+def check_shards(paths):
+    # Raises if a shard lacks one of the tables or indexes of shard_schema()
+    expected = set(shard_schema())
+    for region, path in paths.items():
+        shard = sqlite3.connect(path)
         try:
-            first_word = query.split()[0].upper()
-            rows, columns = [], []
-
-            if first_word == "INSERT":
-                self.cursor.execute("BEGIN TRANSACTION")
-                self.cursor.execute(query)
-                self.conn.commit()
-                QMessageBox.information(self, "Success", "Insert done successfully.", QMessageBox.StandardButton.Ok)
-
-            elif first_word == "UPDATE":
-                self.cursor.execute("BEGIN TRANSACTION")
-                self.cursor.execute(query)
-                self.conn.commit()
-                QMessageBox.information(self, "Success", "Update done successfully.", QMessageBox.StandardButton.Ok)
-            
-            elif first_word == "DELETE":
-                self.cursor.execute("BEGIN TRANSACTION")
-                self.cursor.execute(query)
-                self.conn.commit()
-                QMessageBox.information(self, "Success", "Delete done successfully.", QMessageBox.StandardButton.Ok)
-                
-            else:
-                self.cursor.execute(query)
-                rows = self.cursor.fetchall()
-                columns = [desc[0] for desc in self.cursor.description] if self.cursor.description else []
-                
-
-            if rows and columns:
-                dialog = QDialog(self)
-                dialog.setWindowTitle("SQL Query Result")
-                dialog.resize(700, 500)
-
-                layout = QVBoxLayout()
-                table = QTableWidget()
-                table.setRowCount(len(rows))
-                table.setColumnCount(len(columns))
-                table.setHorizontalHeaderLabels(columns)
-                table.horizontalHeader().setStretchLastSection(True)
-                table.setStyleSheet("QTableWidget { border: 1px solid #ccc; }")
-
-                for i, row in enumerate(rows):
-                    for j, val in enumerate(row):
-                        item = QTableWidgetItem(str(val))
-                        item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                        table.setItem(i, j, item)
-
-                layout.addWidget(table)
-                dialog.setLayout(layout)
-                dialog.exec()
-
-        except Exception as e:
-            self.conn.rollback()
-            QMessageBox.critical(self, "Error", f"Error executing query: {e}", QMessageBox.StandardButton.Ok)
-
-    def plot_facilities_per_state(self):
-        self.cursor.execute("SELECT State, FacilityCount FROM FacilitiesByState")
-        data = self.cursor.fetchall()
-        if not data:
-            QMessageBox.warning(self, "No Data", "No data available for Facilities per State.")
-            return
-        states, counts = zip(*data)
-
-        canvas = MplCanvas(self, width=8, height=4)
-        canvas.axes.bar(states, counts)
-        canvas.axes.set_title("Facilities per State")
-        canvas.axes.set_ylabel("Count")
-        canvas.axes.set_xticks(range(len(states)))
-        canvas.axes.set_xticklabels(states, rotation=90, ha='center' , fontsize=8)
-        canvas.fig.tight_layout()
-        canvas.fig.savefig("facilities_per_state.png", bbox_inches='tight')
-        self.show_plot_dialog(canvas, "Facilities per State")
-
-    def plot_employee_dept_pie(self):
-        self.cursor.execute("SELECT department, COUNT(*) FROM Employees e JOIN JobTitles j ON e.job_title = j.job_title GROUP BY department")
-        data = self.cursor.fetchall()
-        if not data:
-            QMessageBox.warning(self, "No Data", "No data available for Employee Dept Distribution.")
+            present = {name for name, in shard.execute("SELECT name FROM sqlite_master")}
+        finally:
+            shard.close()
+        missing = expected - present
+        if missing:
+            raise sqlite3.DatabaseError(f"shard {region} is missing {', '.join(sorted(missing))}")
+
+
+def create_shards(conn):
+    # Empty shard files with the sharded tables and their indexes
+    db_path = conn.execute('PRAGMA database_list').fetchone()[2]
+    schema = list(shard_schema().values())
+    directory = shard_dir(db_path)
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for region in SHARD_REGIONS:
+        paths[region] = os.path.join(directory, f'{region}.db')
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(paths[region] + suffix):
+                os.remove(paths[region] + suffix)
+        shard = sqlite3.connect(paths[region])
+        apply_pragmas(shard, SHARD_PRAGMAS)
+        for sql in schema:
+            shard.execute(sql)
+        shard.commit()
+        shard.close()
+    return paths
+
+
+def _fill_shard(db_path, region, path):
+    # Runs in a pool worker: copies the region's rows from the database into its shard
+    shard = sqlite3.connect(path, timeout=60)
+    shard.execute("ATTACH DATABASE ? AS source", (pathlib.Path(db_path).resolve().as_uri() + '?mode=ro',))
+    if region == 'other':
+        known = ', '.join(f"'{state}'" for state in SHARD_OF_STATE)
+        where = f"l.location_address_state_code IS NULL OR l.location_address_state_code NOT IN ({known})"
+    else:
+        states = ', '.join(f"'{state}'" for state in SHARD_REGIONS[region])
+        where = f"l.location_address_state_code IN ({states})"
+    # the registry IDs of the region; facilities without a Locations row go to 'other'
+    shard.execute(f"CREATE TEMP TABLE region_ids AS SELECT registry_id FROM source.Locations l WHERE {where}")
+    if region == 'other':
+        shard.execute('''INSERT INTO region_ids SELECT registry_id FROM source.Facilities
+                         WHERE registry_id NOT IN (SELECT registry_id FROM source.Locations)''')
+    counts = {}
+    for table in SHARDED_TABLES:
+        columns = [row[1] for row in shard.execute(f'PRAGMA source.table_info("{table}")')]
+        column_list = ', '.join(columns)
+        counts[table] = shard.execute(f'''
+            INSERT INTO main.{table} ({column_list})
+            SELECT {column_list} FROM source.{table} WHERE registry_id IN (SELECT registry_id FROM region_ids)
+        ''').rowcount
+    shard.commit()
+    shard.close()
+    return counts
+
+
+def partition_database(conn, workers=None, progress=None):
+    # Rebuilds the shards from the database's facility tables; returns rows copied per table
+    db_path = conn.execute('PRAGMA database_list').fetchone()[2]
+    paths = create_shards(conn)
+    counts = {table: 0 for table in SHARDED_TABLES}
+    with multiprocessing.Pool(workers or os.cpu_count() or 1) as pool:
+        for shard_counts in pool.starmap(_fill_shard, [(db_path, region, path) for region, path in paths.items()]):
+            for table, count in shard_counts.items():
+                counts[table] += count
+            if progress:
+                progress(counts['Facilities'])
+    check_shards(paths)
+    return counts
+
+
+def copy_shards(conn, paths, progress=None):
+    # Adds the sharded tables' rows of every shard to the database; one
+    # transaction per shard, since a shard cannot be detached inside one
+    if conn.in_transaction:
+        conn.commit()
+    copied = 0
+    for path in paths.values():
+        conn.execute("ATTACH DATABASE ? AS shard", (path,))
+        try:
+            for table in SHARDED_TABLES:
+                columns = ', '.join(row[1] for row in conn.execute(f'PRAGMA shard.table_info("{table}")'))
+                conn.execute(f"INSERT OR IGNORE INTO main.{table} ({columns}) SELECT {columns} FROM shard.{table}")
+            copied += conn.execute("SELECT COUNT(*) FROM shard.Facilities").fetchone()[0]
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute("DETACH DATABASE shard")
+        if progress:
+            progress(copied)
+
+
+_shard_paths = None
+_shard_writers = {}
+
+
+def _init_shard_writer(paths):
+    global _shard_paths
+    _shard_paths = paths
+
+
+def write_xml_chunk_to_shards(seq, chunk):
+    # Runs in a pool worker: writes the chunk's facility rows to their shards and
+    # returns (seq, rows per sharded table, the program rows for the database)
+    rows = parse_xml_bytes(chunk)
+    regions = {row[0]: shard_of(row[3]) for row in rows['Locations']}
+    grouped = {}
+    for table in SHARDED_TABLES:
+        for row in rows[table]:
+            grouped.setdefault(regions.get(row[0], 'other'), {table: [] for table in SHARDED_TABLES})[table].append(row)
+    for region, region_rows in grouped.items():
+        shard = _shard_writers.get(region)
+        if shard is None:
+            shard = _shard_writers[region] = sqlite3.connect(_shard_paths[region], timeout=60)
+        with shard:
+            for table in SHARDED_TABLES:
+                shard.executemany(XML_INSERT_SQL[table], region_rows[table])
+    return (seq, {table: len(rows[table]) for table in SHARDED_TABLES},
+            {'Programs': rows['Programs'], 'ProgramAttributes': rows['ProgramAttributes']})
+
+
+def partitioned_xml(conn, file_path, workers=None, single_transaction=False, progress=None):
+    # XML import into fresh shards, then into conn; the programs go to conn in
+    # file order, so the first occurrence of a program wins as in a serial import
+    paths = create_shards(conn)
+    workers = workers or os.cpu_count() or 1
+    in_flight = threading.BoundedSemaphore(workers * 2)
+    programs = {}
+    errors = []
+    counts = {table: 0 for table in SHARDED_TABLES}
+
+    def done(result):
+        seq, chunk_counts, program_rows = result
+        programs[seq] = program_rows
+        for table, count in chunk_counts.items():
+            counts[table] += count
+        in_flight.release()
+
+    def failed(e):
+        logging.error(f"Error importing XML chunk into shards: {str(e)}")
+        errors.append(e)
+        in_flight.release()
+
+    with multiprocessing.Pool(workers, initializer=_init_shard_writer, initargs=(paths,)) as pool:
+        for seq, chunk in enumerate(iter_xml_chunks(file_path)):
+            in_flight.acquire()
+            pool.apply_async(write_xml_chunk_to_shards, (seq, chunk), callback=done, error_callback=failed)
+            if progress:
+                progress(counts['Facilities'])
+        pool.close()
+        pool.join()
+    # the workers' connections are gone; the last one to close checkpoints and removes the WAL
+    for path in paths.values():
+        shard = sqlite3.connect(path)
+        shard.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        shard.close()
+    if errors:
+        raise errors[0]
+    check_shards(paths)
+    copy_shards(conn, paths, progress)
+    rows = new_xml_rows()
+    processed_programs = set()
+    for seq in sorted(programs):
+        for program, attributes in zip(programs[seq]['Programs'], programs[seq]['ProgramAttributes']):
+            if (program[0], program[1]) not in processed_programs:
+                processed_programs.add((program[0], program[1]))
+                rows['Programs'].append(program)
+                rows['ProgramAttributes'].append(attributes)
+    insert_xml_rows(conn.cursor(), rows)
+    conn.commit()
+    counts.update(Programs=len(rows['Programs']), ProgramAttributes=len(rows['ProgramAttributes']))
+    if progress:
+        progress(counts['Facilities'])
+    return counts
+
+
+def _shard_partial(path, sql):
+    # Runs in a pool worker: one shard, read-only
+    shard = sqlite3.connect(pathlib.Path(path).resolve().as_uri() + '?mode=ro', uri=True)
+    try:
+        cursor = shard.execute(sql)
+        return [column[0] for column in cursor.description], cursor.fetchall()
+    finally:
+        shard.close()
+
+
+def merge_partials(partials, merge_sql):
+    # Loads the partial results into `partials` and runs the merge query over them
+    merged = sqlite3.connect(':memory:')
+    columns = partials[0][0]
+    merged.execute(f"CREATE TABLE partials ({', '.join(columns)})")
+    for _, rows in partials:
+        merged.executemany(f"INSERT INTO partials VALUES ({', '.join('?' * len(columns))})", rows)
+    cursor = merged.execute(merge_sql)
+    result = [column[0] for column in cursor.description], cursor.fetchall()
+    merged.close()
+    return result
+
+
+def shard_aggregate(db_path, name, workers=None):
+    # Returns (columns, rows) of SHARD_AGGREGATES[name] over all shards
+    paths = list(shard_paths(db_path).values())
+    if not paths:
+        raise ValueError(f"{db_path} is not partitioned")
+    partial_sql, merge_sql = SHARD_AGGREGATES[name]
+    with multiprocessing.Pool(min(workers or os.cpu_count() or 1, len(paths))) as pool:
+        partials = pool.starmap(_shard_partial, [(path, partial_sql) for path in paths])
+    return merge_partials(partials, merge_sql)
+
+
+def shard_aggregates(db_path, workers=None):
+    # Runs every SHARD_AGGREGATES entry; returns {name: (columns, rows, seconds)}
+    results = {}
+    for name in SHARD_AGGREGATES:
+        start = time.perf_counter()
+        columns, rows = shard_aggregate(db_path, name, workers)
+        results[name] = (columns, rows, time.perf_counter() - start)
+    return results
+
+
+def format_shard_aggregates(results, limit=10):
+    lines = []
+    for name, (columns, rows, seconds) in results.items():
+        lines.append(f"{name}: {len(rows):,} rows in {seconds:.3f} s")
+        lines.append('  ' + '\t'.join(columns))
+        lines.extend('  ' + '\t'.join(str(value) for value in row) for row in rows[:limit])
+        if len(rows) > limit:
+            lines.append(f"  ... {len(rows) - limit:,} more")
+        lines.append('')
+    return '\n'.join(lines)
+
+
+# JSON ingest
+JSON_INSERT_SQL = {
+    'JobTitles': "INSERT OR IGNORE INTO JobTitles (job_title, department) VALUES (?, ?)",
+    'Employees': "INSERT OR IGNORE INTO Employees (id, first_name, last_name, email, phone, gender, age, job_title, years_of_experience, salary) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+}
+
+
+def parse_employee(employee, job_titles, employees):
+    try:
+        emp_id = employee.get('id')
+        if emp_id is None:
+            logging.error("Missing id in JSON record.")
             return
-        depts, counts = zip(*data)
-
-        canvas = MplCanvas(self, width=5, height=4)
-        canvas.axes.pie(counts, labels=depts, autopct='%1.1f%%')
-        canvas.axes.set_title("Employee Dept Distribution")
-        canvas.fig.savefig("employee_dept_distribution.png", bbox_inches='tight')
-        self.show_plot_dialog(canvas, "Employee Dept Distribution")
-    
-    def plot_employee_job_pie(self):
-        self.cursor.execute("SELECT job_title, COUNT(*) FROM Employees GROUP BY job_title")
-        data = self.cursor.fetchall()
-        if not data:
-            QMessageBox.warning(self, "No Data", "No data available for Employee Dept Distribution.")
+        if not is_number(employee.get('age'), allow_float=False):
+            logging.error(f"Invalid age for employee id={emp_id}")
             return
-        jobs, counts = zip(*data)
-
-        canvas = MplCanvas(self, width=5, height=4)
-        canvas.axes.pie(counts, labels=jobs, autopct='%1.1f%%')
-        canvas.axes.set_title("Employee job Distribution")
-        canvas.fig.savefig("employee_job_distribution.png", bbox_inches='tight')
-        self.show_plot_dialog(canvas, "Employee job Distribution")
-
-    def plot_age_histogram(self):
-        self.cursor.execute("SELECT age FROM Employees WHERE age IS NOT NULL")
-        ages = [row[0] for row in self.cursor.fetchall()]
-        if not ages:
-            QMessageBox.warning(self, "No Data", "No data available for Age Distribution.")
+        if not is_number(employee.get('salary'), allow_float=True):
+            logging.error(f"Invalid salary for employee id={emp_id}")
             return
+        job_titles.add((employee['job_title'], employee['department']))
+        employees.append((
+            employee['id'],
+            employee['first_name'],
+            employee['last_name'],
+            employee['email'],
+            employee['phone'],
+            employee['gender'],
+            int(employee.get('age')),
+            employee['job_title'],
+            employee['years_of_experience'],
+            float(employee.get('salary'))
+        ))
+    except KeyError as e:
+        logging.error(f"Missing key {e} in JSON employee record with id={employee.get('id')}")
 
-        canvas = MplCanvas(self, width=6, height=4)
-        canvas.axes.hist(ages, bins=10, edgecolor='black')
-        canvas.axes.set_title("Age Distribution of Employees")
-        canvas.axes.set_xlabel("Age")
-        canvas.axes.set_ylabel("Frequency")
-        canvas.fig.savefig("age_distribution.png", bbox_inches='tight')
-        self.show_plot_dialog(canvas, "Age Distribution")
-
-    def plot_salary_vs_exp_line(self):
-        self.cursor.execute("SELECT years_of_experience, AVG(salary) FROM Employees WHERE years_of_experience IS NOT NULL AND salary IS NOT NULL group by years_of_experience")
-        data = self.cursor.fetchall()
-        if not data:
-            QMessageBox.warning(self, "No Data", "No data available for Salary vs Experience.")
-            return
-        years, salaries = zip(*data)
-
-        canvas = MplCanvas(self, width=6, height=4)
-        canvas.axes.plot(years, salaries, marker='o')
-        canvas.axes.set_title("Salary vs Years of Experience")
-        canvas.axes.set_xlabel("Years of Experience")
-        canvas.axes.set_ylabel("Salary")
-        canvas.fig.savefig("salary_vs_experience.png", bbox_inches='tight')
-        self.show_plot_dialog(canvas, "Salary vs Experience (Line)")
-        
-    def plot_avg_salary_by_job(self):
-        self.cursor.execute("SELECT job_title, avg_salary FROM View_AvgSalaryByJob")
-        data = self.cursor.fetchall()
-        if not data:
-            QMessageBox.warning(self, "No Data", "No data available for Average Salary by Job.")
+
+def load_json(conn, file_path, progress=None):
+    # Reads the whole file up front and inserts everything in one transaction
+    job_titles = set()
+    employees = []
+    with open(file_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    for employee in data:
+        parse_employee(employee, job_titles, employees)
+    if progress:
+        progress(len(employees))
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN TRANSACTION')
+        cursor.executemany(JSON_INSERT_SQL['JobTitles'], list(job_titles))
+        cursor.executemany(JSON_INSERT_SQL['Employees'], employees)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return {'JobTitles': len(job_titles), 'Employees': len(employees)}
+
+
+JSON_BATCH_SIZE = 10000
+JSON_READ_SIZE = 1024 * 1024
+JSON_SEPARATORS = re.compile(r'[\s,]*')
+JSON_MAX_RECORD_SIZE = 16 * 1024 * 1024
+# A literal, number or \\uXXXX escape cut off at the end of the buffer fails
+# this close to it; anything earlier is malformed whatever follows
+JSON_CUT_MARGIN = 8
+
+
+def iter_json_records(file_path, read_size=JSON_READ_SIZE):
+    # Yields the objects of a top-level JSON array, or of newline-delimited
+    # JSON, while holding only `read_size` characters of the file at a time
+    # (more only for a single record, up to JSON_MAX_RECORD_SIZE).
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r', encoding='utf-8') as f:
+        buffer = f.read(read_size)
+        eof = not buffer
+        pos = 0
+        started = False
+        while True:
+            pos = JSON_SEPARATORS.match(buffer, pos).end()
+            if pos == len(buffer):
+                if eof:
+                    return
+                buffer = f.read(read_size)
+                eof = not buffer
+                pos = 0
+                continue
+            if not started:
+                started = True
+                if buffer[pos] == '[':
+                    pos += 1
+                    continue
+            if buffer[pos] == ']':
+                return
+            try:
+                record, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                # Refill only for a record cut off at the end of the buffer
+                cut = (e.pos >= len(buffer) - JSON_CUT_MARGIN
+                       or e.msg.startswith('Unterminated string'))
+                if eof or not cut:
+                    raise
+                if len(buffer) - pos >= JSON_MAX_RECORD_SIZE:
+                    raise ValueError(f"JSON record larger than {JSON_MAX_RECORD_SIZE} characters") from e
+                # Grow geometrically so a long record is not re-copied per read
+                more = f.read(max(read_size, len(buffer) - pos))
+                buffer = buffer[pos:] + more
+                eof = not more
+                pos = 0
+                continue
+            yield record
+
+
+def iter_employee_batches(file_path, batch_size=JSON_BATCH_SIZE):
+    # Yields (new job titles, employee rows) with at most `batch_size` employees
+    seen_titles = set()
+    job_titles = set()
+    employees = []
+    for employee in iter_json_records(file_path):
+        parse_employee(employee, job_titles, employees)
+        if len(employees) >= batch_size:
+            yield list(job_titles - seen_titles), employees
+            seen_titles |= job_titles
+            job_titles = set()
+            employees = []
+    if employees or job_titles - seen_titles:
+        yield list(job_titles - seen_titles), employees
+
+
+def stream_json(conn, file_path, batch_size=JSON_BATCH_SIZE, single_transaction=False, progress=None):
+    counts = {'JobTitles': 0, 'Employees': 0}
+    cursor = conn.cursor()
+    try:
+        for job_titles, employees in iter_employee_batches(file_path, batch_size):
+            cursor.executemany(JSON_INSERT_SQL['JobTitles'], job_titles)
+            cursor.executemany(JSON_INSERT_SQL['Employees'], employees)
+            if not single_transaction:
+                conn.commit()
+            counts['JobTitles'] += len(job_titles)
+            counts['Employees'] += len(employees)
+            if progress:
+                progress(counts['Employees'])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logging.debug(f"Employees inserted: {counts['Employees']}")
+    return counts
+
+
+# Incremental import
+# Each imported record (a facility keyed by registry_id, an employee keyed by id)
+# has a content hash in ImportHashes. Unchanged records are skipped before they
+# reach the data tables, changed ones are upserted and records missing from the
+# file are deleted from the data tables; their hashes stay, flagged deleted.
+INCREMENTAL_BATCH_SIZE = 10000
+
+XML_UPSERT_SQL = {
+    'Facilities': "INSERT INTO Facilities (registry_id, facility_site_name, location_address_text, electronic_address, electronic_address_typename) VALUES (?, ?, ?, ?, ?) ON CONFLICT (registry_id) DO UPDATE SET facility_site_name = excluded.facility_site_name, location_address_text = excluded.location_address_text, electronic_address = excluded.electronic_address, electronic_address_typename = excluded.electronic_address_typename",
+    'Coordinates': "INSERT INTO Coordinates (registry_id, latitude_measure, longitude_measure, horizontal_coordinate_reference_system_datum_name, horizontal_collection_method_name) VALUES (?, ?, ?, ?, ?) ON CONFLICT (registry_id) DO UPDATE SET latitude_measure = excluded.latitude_measure, longitude_measure = excluded.longitude_measure, horizontal_coordinate_reference_system_datum_name = excluded.horizontal_coordinate_reference_system_datum_name, horizontal_collection_method_name = excluded.horizontal_collection_method_name",
+    'Locations': "INSERT INTO Locations (registry_id, location_zip_code, locality_name, location_address_state_code) VALUES (?, ?, ?, ?) ON CONFLICT (registry_id) DO UPDATE SET location_zip_code = excluded.location_zip_code, locality_name = excluded.locality_name, location_address_state_code = excluded.location_address_state_code",
+    'Programs': "INSERT INTO Programs (program_identifier, program_full_name, interest_type_id) VALUES (?, ?, ?) ON CONFLICT (program_identifier, program_full_name) DO UPDATE SET interest_type_id = excluded.interest_type_id",
+    'ProgramAttributes': "INSERT INTO ProgramAttributes (interest_type_id, program_common_name, program_acronym_name, program_description, electronic_address, electronic_address_typename) VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (interest_type_id) DO UPDATE SET program_common_name = excluded.program_common_name, program_acronym_name = excluded.program_acronym_name, program_description = excluded.program_description, electronic_address = excluded.electronic_address, electronic_address_typename = excluded.electronic_address_typename",
+    'FacilityPrograms': "INSERT OR IGNORE INTO FacilityPrograms (registry_id, program_identifier, program_full_name) VALUES (?, ?, ?)",
+}
+
+JSON_UPSERT_SQL = {
+    'JobTitles': "INSERT INTO JobTitles (job_title, department) VALUES (?, ?) ON CONFLICT (job_title) DO UPDATE SET department = excluded.department",
+    'Employees': "INSERT INTO Employees (id, first_name, last_name, email, phone, gender, age, job_title, years_of_experience, salary) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET first_name = excluded.first_name, last_name = excluded.last_name, email = excluded.email, phone = excluded.phone, gender = excluded.gender, age = excluded.age, job_title = excluded.job_title, years_of_experience = excluded.years_of_experience, salary = excluded.salary",
+}
+
+TOMBSTONE_SQL = {
+    'facility': [
+        "DELETE FROM FacilityPrograms WHERE registry_id = ?",
+        "DELETE FROM Locations WHERE registry_id = ?",
+        "DELETE FROM Coordinates WHERE registry_id = ?",
+        "DELETE FROM Facilities WHERE registry_id = ?",
+    ],
+    'employee': [
+        "DELETE FROM Employees WHERE id = ?",
+    ],
+}
+
+
+def content_hash(payload):
+    return hashlib.blake2b(repr(payload).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def begin_incremental(cursor):
+    # Keys seen in the current file, used to find the records that vanished
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS import_seen (key TEXT PRIMARY KEY)")
+    cursor.execute("DELETE FROM temp.import_seen")
+
+
+def sync_batch(cursor, entity, records, write):
+    # Writes the records whose hash differs from the stored one; returns how many
+    hashes = {key: content_hash(payload) for key, payload in records.items()}
+    keys = list(hashes)
+    stored = {}
+    for i in range(0, len(keys), 500):
+        part = keys[i:i + 500]
+        cursor.execute(f"SELECT key, hash FROM ImportHashes WHERE entity = ? AND deleted = 0 AND key IN ({', '.join('?' * len(part))})", [entity, *part])
+        stored.update(cursor.fetchall())
+    cursor.executemany("INSERT OR IGNORE INTO temp.import_seen (key) VALUES (?)", [(key,) for key in keys])
+    changed = [key for key in keys if stored.get(key) != hashes[key]]
+    if changed:
+        write(cursor, [records[key] for key in changed])
+        cursor.executemany(
+            "INSERT INTO ImportHashes (entity, key, hash, deleted) VALUES (?, ?, ?, 0) ON CONFLICT (entity, key) DO UPDATE SET hash = excluded.hash, deleted = 0",
+            [(entity, key, hashes[key]) for key in changed])
+    return len(changed)
+
+
+def tombstone_vanished(cursor, entity):
+    cursor.execute("SELECT key FROM ImportHashes WHERE entity = ? AND deleted = 0 AND key NOT IN (SELECT key FROM temp.import_seen)", (entity,))
+    vanished = [(row[0],) for row in cursor.fetchall()]
+    for sql in TOMBSTONE_SQL[entity]:
+        cursor.executemany(sql, vanished)
+    cursor.executemany("UPDATE ImportHashes SET deleted = 1 WHERE entity = ? AND key = ?", [(entity, key) for key, in vanished])
+    return len(vanished)
+
+
+def write_facilities(cursor, records):
+    rows = new_xml_rows()
+    for record in records:
+        for table, table_rows in record.items():
+            rows[table].extend(table_rows)
+    # A changed facility may have moved to a different program
+    cursor.executemany("DELETE FROM FacilityPrograms WHERE registry_id = ?", [(row[0],) for row in rows['Facilities']])
+    for table, sql in XML_UPSERT_SQL.items():
+        if rows[table]:
+            cursor.executemany(sql, rows[table])
+
+
+def write_employees(cursor, records):
+    cursor.executemany(JSON_UPSERT_SQL['JobTitles'], list({job_title for _, job_title in records}))
+    cursor.executemany(JSON_UPSERT_SQL['Employees'], [employee for employee, _ in records])
+
+
+def run_incremental(conn, entity, records, write, batch_size=INCREMENTAL_BATCH_SIZE, single_transaction=False,
+                    progress=None):
+    # `records` yields (key, payload) pairs
+    cursor = conn.cursor()
+    counts = {'records': 0, 'upserted': 0, 'tombstoned': 0}
+    batch = {}
+
+    def flush():
+        counts['records'] += len(batch)
+        counts['upserted'] += sync_batch(cursor, entity, batch, write)
+        if not single_transaction:
+            conn.commit()
+        batch.clear()
+        if progress:
+            progress(counts['records'])
+
+    try:
+        begin_incremental(cursor)
+        for key, payload in records:
+            batch[key] = payload
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+        counts['tombstoned'] = tombstone_vanished(cursor, entity)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logging.debug(f"Incremental {entity} import: {counts}")
+    return counts
+
+
+def iter_facility_records(file_path):
+    for facility in iter_facility_sites(file_path):
+        # A fresh dedup dict per facility, so each record carries its own program rows
+        record = new_xml_rows()
+        parse_facility_site(facility, record, {})
+        if record['Facilities']:
+            yield record['Facilities'][0][0], record
+
+
+def iter_employee_records(file_path):
+    for employee in iter_json_records(file_path):
+        job_titles = set()
+        employees = []
+        parse_employee(employee, job_titles, employees)
+        if employees:
+            yield str(employees[0][0]), (employees[0], job_titles.pop())
+
+
+def incremental_xml(conn, file_path, batch_size=INCREMENTAL_BATCH_SIZE, single_transaction=False, progress=None):
+    return run_incremental(conn, 'facility', iter_facility_records(file_path), write_facilities,
+                           batch_size, single_transaction, progress)
+
+
+def incremental_json(conn, file_path, batch_size=INCREMENTAL_BATCH_SIZE, single_transaction=False, progress=None):
+    return run_incremental(conn, 'employee', iter_employee_records(file_path), write_employees,
+                           batch_size, single_transaction, progress)
+
+
+# Bulk load
+BULK_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'OFF',
+    'cache_size': -256 * 1024,  # KiB, i.e. 256 MB
+    'temp_store': 'MEMORY',
+}
+SESSION_PRAGMAS = ('synchronous', 'cache_size', 'temp_store')
+
+
+def read_pragmas(conn, names):
+    return {name: conn.execute(f"PRAGMA {name}").fetchone()[0] for name in names}
+
+
+def apply_pragmas(conn, pragmas):
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+@contextmanager
+def bulk_load(conn, synchronous='OFF'):
+    # Fast settings for the duration of an import. Secondary indexes and
+    # triggers are dropped and recreated once at the end (summary tables and
+    # the spatial and search indexes are rebuilt instead of being maintained
+    # row by row), and the previous settings are restored even if the import
+    # fails.
+    conn.commit()
+    saved = read_pragmas(conn, BULK_PRAGMAS)
+    deferred = conn.execute("SELECT type, name, sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND sql IS NOT NULL").fetchall()
+    apply_pragmas(conn, dict(BULK_PRAGMAS, synchronous=synchronous))
+    for kind, name, _ in deferred:
+        conn.execute(f'DROP {kind.upper()} IF EXISTS "{name}"')
+    conn.commit()
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        for _, _, sql in deferred:
+            conn.execute(sql)
+        conn.commit()
+        if summaries_enabled(conn):
+            rebuild_summaries(conn)
+        if spatial_index_enabled(conn):
+            rebuild_spatial_index(conn)
+        if search_index_enabled(conn):
+            rebuild_search_index(conn)
+        apply_pragmas(conn, saved)
+
+
+# SQL tab
+DML_MESSAGES = {
+    "INSERT": "Insert done successfully.",
+    "UPDATE": "Update done successfully.",
+    "DELETE": "Delete done successfully.",
+}
+
+
+def execute_sql(conn, query, profiler=None, timeout=None):
+    # Returns (first keyword, column names, rows) for a statement typed in the SQL tab
+    first_word = query.split()[0].upper()
+    cursor = conn.cursor()
+    try:
+        with profiled(profiler, conn, query, timeout) as profile:
+            if first_word in DML_MESSAGES:
+                cursor.execute("BEGIN TRANSACTION")
+                cursor.execute(query)
+                profile['rows'] = max(cursor.rowcount, 0)
+                conn.commit()
+                return first_word, [], []
+            cursor.execute(query)
+            rows = cursor.fetchall()
+            profile['rows'] = len(rows)
+            columns = [desc[0] for desc in cursor.description] if cursor.description else []
+            if conn.in_transaction:
+                conn.commit()
+            return first_word, columns, rows
+    except Exception:
+        conn.rollback()
+        raise
+
+
+# Query log
+def log_query(conn, query):
+    conn.execute('''
+        INSERT INTO QueryLog (query, runs, last_run) VALUES (?, 1, datetime('now'))
+        ON CONFLICT (query) DO UPDATE SET runs = runs + 1, last_run = excluded.last_run
+    ''', (query,))
+    conn.commit()
+
+
+def logged_queries(conn, limit=50):
+    rows = conn.execute("SELECT query FROM QueryLog ORDER BY runs DESC, last_run DESC LIMIT ?", (limit,)).fetchall()
+    return {f"SQL tab #{number}": query for number, (query,) in enumerate(rows, 1)}
+
+
+# Query limits
+# Ad-hoc SQL runs with a time limit and a cap on the rows shown. watch_query
+# installs the connection's progress handler, called every QUERY_CHECK_STEPS
+# VM instructions; it counts the calls for the profiler and makes SQLite
+# abandon the statement once the time limit has passed.
+QUERY_TIME_LIMIT = 30  # seconds
+QUERY_MAX_ROWS = 100000
+QUERY_CHECK_STEPS = 1000
+
+
+class QueryTimeout(sqlite3.OperationalError):
+    pass
+
+
+@contextmanager
+def watch_query(conn, timeout=None):
+    # Yields [progress handler calls]; raises QueryTimeout when the statement ran out of time
+    calls = [0]
+    deadline = time.perf_counter() + timeout if timeout else None
+
+    def check():
+        calls[0] += 1
+        return deadline is not None and time.perf_counter() > deadline
+
+    conn.set_progress_handler(check, QUERY_CHECK_STEPS)
+    try:
+        yield calls
+    except sqlite3.OperationalError as e:
+        if deadline is not None and time.perf_counter() > deadline and 'interrupt' in str(e):
+            raise QueryTimeout(f"query stopped by the {timeout:g} s time limit") from e
+        raise
+    finally:
+        conn.set_progress_handler(None, 0)
+
+
+# Query profiler
+# Wall time, rows returned, SQLite VM steps and EXPLAIN QUERY PLAN of the
+# queries run through a QueryProfiler: the views, charts and SQL tab in the
+# window, and query/view on the command line. VM steps are counted by
+# watch_query, so they are rounded down to QUERY_CHECK_STEPS. The last
+# PROFILE_HISTORY profiles are kept in
+# memory. Queries taking at least the threshold are logged and written to
+# SlowQueries, through the connection pool's deferred writes in the window
+# and on the profiled connection otherwise.
+SLOW_QUERY_SECONDS = 0.5
+PROFILE_HISTORY = 200
+
+
+def query_plan(conn, sql):
+    # EXPLAIN QUERY PLAN as indented lines; empty for statements without a plan
+    try:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    except sqlite3.Error:
+        return ''
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node] + detail)
+    return '\n'.join(lines)
+
+
+class QueryProfiler:
+    def __init__(self, threshold=SLOW_QUERY_SECONDS, history=PROFILE_HISTORY, pool=None):
+        self.threshold = threshold
+        # slow queries go through pool.defer() when there is a pool
+        self.pool = pool
+        self.recent = deque(maxlen=history)
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def profile(self, conn, sql, timeout=None):
+        # Yields the profile; the caller sets 'rows' to the number of rows it read.
+        # Failed queries are not recorded.
+        profile = {'query': normalize_sql(sql), 'rows': 0}
+        start = time.perf_counter()
+        with watch_query(conn, timeout) as calls:
+            yield profile
+        profile.update(seconds=time.perf_counter() - start, vm_steps=calls[0] * QUERY_CHECK_STEPS,
+                       plan=query_plan(conn, sql), recorded=time.strftime('%Y-%m-%d %H:%M:%S'))
+        self.record(conn, profile)
+
+    def record(self, conn, profile):
+        with self.lock:
+            self.recent.append(profile)
+        if profile['seconds'] < self.threshold:
             return
-        jobs, avg_salaries = zip(*data)
-
-        canvas = MplCanvas(self, width=5, height=4)
-        canvas.axes.barh(jobs, avg_salaries)
-        canvas.axes.set_yticks(range(len(jobs)))
-        canvas.axes.set_yticklabels(jobs, rotation=45 , fontsize=7)
-        canvas.fig.tight_layout() 
-        canvas.axes.set_title("Average Salary by Job Title")
-        canvas.axes.set_xlabel("Salary")
-
-        self.show_plot_dialog(canvas, "Avg Salary by Job")
-
-    def plot_gender_distribution(self):
-        self.cursor.execute("SELECT gender, COUNT(*) FROM Employees GROUP BY gender")
-        data = self.cursor.fetchall()
-        if not data:
-            QMessageBox.warning(self, "No Data", "No data available for Gender Distribution.")
+        logging.warning(f"Slow query ({profile['seconds']:.3f} s, {profile['rows']:,} rows, "
+                        f"{profile['vm_steps']:,} VM steps): {profile['query']}")
+        if self.pool is not None:
+            self.pool.defer(lambda writer: store_slow_query(writer, profile))
             return
-        labels, values = zip(*data)
+        try:
+            store_slow_query(conn, profile)
+        except sqlite3.Error as e:
+            logging.error(f"Error recording slow query: {str(e)}")
+
+    def recent_profiles(self):
+        # Newest first
+        with self.lock:
+            return list(reversed(self.recent))
+
+
+def store_slow_query(conn, profile):
+    # Commits unless the connection is inside a transaction, which then commits the row
+    in_transaction = conn.in_transaction
+    conn.execute('''
+        INSERT INTO SlowQueries (query, recorded, seconds, rows, vm_steps, plan)
+        VALUES (:query, :recorded, :seconds, :rows, :vm_steps, :plan)
+    ''', profile)
+    if not in_transaction:
+        conn.commit()
+
 
-        canvas = MplCanvas(self, width=5, height=4)
-        canvas.axes.pie(values, labels=labels, autopct='%1.1f%%')
-        canvas.axes.set_title("Employees by Gender")
+@contextmanager
+def profiled(profiler, conn, sql, timeout=None):
+    # Yields the profile dict of profiler.profile(); without a profiler only the time limit applies
+    if profiler is not None:
+        with profiler.profile(conn, sql, timeout) as profile:
+            yield profile
+    else:
+        with watch_query(conn, timeout) if timeout else nullcontext():
+            yield {}
 
-        self.show_plot_dialog(canvas, "Employees by Gender")
 
+def slow_queries(conn, limit=20):
+    # Top offenders of SlowQueries by total time, with the plan of their latest run
+    cursor = conn.execute('''
+        SELECT query, COUNT(*) AS runs, SUM(seconds) AS total_seconds, MAX(seconds) AS max_seconds,
+               MAX(rows) AS rows, MAX(vm_steps) AS vm_steps, MAX(recorded) AS last_run,
+               (SELECT plan FROM SlowQueries latest WHERE latest.query = SlowQueries.query
+                ORDER BY id DESC LIMIT 1) AS plan
+        FROM SlowQueries
+        GROUP BY query
+        ORDER BY total_seconds DESC
+        LIMIT ?
+    ''', (limit,))
+    columns = [desc[0] for desc in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def clear_slow_queries(conn):
+    conn.execute("DELETE FROM SlowQueries")
+    conn.commit()
+
+
+def format_query_profiles(offenders, recent=None):
+    # recent: profiles of this session, None to leave them out
+    def plan_lines(plan):
+        return [f"      {line}" for line in plan.splitlines()] or ["      (no plan)"]
+
+    lines = ["Slowest queries (SlowQueries):"]
+    if not offenders:
+        lines.append("  none recorded")
+    for number, entry in enumerate(offenders, 1):
+        lines.append(f"  {number}. {entry['query']}")
+        lines.append(f"     {entry['runs']:,} runs, {entry['total_seconds']:.3f} s total, "
+                     f"{entry['max_seconds']:.3f} s max, up to {entry['rows']:,} rows and "
+                     f"{entry['vm_steps']:,} VM steps, last {entry['last_run']}")
+        lines.extend(plan_lines(entry['plan'] or ''))
+    if recent is None:
+        return "\n".join(lines)
+    lines.append("")
+    lines.append("Recent queries:")
+    if not recent:
+        lines.append("  none yet")
+    for profile in recent:
+        lines.append(f"  {profile['seconds']:8.3f} s {profile['rows']:>10,} rows {profile['vm_steps']:>14,} steps  "
+                     f"{profile['query']}")
+        lines.extend(plan_lines(profile['plan']))
+    return "\n".join(lines)
+
+
+# Index advisor
+# Runs EXPLAIN QUERY PLAN over the built-in and logged queries and flags full
+# table scans and temp B-trees. For each table of a flagged query a candidate
+# index is built from the columns the query uses there: GROUP BY columns first,
+# then join and WHERE columns, then ORDER BY and finally the selected ones, so
+# the index covers the query. A candidate is proposed if it improves the plan
+# on an empty copy of the schema, so nothing is built on the real tables until
+# the indexes are created.
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?$')
+TABLE_LOOKUP = re.compile(r'^(?:SCAN|SEARCH) (?:TABLE )?(\w+)(?: AS (\w+))? USING INDEX ')
+TEMP_BTREE = re.compile(r'^USE TEMP B-TREE FOR (.+)$')
+TABLE_REF = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(?!(?:ON|WHERE|JOIN|INNER|LEFT|CROSS|NATURAL|GROUP|ORDER|LIMIT|USING)\b)(\w+))?', re.I)
+CLAUSE = re.compile(r'\b(SELECT|FROM|JOIN|ON|WHERE|GROUP\s+BY|HAVING|ORDER\s+BY|LIMIT)\b', re.I)
+COLUMN_REF = re.compile(r'\b(?:(\w+)\.)?(\w+)\b')
+# Candidate column order by clause; FROM/JOIN hold table names only
+CLAUSE_RANK = {'GROUP BY': 0, 'ON': 1, 'WHERE': 1, 'HAVING': 1, 'ORDER BY': 2, 'SELECT': 3}
+MAX_INDEX_COLUMNS = 6
+
+
+def builtin_queries():
+    queries = {name: view_query(name) for name in SUMMARY_QUERIES}
+    queries.update(CHART_QUERIES)
+    queries['facilities_map'] = MAP_TILE_QUERY
+    return queries
+
+
+def query_texts(conn, sql):
+    # The query plus the definitions of the views it reads
+    views = {name.lower(): definition for name, definition in
+             conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'view'").fetchall()}
+    texts, pending = [], [sql]
+    while pending:
+        text = pending.pop()
+        texts.append(text)
+        for name, _ in TABLE_REF.findall(text):
+            if name.lower() in views:
+                pending.append(views.pop(name.lower()))
+    return texts
+
+
+def query_columns(conn, sql):
+    # Returns ({alias or name: table}, {table: [columns in candidate order]})
+    tables = {name.lower(): name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()}
+    aliases, ranked, starred = {}, {}, set()
+    for text in query_texts(conn, sql):
+        refs = {}
+        for name, alias in TABLE_REF.findall(text):
+            if name.lower() in tables:
+                refs[(alias or name).lower()] = tables[name.lower()]
+                refs[name.lower()] = tables[name.lower()]
+        aliases.update(refs)
+        table_columns = {table: {row[1].lower(): row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')}
+                         for table in set(refs.values())}
+        parts = CLAUSE.split(text)
+        for keyword, body in zip(parts[1::2], parts[2::2]):
+            keyword = ' '.join(keyword.upper().split())
+            if keyword not in CLAUSE_RANK:
+                continue
+            if keyword == 'SELECT':
+                for match in re.finditer(r'(?:^|,)\s*(?:(\w+)\.)?\*\s*(?=,|$)', body.strip()):
+                    starred.update(set(refs.values()) if match.group(1) is None else {refs.get(match.group(1).lower())})
+            for qualifier, column in COLUMN_REF.findall(body):
+                if qualifier:
+                    owners = [refs[qualifier.lower()]] if qualifier.lower() in refs else []
+                else:
+                    owners = [table for table, columns in table_columns.items() if column.lower() in columns]
+                if len(owners) == 1 and column.lower() in table_columns[owners[0]]:
+                    ranked.setdefault(owners[0], []).append((CLAUSE_RANK[keyword], table_columns[owners[0]][column.lower()]))
+    columns = {}
+    for table, entries in ranked.items():
+        ordered = []
+        for rank, column in sorted(entries, key=lambda entry: entry[0]):
+            if column not in ordered and (rank < CLAUSE_RANK['SELECT'] or table not in starred):
+                ordered.append(column)
+        columns[table] = ordered[:MAX_INDEX_COLUMNS]
+    return aliases, columns
+
+
+def plan_issues(conn, sql, aliases):
+    issues = []
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall():
+        detail = row[3]
+        scan = FULL_SCAN.match(detail) or TABLE_LOOKUP.match(detail)
+        temp = TEMP_BTREE.match(detail)
+        if scan and (scan.group(2) or scan.group(1)).lower() in aliases:
+            table = aliases[(scan.group(2) or scan.group(1)).lower()]
+            issues.append(f"full scan of {table}" if scan.re is FULL_SCAN else f"table lookups on {table}")
+        elif temp:
+            issues.append(f"temp B-tree for {temp.group(1)}")
+    return issues
+
+
+def index_columns(conn, table):
+    indexes = []
+    for index in conn.execute(f'PRAGMA index_list("{table}")').fetchall():
+        indexes.append([row[2] for row in conn.execute(f'PRAGMA index_info("{index[1]}")')])
+    return indexes
+
+
+def schema_copy(conn):
+    # Empty in-memory database with the same tables, views, indexes and statistics
+    copy = sqlite3.connect(':memory:')
+    for sql, in conn.execute('''
+        SELECT sql FROM sqlite_master
+        WHERE type IN ('table', 'index', 'view') AND sql IS NOT NULL AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\'
+          -- shadow tables are created by their virtual table
+          AND NOT EXISTS (SELECT 1 FROM sqlite_master v WHERE v.sql LIKE 'CREATE VIRTUAL TABLE%'
+                          AND sqlite_master.name LIKE v.name || '\\_%' ESCAPE '\\')
+        ORDER BY CASE type WHEN 'table' THEN 0 WHEN 'index' THEN 1 ELSE 2 END, rowid
+    ''').fetchall():
+        copy.execute(sql)
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+        copy.execute("ANALYZE sqlite_master")
+        copy.executemany("INSERT INTO sqlite_stat1 VALUES (?, ?, ?)", conn.execute("SELECT tbl, idx, stat FROM sqlite_stat1"))
+        copy.execute("ANALYZE sqlite_master")
+    copy.commit()
+    return copy
+
+
+def advise_indexes(conn, queries, progress=None):
+    # Returns one entry per query with its plan issues, the proposed indexes and the issues they leave
+    copy = schema_copy(conn)
+    report = []
+    try:
+        for number, (name, sql) in enumerate(queries.items(), 1):
+            if progress:
+                progress(number)
+            entry = {'name': name, 'query': sql, 'issues': [], 'indexes': [], 'remaining': [], 'error': None}
+            report.append(entry)
+            try:
+                aliases, columns = query_columns(conn, sql)
+                entry['issues'] = plan_issues(conn, sql, aliases)
+                # indexes proposed for earlier queries are already in the copy
+                issues = plan_issues(copy, sql, aliases)
+                for table, candidate in columns.items():
+                    if not issues or not candidate:
+                        continue
+                    if any(existing[:len(candidate)] == candidate for existing in index_columns(copy, table)):
+                        continue
+                    index = f"idx_{table}_{'_'.join(candidate)}".lower()
+                    statement = f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({', '.join(candidate)})"
+                    copy.execute(statement)
+                    improved = plan_issues(copy, sql, aliases)
+                    if len(improved) < len(issues):
+                        entry['indexes'].append(statement)
+                        issues = improved
+                    else:
+                        copy.execute(f"DROP INDEX {index}")
+                entry['remaining'] = issues
+            except sqlite3.Error as e:
+                entry['error'] = str(e)
+    finally:
+        copy.close()
+    return report
 
-    def plot_programs_by_interest(self):
-        self.cursor.execute("SELECT interest_type_id, COUNT(*) FROM Programs GROUP BY interest_type_id")
-        data = self.cursor.fetchall()
-        if not data:
-            QMessageBox.warning(self, "No Data", "No data available for Programs by InterestType.")
+
+def time_queries(conn, queries, repeat=3, progress=None):
+    # Best of `repeat` runs per query, in milliseconds; None when the query fails
+    timings = {}
+    for number, (name, sql) in enumerate(queries.items(), 1):
+        if progress:
+            progress(number)
+        best = None
+        try:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(sql).fetchall()
+                elapsed = (time.perf_counter() - start) * 1000
+                best = elapsed if best is None else min(best, elapsed)
+        except sqlite3.Error:
+            best = None
+        finally:
+            # logged queries are replayed here, never keep anything they change
+            if conn.in_transaction:
+                conn.rollback()
+        timings[name] = best
+    return timings
+
+
+def index_advice(conn, queries, progress=None):
+    report = advise_indexes(conn, queries, progress)
+    indexes = list(dict.fromkeys(statement for entry in report for statement in entry['indexes']))
+    return {'queries': report, 'indexes': indexes, 'before': time_queries(conn, queries, progress=progress), 'after': None}
+
+
+def create_indexes(conn, advice, progress=None):
+    # Creates the proposed indexes and times the queries again
+    for statement in advice['indexes']:
+        conn.execute(statement)
+    conn.commit()
+    queries = {entry['name']: entry['query'] for entry in advice['queries']}
+    advice['after'] = time_queries(conn, queries, progress=progress)
+    return advice
+
+
+def format_index_advice(advice):
+    def ms(value):
+        return "failed" if value is None else f"{value:.1f} ms"
+
+    lines = []
+    for entry in advice['queries']:
+        name = entry['name']
+        timing = ms(advice['before'][name])
+        if advice['after'] is not None:
+            timing += f" -> {ms(advice['after'][name])}"
+        lines.append(f"{name}: {timing}")
+        if entry['error']:
+            lines.append(f"    error: {entry['error']}")
+        for issue in entry['issues']:
+            lines.append(f"    {issue}")
+        for statement in entry['indexes']:
+            lines.append(f"    + {statement}")
+        if entry['indexes'] and entry['remaining']:
+            lines.append(f"    still: {', '.join(entry['remaining'])}")
+    if advice['indexes']:
+        header = "Created" if advice['after'] is not None else "Proposed"
+        lines += ["", f"{header} indexes:"] + advice['indexes']
+    else:
+        lines += ["", "No new indexes would improve these queries."]
+    return '\n'.join(lines)
+
+
+# Query result cache
+# Results of read-only queries keyed by the normalized SQL and the data
+# generation of every table the query reads, as SQLite's authorizer reports them
+# while the query is prepared (so views, comma joins and subqueries are all
+# covered). Imports and DML bump the generation of the tables they write and of
+# the tables triggers keep in step with them (summaries, the R*Tree and the FTS
+# indexes), which drops their entries. Generations are only tracked for writes
+# made by this process.
+QUERY_CACHE_BUDGET = 64 * 1024 * 1024  # bytes
+SQL_TOKENS = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\s+")
+DML_TABLE = re.compile(r'^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+"?(\w+)', re.I)
+
+
+def normalize_sql(sql):
+    # Collapses whitespace outside string literals and drops the trailing semicolon
+    sql = SQL_TOKENS.sub(lambda match: ' ' if match.group().isspace() else match.group(), sql)
+    return sql.strip().rstrip(';').strip()
+
+
+def query_tables(conn, sql):
+    # Tables the statement reads. EXPLAIN only prepares it; setting the
+    # authorizer expires cached statements, so it is prepared afresh each time.
+    tables = set()
+
+    def authorizer(action, table, column, database, trigger):
+        if action == sqlite3.SQLITE_READ and table:
+            tables.add(table)
+        return sqlite3.SQLITE_OK
+
+    conn.set_authorizer(authorizer)
+    try:
+        conn.execute(f"EXPLAIN {sql}")
+    finally:
+        conn.set_authorizer(None)
+    return sorted(tables)
+
+
+def trigger_targets(tables):
+    # Tables written by triggers on the given (lowercase) tables
+    derived = dict(SUMMARY_SOURCES)
+    derived.update(SPATIAL_INDEX_SOURCES)
+    derived.update((name, (index['content'],)) for name, index in SEARCH_INDEXES.items())
+    return {target.lower() for target, sources in derived.items()
+            if tables & {source.lower() for source in sources}}
+
+
+def dml_tables(query):
+    # Table written by an INSERT/UPDATE/DELETE, None if it cannot be told
+    match = DML_TABLE.match(query)
+    return [match.group(1)] if match else None
+
+
+def result_size(rows):
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+    return size
+
+
+class QueryCache:
+    # LRU over (columns, rows) results within a memory budget; used from worker threads
+    def __init__(self, budget=QUERY_CACHE_BUDGET):
+        self.budget = budget
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.size = 0
+        # bumped when every table may have changed (DDL, summaries rebuilt)
+        self.epoch = 0
+        self.generations = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def key(self, conn, sql, kind='rows'):
+        # kind tells apart results of the same query stored in different shapes
+        tables = [table.lower() for table in query_tables(conn, sql)]
+        with self.lock:
+            return kind, normalize_sql(sql), self.epoch, tuple((table, self.generations.get(table, 0)) for table in tables)
+
+    def current(self, key):
+        return key[2] == self.epoch and all(self.generations.get(table, 0) == generation for table, generation in key[3])
+
+    def get(self, key):
+        with self.lock:
+            result = self.entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return result
+
+    def put(self, key, columns, rows, size=None):
+        size = result_size(rows) if size is None else size
+        with self.lock:
+            # a write may have landed while the query ran
+            if size > self.budget or not self.current(key):
+                return
+            self.discard(key)
+            self.entries[key] = (columns, rows)
+            self.sizes[key] = size
+            self.size += size
+            while self.size > self.budget:
+                self.discard(next(iter(self.entries)))
+
+    def discard(self, key):
+        if key in self.entries:
+            del self.entries[key]
+            self.size -= self.sizes.pop(key)
+
+    def invalidate(self, tables=None):
+        # Bumps the generation of the given tables and of those their triggers write; None means all
+        with self.lock:
+            if tables is None:
+                self.epoch += 1
+                tables = set()
+            else:
+                tables = {table.lower() for table in tables}
+                tables |= trigger_targets(tables)
+            for table in tables:
+                self.generations[table] = self.generations.get(table, 0) + 1
+            for key in [key for key in self.entries if not self.current(key)]:
+                self.discard(key)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'budget': self.budget,
+            }
+
+
+def cached_fetch(conn, cache, sql, profiler=None):
+    # fetchall() through the cache; cache and profiler may be None
+    key = cache.key(conn, sql) if cache is not None else None
+    result = cache.get(key) if key is not None else None
+    if result is not None:
+        return result[1]
+    with profiled(profiler, conn, sql) as profile:
+        cursor = conn.execute(sql)
+        rows = cursor.fetchall()
+        profile['rows'] = len(rows)
+    if key is not None:
+        cache.put(key, [desc[0] for desc in cursor.description or []], rows)
+    return rows
+
+
+# Chart render cache
+# Charts are rendered once to PNG and kept as bytes, keyed on the chart name and
+# the query cache keys of the data behind it. Clicking a chart again shows the
+# stored image without querying or drawing, until one of its tables changes.
+CHART_CACHE_BUDGET = 32 * 1024 * 1024  # bytes
+
+
+def render_png(fig, dpi=None):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', bbox_inches='tight', dpi=dpi)
+    return buffer.getvalue()
+
+
+class ChartCache:
+    # LRU over (title, PNG bytes) within a memory budget; used from the GUI thread
+    def __init__(self, query_cache, budget=CHART_CACHE_BUDGET):
+        self.query_cache = query_cache
+        self.budget = budget
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, conn, chart, queries):
+        return chart, tuple(self.query_cache.key(conn, sql) for sql in queries)
+
+    def current(self, key):
+        with self.query_cache.lock:
+            return all(self.query_cache.current(data_key) for data_key in key[1])
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or not self.current(key):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, title, png):
+        if len(png) > self.budget or not self.current(key):
             return
-        interests, counts = zip(*data)
-
-        canvas = MplCanvas(self, width=6, height=4)
-        canvas.axes.bar(interests, counts)
-        canvas.axes.set_title("Programs by InterestType")
-        canvas.axes.set_ylabel("Count")
-        canvas.axes.set_xticks(range(len(interests)))
-        canvas.axes.set_xticklabels(interests, rotation=45, ha='center' , fontsize=8)
-        canvas.fig.tight_layout() 
-        
-        self.show_plot_dialog(canvas, "Programs by InterestType")
-
-    def plot_avg_experience_by_department(self):
-        self.cursor.execute("""
-            SELECT j.department, AVG(e.years_of_experience)
-            FROM Employees e
-            JOIN JobTitles j ON e.job_title = j.job_title
-            GROUP BY j.department
-        """)
-        rows = self.cursor.fetchall()
+        # renders of data that has changed since are never shown again
+        for stale in [stale for stale in self.entries if not self.current(stale)]:
+            self.discard(stale)
+        self.discard(key)
+        self.entries[key] = (title, png)
+        self.size += len(png)
+        while self.size > self.budget:
+            self.discard(next(iter(self.entries)))
+
+    def discard(self, key):
+        if key in self.entries:
+            self.size -= len(self.entries.pop(key)[1])
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries), 'bytes': self.size}
+
+
+class ChartExporter:
+    # Writes chart PNGs on a background thread, so saving a file never delays showing the chart
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = None
+
+    def export(self, path, png):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="chart-exporter", daemon=True)
+            self.thread.start()
+        self.queue.put((path, png))
+
+    def run(self):
+        while True:
+            path, png = self.queue.get()
+            try:
+                # written aside and renamed, so a half-written file is never left behind
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(png)
+                os.replace(path + '.tmp', path)
+            except OSError as e:
+                logging.error(f"Error saving chart {path}: {str(e)}")
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        self.queue.join()
+
+
+# Facilities map
+# Zoomed out, the map draws a density grid of per-tile facility counts (tiles
+# of MAP_TILE_CELLS x MAP_TILE_CELLS grid cells), computed with one scan of the
+# grid_cell index and kept in the query cache until Coordinates changes. The
+# density bins are whole multiples of a tile, so every tile lands in one bin. Once
+# the visible box holds at most MAP_POINT_LIMIT facilities, they are fetched
+# for that box only, one grid_cell index range per row of cells. The queries
+# are run by map_tiles and map_points in arrays.py.
+MAP_EXTENT = (-125, -66, 24, 50)  # continental US: west, east, south, north
+MAP_TILE_CELLS = 5
+MAP_POINT_LIMIT = 50000
+MAP_DENSITY_BINS = 120  # across the visible width
+MAP_TILE_QUERY = f'''
+    SELECT grid_cell / {GRID_COLUMNS} / {MAP_TILE_CELLS} AS tile_row,
+           grid_cell % {GRID_COLUMNS} / {MAP_TILE_CELLS} AS tile_col,
+           COUNT(*), AVG(latitude_measure), AVG(longitude_measure)
+    FROM Coordinates
+    WHERE grid_cell IS NOT NULL
+    GROUP BY tile_row, tile_col
+'''
+MAP_POINTS_QUERY = '''
+    SELECT latitude_measure, longitude_measure FROM Coordinates
+    WHERE grid_cell BETWEEN ? AND ? AND latitude_measure BETWEEN ? AND ? AND longitude_measure BETWEEN ? AND ?
+'''
+
+
+# Spatial search
+# CoordinatesIndex is an R*Tree over the facility coordinates, keyed by the
+# rowid of Coordinates and kept current by triggers (rebuilt in one pass after
+# a bulk load, like the summaries). The R*Tree stores 32-bit floats rounded
+# outwards, so its boxes give candidates that are checked against the exact
+# REAL columns. Radius search looks up the circle's bounding box and keeps the
+# candidates within the great-circle distance; nearest neighbours widen the
+# radius until it holds k facilities. Without the R*Tree module the same
+# searches scan Coordinates.
+EARTH_RADIUS_KM = 6371.0088
+SPATIAL_RESULT_LIMIT = 1000
+NEAREST_START_KM = 5.0
+SPATIAL_COLUMNS = ['Registry ID', 'Facility Name', 'Address', 'Latitude', 'Longitude', 'Distance (km)', 'Programs']
+# Base table the R*Tree is kept current from, through the triggers
+SPATIAL_INDEX_SOURCES = {'CoordinatesIndex': ('Coordinates',)}
+SPATIAL_INDEX_TABLE = "CREATE VIRTUAL TABLE IF NOT EXISTS CoordinatesIndex USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+SPATIAL_INDEX_TRIGGERS = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS spatial_coordinates_insert AFTER INSERT ON Coordinates
+    WHEN NEW.latitude_measure IS NOT NULL AND NEW.longitude_measure IS NOT NULL
+    BEGIN
+        INSERT INTO CoordinatesIndex VALUES (NEW.rowid, NEW.latitude_measure, NEW.latitude_measure,
+                                             NEW.longitude_measure, NEW.longitude_measure);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS spatial_coordinates_update AFTER UPDATE OF latitude_measure, longitude_measure ON Coordinates
+    BEGIN
+        DELETE FROM CoordinatesIndex WHERE id = OLD.rowid;
+        INSERT INTO CoordinatesIndex
+        SELECT NEW.rowid, NEW.latitude_measure, NEW.latitude_measure, NEW.longitude_measure, NEW.longitude_measure
+        WHERE NEW.latitude_measure IS NOT NULL AND NEW.longitude_measure IS NOT NULL;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS spatial_coordinates_delete AFTER DELETE ON Coordinates
+    BEGIN
+        DELETE FROM CoordinatesIndex WHERE id = OLD.rowid;
+    END
+    ''',
+]
+# Inserted in grid cell order, so neighbouring facilities share R*Tree nodes
+SPATIAL_INDEX_FILL = '''
+    INSERT INTO CoordinatesIndex
+    SELECT rowid, latitude_measure, latitude_measure, longitude_measure, longitude_measure FROM Coordinates
+    WHERE latitude_measure IS NOT NULL AND longitude_measure IS NOT NULL
+    ORDER BY grid_cell
+'''
+SPATIAL_CANDIDATES_QUERY = '''
+    SELECT c.registry_id, c.latitude_measure, c.longitude_measure
+    FROM CoordinatesIndex s
+    JOIN Coordinates c ON c.rowid = s.id
+    WHERE s.max_lon >= ? AND s.min_lon <= ? AND s.max_lat >= ? AND s.min_lat <= ?
+      AND c.longitude_measure BETWEEN ? AND ? AND c.latitude_measure BETWEEN ? AND ?
+'''
+SPATIAL_SCAN_QUERY = '''
+    SELECT registry_id, latitude_measure, longitude_measure FROM Coordinates
+    WHERE longitude_measure BETWEEN ? AND ? AND latitude_measure BETWEEN ? AND ?
+'''
+SPATIAL_DETAILS_QUERY = '''
+    SELECT c.registry_id, f.facility_site_name, f.location_address_text,
+           GROUP_CONCAT(fp.program_identifier, ', ')
+    FROM Coordinates c
+    LEFT JOIN Facilities f ON f.registry_id = c.registry_id
+    LEFT JOIN FacilityPrograms fp ON fp.registry_id = c.registry_id
+    WHERE c.registry_id IN ({})
+    GROUP BY c.registry_id
+'''
+SPATIAL_DETAILS_CHUNK = 500
+
+
+def spatial_index_enabled(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'CoordinatesIndex'").fetchone() is not None
+
+
+def create_spatial_index(conn):
+    # Returns False when SQLite was built without the R*Tree module
+    existed = spatial_index_enabled(conn)
+    try:
+        conn.execute(SPATIAL_INDEX_TABLE)
+    except sqlite3.OperationalError as e:
+        logging.warning(f"No spatial index, searches will scan Coordinates: {str(e)}")
+        return False
+    for sql in SPATIAL_INDEX_TRIGGERS:
+        conn.execute(sql)
+    if not existed:
+        rebuild_spatial_index(conn)
+    return True
+
+
+def rebuild_spatial_index(conn):
+    # Dropping the R*Tree is much faster than deleting its rows; the triggers only name it
+    conn.execute("DROP TABLE IF EXISTS CoordinatesIndex")
+    conn.execute(SPATIAL_INDEX_TABLE)
+    conn.execute(SPATIAL_INDEX_FILL)
+    conn.commit()
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(math.sqrt(a), 1.0))
+
+
+def radius_boxes(latitude, longitude, radius_km):
+    # Bounding boxes (west, east, south, north) of a circle, two when it crosses the antimeridian
+    angle = radius_km / EARTH_RADIUS_KM
+    south, north = latitude - math.degrees(angle), latitude + math.degrees(angle)
+    if south <= -90 or north >= 90:
+        # the circle holds a pole
+        return [(-180, 180, max(south, -90), min(north, 90))]
+    ratio = math.sin(angle) / math.cos(math.radians(latitude))
+    if ratio >= 1:
+        return [(-180, 180, south, north)]
+    west, east = longitude - math.degrees(math.asin(ratio)), longitude + math.degrees(math.asin(ratio))
+    if west < -180:
+        return [(west + 360, 180, south, north), (-180, east, south, north)]
+    if east > 180:
+        return [(west, 180, south, north), (-180, east - 360, south, north)]
+    return [(west, east, south, north)]
+
+
+def spatial_candidates(conn, extent, limit=None):
+    # (registry_id, latitude, longitude) of the facilities inside extent
+    west, east, south, north = extent
+    if spatial_index_enabled(conn):
+        sql, args = SPATIAL_CANDIDATES_QUERY, (west, east, south, north, west, east, south, north)
+    else:
+        sql, args = SPATIAL_SCAN_QUERY, (west, east, south, north)
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+    return conn.execute(sql, args).fetchall()
+
+
+def within_radius(conn, latitude, longitude, radius_km):
+    # (distance_km, registry_id, latitude, longitude) of the facilities in the circle, nearest first
+    found = []
+    for box in radius_boxes(latitude, longitude, radius_km):
+        for registry_id, lat, lon in spatial_candidates(conn, box):
+            distance = haversine_km(latitude, longitude, lat, lon)
+            if distance <= radius_km:
+                found.append((distance, registry_id, lat, lon))
+    found.sort()
+    return found
+
+
+def spatial_rows(conn, found):
+    # SPATIAL_COLUMNS rows for (distance_km, registry_id, latitude, longitude) tuples, in the same order
+    details = {}
+    for start in range(0, len(found), SPATIAL_DETAILS_CHUNK):
+        ids = [entry[1] for entry in found[start:start + SPATIAL_DETAILS_CHUNK]]
+        for registry_id, name, address, programs in conn.execute(
+                SPATIAL_DETAILS_QUERY.format(', '.join('?' * len(ids))), ids):
+            details[registry_id] = (name, address, programs)
+    rows = []
+    for distance, registry_id, lat, lon in found:
+        name, address, programs = details.get(registry_id, (None, None, None))
+        rows.append((registry_id, name, address, lat, lon,
+                     round(distance, 3) if distance is not None else None, programs))
+    return rows
+
+
+def facilities_in_box(conn, extent, limit=SPATIAL_RESULT_LIMIT):
+    return spatial_rows(conn, [(None, registry_id, lat, lon)
+                               for registry_id, lat, lon in spatial_candidates(conn, extent, limit)])
+
+
+def facilities_within(conn, latitude, longitude, radius_km, limit=SPATIAL_RESULT_LIMIT):
+    return spatial_rows(conn, within_radius(conn, latitude, longitude, radius_km)[:limit])
+
+
+def nearest_facilities(conn, latitude, longitude, k=10):
+    # Everything within the radius is found, so once it holds k facilities they are the k nearest
+    radius = NEAREST_START_KM
+    while True:
+        found = within_radius(conn, latitude, longitude, radius)
+        if len(found) >= k or radius >= math.pi * EARTH_RADIUS_KM:
+            return spatial_rows(conn, found[:k])
+        radius *= 4
+
+
+def facility_location(conn, registry_id):
+    # (latitude, longitude) of a facility, or None if it has no coordinates
+    row = conn.execute("SELECT latitude_measure, longitude_measure FROM Coordinates WHERE registry_id = ?",
+                       (registry_id,)).fetchone()
+    return row if row and None not in row else None
+
+
+# Full-text search
+# FTS5 indexes over facility names and addresses (FacilitiesSearch) and program
+# names and descriptions (ProgramsSearch). Both are external-content tables: they
+# hold only the index and read the text back from Facilities and
+# ProgramAttributes by rowid. Triggers keep them current on imports and DML, and
+# bulk loads rebuild them once. All words typed must match, the last one as a
+# prefix; complete words are exact terms, whose doclists FTS5 can skip through
+# instead of merging every term with the prefix. Results are ranked by bm25 with
+# the name weighted over the address or description. bm25 reads every match,
+# so a search matching SEARCH_RANK_ROWS or more (a short prefix on the national
+# registry) returns the first matches in table order instead.
+SEARCH_RESULT_LIMIT = 50
+SEARCH_RANK_ROWS = 10000
+SEARCH_DELAY_MS = 150  # the window searches this long after the last keystroke
+SEARCH_COLUMNS = ['Kind', 'ID', 'Name', 'Match']
+SEARCH_INDEXES = {
+    'FacilitiesSearch': {
+        'content': 'Facilities',
+        'columns': ('facility_site_name', 'location_address_text'),
+        'kind': 'Facility',
+        'key': 'registry_id',
+    },
+    'ProgramsSearch': {
+        'content': 'ProgramAttributes',
+        'columns': ('program_common_name', 'program_description'),
+        'kind': 'Program',
+        'key': 'interest_type_id',
+    },
+}
+
+
+def search_index_sql(name):
+    index = SEARCH_INDEXES[name]
+    columns = ', '.join(index['columns'])
+    new_values = ', '.join(f"NEW.{column}" for column in index['columns'])
+    old_values = ', '.join(f"OLD.{column}" for column in index['columns'])
+    table = (f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5({columns}, content='{index['content']}', "
+             f"content_rowid='rowid', prefix='2 3', tokenize='unicode61 remove_diacritics 2')")
+    # the FTS5 'delete' command needs the old text to remove its terms
+    insert = f"INSERT INTO {name} (rowid, {columns}) VALUES (NEW.rowid, {new_values});"
+    delete = f"INSERT INTO {name} ({name}, rowid, {columns}) VALUES ('delete', OLD.rowid, {old_values});"
+    prefix = f"search_{index['content'].lower()}"
+    triggers = [
+        f"CREATE TRIGGER IF NOT EXISTS {prefix}_insert AFTER INSERT ON {index['content']} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {prefix}_update AFTER UPDATE OF {columns} ON {index['content']} BEGIN {delete} {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {prefix}_delete AFTER DELETE ON {index['content']} BEGIN {delete} END",
+    ]
+    return table, triggers
+
+
+def search_index_enabled(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'FacilitiesSearch'").fetchone() is not None
+
+
+def create_search_index(conn):
+    # Returns False when SQLite was built without FTS5
+    existed = search_index_enabled(conn)
+    try:
+        for name in SEARCH_INDEXES:
+            table, triggers = search_index_sql(name)
+            conn.execute(table)
+            for sql in triggers:
+                conn.execute(sql)
+    except sqlite3.OperationalError as e:
+        logging.warning(f"No full-text search index: {str(e)}")
+        return False
+    if not existed:
+        rebuild_search_index(conn)
+    return True
+
+
+def rebuild_search_index(conn):
+    for name in SEARCH_INDEXES:
+        conn.execute(f"INSERT INTO {name} ({name}) VALUES ('rebuild')")
+    conn.commit()
+
+
+def search_expression(text):
+    # All words required; the last one is a prefix while it is being typed: 'main st' -> "main" "st"*
+    words = re.findall(r'\w+', text)
+    terms = [f'"{word}"' for word in words]
+    if terms and re.search(r'\w$', text):
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_facilities(conn, text, limit=SEARCH_RESULT_LIMIT):
+    # Returns (SEARCH_COLUMNS rows, whether they are ranked); the match is a snippet with the hits in [brackets]
+    expression = search_expression(text)
+    if not expression:
+        return [], True
+    results = []
+    ranked = True
+    for name, index in SEARCH_INDEXES.items():
+        select = f'''
+            SELECT '{index['kind']}', t.{index['key']}, t.{index['columns'][0]},
+                   snippet({name}, -1, '[', ']', '...', 10), bm25({name}, 2.0, 1.0)
+            FROM {name} s JOIN {index['content']} t ON t.rowid = s.rowid
+            WHERE {name} MATCH ?
+        '''
+        matches = conn.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM {name} WHERE {name} MATCH ? LIMIT ?)",
+                               (expression, SEARCH_RANK_ROWS)).fetchone()[0]
+        if matches < SEARCH_RANK_ROWS:
+            results += conn.execute(select + " ORDER BY 5 LIMIT ?", (expression, limit)).fetchall()
+        else:
+            # too common to rank while typing; the first matches in table order
+            results += conn.execute(select + " LIMIT ?", (expression, limit)).fetchall()
+            ranked = False
+    if ranked:
+        results.sort(key=lambda row: row[4])
+    return [row[:4] for row in results[:limit]], ranked
+
+
+# Result export
+# Results are written EXPORT_CHUNK_ROWS rows at a time from the cursor, so
+# memory stays bounded whatever the size of the result. Files are written next
+# to the target and renamed into place once complete. Besides CSV there is a
+# compact columnar format (.dcol), laid out like Parquet: each chunk of rows is
+# a row group holding one zlib-compressed block per column, and a JSON footer
+# at the end of the file gives the columns and the type, offset and length of
+# every block. The blocks are encoded and decoded in arrays.py.
+EXPORT_CHUNK_ROWS = 65536
+EXPORT_FORMATS = ('csv', 'columnar')
+COLUMNAR_EXTENSION = '.dcol'
+
+
+def write_csv(cursor, f, progress=None, delimiter=',', max_rows=None):
+    # Returns the number of rows written, at most max_rows
+    writer = csv.writer(f, delimiter=delimiter, lineterminator='\n')
+    writer.writerow([desc[0] for desc in cursor.description or []])
+    written = 0
+    while max_rows is None or written < max_rows:
+        rows = cursor.fetchmany(EXPORT_CHUNK_ROWS if max_rows is None else min(EXPORT_CHUNK_ROWS, max_rows - written))
         if not rows:
-            QMessageBox.information(self, "No Data", "No department data found.")
-            return
+            break
+        writer.writerows(rows)
+        written += len(rows)
+        if progress:
+            progress(written)
+    return written
+
+
+def export_format(file_path):
+    return 'columnar' if file_path.lower().endswith(COLUMNAR_EXTENSION) else 'csv'
+
+
+def export_result(conn, sql, file_path, fmt=None, progress=None):
+    # Streams the result of sql to file_path; returns {'rows', 'bytes', 'seconds'}
+    start = time.perf_counter()
+    partial_path = file_path + '.part'
+    cursor = conn.execute(sql)
+    try:
+        if (fmt or export_format(file_path)) == 'csv':
+            with open(partial_path, 'w', newline='', encoding='utf-8') as f:
+                written = write_csv(cursor, f, progress)
+        else:
+            import arrays
+            with open(partial_path, 'wb') as f:
+                written = arrays.write_columnar(cursor, f, progress)
+        os.replace(partial_path, file_path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    finally:
+        cursor.close()
+        if conn.in_transaction:
+            conn.commit()
+    return {'rows': written, 'bytes': os.path.getsize(file_path), 'seconds': time.perf_counter() - start}
+
+
+# Connection pool
+# The window's connections: one writer and up to POOL_READERS read-only
+# readers (mode=ro URIs), usable from any thread by one user at a time. The
+# database is switched to WAL, so a reader keeps seeing the snapshot of the
+# last commit while an import writes, and neither blocks the other.
+# Bookkeeping writes (query log, slow queries) are deferred until the writer
+# is free rather than waiting behind an import.
+POOL_READERS = 4
+
+
+class ConnectionPool:
+    def __init__(self, db_path, readers=POOL_READERS, timeout=30):
+        self.db_path = db_path
+        self.size = readers
+        self.timeout = timeout
+        self.writer_conn = sqlite3.connect(db_path, timeout=timeout, check_same_thread=False)
+        self.writer_conn.execute("PRAGMA journal_mode = WAL")
+        self.write_lock = threading.Lock()
+        # functions of the writer connection waiting for it to be free
+        self.deferred = deque()
+        self.available = threading.Condition()
+        self.idle = []
+        self.opened = 0
+        self.in_use = 0
+        self.counters = {'reads': 0, 'read_waits': 0, 'read_wait_seconds': 0.0, 'peak_in_use': 0,
+                         'writes': 0, 'write_waits': 0, 'write_wait_seconds': 0.0}
+
+    def open_reader(self, check_same_thread=False):
+        uri = pathlib.Path(self.db_path).resolve().as_uri() + '?mode=ro'
+        return sqlite3.connect(uri, uri=True, timeout=self.timeout, check_same_thread=check_same_thread)
+
+    def acquire(self):
+        # A reader for as long as the caller needs it; hand it back with release()
+        start = time.perf_counter()
+        with self.available:
+            waited = not self.idle and self.opened >= self.size
+            while not self.idle and self.opened >= self.size:
+                self.available.wait()
+            conn = self.idle.pop() if self.idle else None
+            if conn is None:
+                self.opened += 1
+            self.in_use += 1
+            self.counters['reads'] += 1
+            self.counters['peak_in_use'] = max(self.counters['peak_in_use'], self.in_use)
+            if waited:
+                self.counters['read_waits'] += 1
+                self.counters['read_wait_seconds'] += time.perf_counter() - start
+        if conn is None:
+            try:
+                conn = self.open_reader()
+            except sqlite3.Error:
+                with self.available:
+                    self.opened -= 1
+                    self.in_use -= 1
+                    self.available.notify()
+                raise
+        return conn
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self.available:
+            self.idle.append(conn)
+            self.in_use -= 1
+            self.available.notify()
+
+    @contextmanager
+    def reader(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def writer(self):
+        start = time.perf_counter()
+        waited = not self.write_lock.acquire(blocking=False)
+        if waited:
+            self.write_lock.acquire()
+        with self.available:
+            self.counters['writes'] += 1
+            if waited:
+                self.counters['write_waits'] += 1
+                self.counters['write_wait_seconds'] += time.perf_counter() - start
+        try:
+            yield self.writer_conn
+        finally:
+            if self.writer_conn.in_transaction:
+                self.writer_conn.rollback()
+            self.run_deferred()
+            self.write_lock.release()
+        # a write deferred between run_deferred() and the release
+        self.flush()
+
+    def defer(self, fn):
+        # Runs fn(writer connection) now if the writer is free, otherwise once it is released
+        self.deferred.append(fn)
+        self.flush()
+
+    def flush(self):
+        if self.deferred and self.write_lock.acquire(blocking=False):
+            try:
+                self.run_deferred()
+            finally:
+                self.write_lock.release()
+
+    def run_deferred(self):
+        while self.deferred:
+            fn = self.deferred.popleft()
+            try:
+                fn(self.writer_conn)
+            except sqlite3.Error as e:
+                logging.error(f"Error in deferred write: {str(e)}")
+                if self.writer_conn.in_transaction:
+                    self.writer_conn.rollback()
+
+    def stats(self):
+        with self.available:
+            return dict(self.counters, size=self.size, opened=self.opened, in_use=self.in_use, idle=len(self.idle),
+                        writer_busy=self.write_lock.locked(), deferred=len(self.deferred))
+
+    def close(self):
+        # Runs the deferred writes and closes the connections; call it once every reader is back
+        self.flush()
+        with self.available:
+            for conn in self.idle:
+                conn.close()
+            self.idle = []
+            self.opened = self.in_use
+        self.writer_conn.close()
+
+
+# Command line
+# Headless imports, queries, views and exports, for scripted loads. Without
+# a command the window opens; PyQt6 and matplotlib are only imported then.
+XML_MODES = {'streaming': stream_xml, 'parallel': parallel_xml, 'dom': load_xml_dom, 'incremental': incremental_xml,
+             'partitioned': partitioned_xml}
+JSON_MODES = {'streaming': stream_json, 'whole': load_json, 'incremental': incremental_json}
+# loaders that always insert the whole file in one transaction
+WHOLE_FILE_LOADERS = (load_xml_dom, load_json)
+
+
+def import_file(conn, loader, file_path, bulk=False, progress=None):
+    # Runs one of the XML or JSON loaders, with the bulk-load settings if asked for
+    with bulk_load(conn) if bulk else nullcontext():
+        if loader in WHOLE_FILE_LOADERS:
+            return loader(conn, file_path, progress=progress)
+        return loader(conn, file_path, single_transaction=bulk, progress=progress)
+
+
+def print_progress(rows):
+    if sys.stderr.isatty():
+        print(f"\r{rows:,} rows processed", end='', file=sys.stderr, flush=True)
+
+
+def source_query(source):
+    # A table or view name, or a query
+    return f'SELECT * FROM "{source}"' if re.fullmatch(r'\w+', source) else source
+
+
+def write_rows(conn, sql, out, delimiter, profiler=None, timeout=None, max_rows=None):
+    # Streams the result with a header row; returns (rows written, whether that was the whole result)
+    with profiled(profiler, conn, sql, timeout) as profile:
+        cursor = conn.execute(sql)
+        written = profile['rows'] = write_csv(cursor, out, delimiter=delimiter, max_rows=max_rows)
+        complete = max_rows is None or written < max_rows or cursor.fetchone() is None
+        cursor.close()
+    if conn.in_transaction:
+        conn.commit()
+    return written, complete
+
+
+def print_rows(conn, sql, args, profiler):
+    written, complete = write_rows(conn, sql, sys.stdout, '\t', profiler, args.timeout, args.max_rows)
+    if not complete:
+        print(f"Incomplete result: stopped after {written:,} rows (--max-rows)", file=sys.stderr)
+
+
+def print_spatial(conn, args):
+    if args.box:
+        rows = facilities_in_box(conn, args.box, args.max_rows or SPATIAL_RESULT_LIMIT)
+    else:
+        center = args.near
+        if args.facility:
+            center = facility_location(conn, args.facility)
+            if center is None:
+                raise ValueError(f"facility {args.facility} has no coordinates")
+        if args.radius is not None:
+            rows = facilities_within(conn, *center, args.radius, args.max_rows or SPATIAL_RESULT_LIMIT)
+        else:
+            rows = nearest_facilities(conn, *center, args.k)
+    writer = csv.writer(sys.stdout, delimiter='\t', lineterminator='\n')
+    writer.writerow(SPATIAL_COLUMNS)
+    writer.writerows(rows)
+
+
+def run_command(conn, args):
+    profiler = QueryProfiler(args.slow_threshold)
+    if args.command in ('import-xml', 'import-json'):
+        loader = (XML_MODES if args.command == 'import-xml' else JSON_MODES)[args.mode]
+        import_file(conn, loader, args.file, args.bulk, print_progress)
+        if sys.stderr.isatty():
+            print(file=sys.stderr)
+        print(f"{args.file} imported")
+    elif args.command == 'query':
+        query = args.sql
+        if query.split()[0].upper() in DML_MESSAGES:
+            statement, _, _ = execute_sql(conn, query, profiler, args.timeout)
+            print(DML_MESSAGES[statement])
+        else:
+            print_rows(conn, query, args, profiler)
+    elif args.command == 'view':
+        if args.summaries and not summaries_enabled(conn):
+            raise ValueError("materialized summaries are not enabled; run 'app.py summaries on' first")
+        print_rows(conn, view_query(args.name, args.summaries), args, profiler)
+    elif args.command == 'export':
+        stats = export_result(conn, source_query(args.source), args.output, args.format, print_progress)
+        if sys.stderr.isatty():
+            print(file=sys.stderr)
+        print(f"{stats['rows']:,} rows written to {args.output} "
+              f"({stats['bytes'] / 2**20:.1f} MB, {stats['bytes'] / 2**20 / stats['seconds']:.1f} MB/s)")
+    elif args.command == 'slow-queries':
+        if args.clear:
+            clear_slow_queries(conn)
+            print("Slow-query log cleared")
+        else:
+            print(format_query_profiles(slow_queries(conn, args.limit)))
+    elif args.command == 'spatial':
+        print_spatial(conn, args)
+    elif args.command == 'search':
+        writer = csv.writer(sys.stdout, delimiter='\t', lineterminator='\n')
+        writer.writerow(SEARCH_COLUMNS)
+        rows, ranked = search_facilities(conn, args.text, args.max_rows or SEARCH_RESULT_LIMIT)
+        writer.writerows(rows)
+        if not ranked:
+            print(f"More than {SEARCH_RANK_ROWS:,} matches, not ranked", file=sys.stderr)
+    elif args.command == 'summaries':
+        if args.state == 'on':
+            enable_summaries(conn)
+        else:
+            disable_summaries(conn)
+        conn.commit()
+        print(f"Materialized summaries {'enabled' if args.state == 'on' else 'disabled'}")
+    elif args.command == 'partition':
+        counts = partition_database(conn, args.workers)
+        print(f"{counts['Facilities']:,} facilities split into {len(SHARD_REGIONS)} shards in {shard_dir(args.db)}")
+    elif args.command == 'shard-query':
+        columns, rows = shard_aggregate(args.db, args.name, args.workers)
+        writer = csv.writer(sys.stdout, delimiter='\t', lineterminator='\n')
+        writer.writerow(columns)
+        writer.writerows(rows[:args.max_rows] if args.max_rows else rows)
+    if args.profile:
+        for profile in profiler.recent_profiles():
+            print(f"{profile['seconds']:.3f} s, {profile['rows']:,} rows, {profile['vm_steps']:,} VM steps\n"
+                  f"{profile['plan']}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Database Management System. Opens the window unless a command is given.")
+    parser.add_argument('--db', default='project.db', help="SQLite database (default: project.db)")
+    parser.add_argument('--profile', action='store_true', help="print the time, rows, VM steps and plan of queries to stderr")
+    parser.add_argument('--slow-threshold', type=float, default=SLOW_QUERY_SECONDS,
+                        help=f"seconds from which queries go to the slow-query log (default: {SLOW_QUERY_SECONDS})")
+    parser.add_argument('--timeout', type=float, help="stop query and view after this many seconds")
+    parser.add_argument('--max-rows', type=int, help="print at most this many rows of query, view, spatial, search, shard-query")
+    sub = parser.add_subparsers(dest='command')
+    xml_parser = sub.add_parser('import-xml', help="Import an EPA XML file")
+    xml_parser.add_argument('file')
+    xml_parser.add_argument('--mode', choices=XML_MODES, default='streaming')
+    xml_parser.add_argument('--bulk', action='store_true', help="fast settings, one transaction")
+    json_parser = sub.add_parser('import-json', help="Import an employees JSON file")
+    json_parser.add_argument('file')
+    json_parser.add_argument('--mode', choices=JSON_MODES, default='streaming')
+    json_parser.add_argument('--bulk', action='store_true', help="fast settings, one transaction")
+    query_parser = sub.add_parser('query', help="Run a SQL statement and print the rows tab-separated")
+    query_parser.add_argument('sql', help="statement, or - to read it from stdin")
+    view_parser = sub.add_parser('view', help="Print a predefined view")
+    view_parser.add_argument('name', choices=SUMMARY_QUERIES)
+    view_parser.add_argument('--summaries', action='store_true', help="read the materialized summary tables")
+    summaries_parser = sub.add_parser('summaries', help="Turn the materialized summary tables on or off")
+    summaries_parser.add_argument('state', choices=('on', 'off'))
+    export_parser = sub.add_parser('export', help="Write a table, view or query to a CSV or columnar file")
+    export_parser.add_argument('source', help="table or view name, or a SELECT statement")
+    export_parser.add_argument('output')
+    export_parser.add_argument('--format', choices=EXPORT_FORMATS,
+                               help=f"default: columnar for {COLUMNAR_EXTENSION} files, CSV otherwise")
+    slow_parser = sub.add_parser('slow-queries', help="List the slowest logged queries with their plans")
+    slow_parser.add_argument('--limit', type=int, default=20)
+    slow_parser.add_argument('--clear', action='store_true', help="empty the slow-query log")
+    spatial_parser = sub.add_parser('spatial', help="Facilities in a box, within a radius or nearest to a point")
+    where = spatial_parser.add_mutually_exclusive_group(required=True)
+    where.add_argument('--box', type=float, nargs=4, metavar=('WEST', 'EAST', 'SOUTH', 'NORTH'))
+    where.add_argument('--near', type=float, nargs=2, metavar=('LAT', 'LON'))
+    where.add_argument('--facility', metavar='REGISTRY_ID', help="search around this facility")
+    spatial_parser.add_argument('--radius', type=float, help="km; without it the --k nearest are listed")
+    spatial_parser.add_argument('--k', type=int, default=10)
+    search_parser = sub.add_parser('search', help="Full-text search of facility names, addresses and programs")
+    search_parser.add_argument('text', help="words to find, each as a prefix")
+    partition_parser = sub.add_parser('partition', help="Split the facility tables into one database per region")
+    partition_parser.add_argument('--workers', type=int, help="processes (default: all cores)")
+    shard_parser = sub.add_parser('shard-query', help="Run an aggregate on every region shard at once and merge")
+    shard_parser.add_argument('name', choices=SHARD_AGGREGATES)
+    shard_parser.add_argument('--workers', type=int, help="processes (default: all cores)")
+    args = parser.parse_args(argv)
+    if args.command == 'query':
+        if args.sql == '-':
+            args.sql = sys.stdin.read()
+        if not args.sql.strip():
+            query_parser.error("empty SQL statement")
+    if args.command is None:
+        import gui
+        return gui.run(args.db)
+    conn = sqlite3.connect(args.db, timeout=30)
+    try:
+        create_schema(conn)
+        run_command(conn, args)
+    except BrokenPipeError:
+        # the reader stopped early (e.g. piped into head); keep Python from reporting it again at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    except (sqlite3.Error, OSError, ValueError, ET.ParseError) as e:
+        logging.error(f"Error running {args.command}: {str(e)}")
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+    return 0
 
-        depts, avgs = zip(*rows)
-
-        canvas = MplCanvas(self, width=6, height=4)
-        canvas.axes.bar(depts, avgs)
-        canvas.axes.set_title("Avg Experience by Department")
-        canvas.axes.set_ylabel("Years of Experience")
-
-        self.show_plot_dialog(canvas, "Avg Experience by Department")
-
-    def show_plot_dialog(self, canvas, title):
-        dialog = QDialog(self)
-        dialog.setWindowTitle(title)
-        layout = QVBoxLayout()
-        scroll_area = QScrollArea()
-        scroll_area.setWidget(canvas)
-        scroll_area.setWidgetResizable(True)
-        layout.addWidget(scroll_area)
-        dialog.setLayout(layout)
-        dialog.resize(700, 500)
-        dialog.exec()
-    
-    def plot_facilities_scatter(self):
-        self.cursor.execute("""
-            SELECT c.registry_id, c.latitude_measure, c.longitude_measure, f.facility_site_name
-            FROM Coordinates c
-            JOIN Facilities f ON c.registry_id = f.registry_id
-            WHERE c.latitude_measure IS NOT NULL AND c.longitude_measure IS NOT NULL
-        """)
-        data = self.cursor.fetchall()
-        if not data:
-            QMessageBox.warning(self, "No Data", "No valid coordinate data available for Facilities.")
-            return
-        
-       
-        lats = [row[1] for row in data]
-        lons = [row[2] for row in data]
-        
-        canvas = MplCanvas(self, width=8, height=6)
-        canvas.axes.scatter(lons, lats, color='blue')
-        
-        
-        canvas.axes.set_title("Facilities on Scatter Plot")
-        canvas.axes.set_xlabel("Longitude")
-        canvas.axes.set_ylabel("Latitude")
-        canvas.axes.grid(True)
-        canvas.fig.tight_layout()
-        canvas.fig.savefig("facilities_scatter.png", bbox_inches='tight')
-        self.show_plot_dialog(canvas, "Facilities on Scatter Plot")
-
-    def closeEvent(self, event):
-        self.conn.close()
-        event.accept()
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    app.setStyle('Fusion')
-    window = DatabaseApp()
-    window.show()
-    sys.exit(app.exec())
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,619 @@
+# NumPy-backed code: columnar fetch and the chart helpers, the employee
+# snapshot of the dashboard, map tiles, functional dependency discovery and the
+# columnar export format. Imported where it is first needed, so the command
+# line and the imports do not pay for loading NumPy.
+import itertools
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app import EXPORT_CHUNK_ROWS, GRID_CELL_DEGREES, GRID_COLUMNS, MAP_POINTS_QUERY, MAP_TILE_QUERY, profiled
+
+
+# Columnar fetch
+# Query results loaded straight into one NumPy array per column, FETCH_CHUNK_ROWS
+# rows at a time. Columns are float64 (NULL becomes NaN) unless dtypes maps
+# the column name to another type, e.g. object for text.
+FETCH_CHUNK_ROWS = 65536
+
+
+def array_size(arrays):
+    size = 0
+    for array in arrays:
+        size += array.nbytes
+        if array.dtype == object:
+            size += sum(map(sys.getsizeof, array))
+    return size
+
+
+def fetch_arrays(conn, sql, dtypes=None, cache=None, progress=None, profiler=None):
+    # Returns {column: array}; cache and profiler may be None
+    key = cache.key(conn, sql, 'arrays') if cache is not None else None
+    cached = cache.get(key) if key is not None else None
+    if cached is not None:
+        return dict(zip(*cached))
+    with profiled(profiler, conn, sql) as profile:
+        cursor = conn.execute(sql)
+        columns = [desc[0] for desc in cursor.description]
+        types = [(dtypes or {}).get(column, float) for column in columns]
+        numeric = all(dtype is float for dtype in types)
+        chunks = [[] for _ in columns]
+        loaded = 0
+        while True:
+            rows = cursor.fetchmany(FETCH_CHUNK_ROWS)
+            if not rows:
+                break
+            if numeric:
+                # one conversion for the whole chunk; fromiter is much faster than
+                # np.array on a list of tuples but cannot turn NULL into NaN
+                try:
+                    block = np.fromiter(itertools.chain.from_iterable(rows), dtype=float,
+                                        count=len(rows) * len(columns))
+                except TypeError:
+                    block = np.array(rows, dtype=float)
+                block = block.reshape(len(rows), len(columns))
+                for number in range(len(columns)):
+                    chunks[number].append(block[:, number])
+            else:
+                for number, (values, dtype) in enumerate(zip(zip(*rows), types)):
+                    chunks[number].append(np.array(values, dtype=dtype))
+            loaded += len(rows)
+            if progress:
+                progress(loaded)
+        profile['rows'] = loaded
+    arrays = [np.concatenate(parts) if parts else np.empty(0, dtype=dtype) for parts, dtype in zip(chunks, types)]
+    if key is not None:
+        cache.put(key, columns, arrays, array_size(arrays))
+    return dict(zip(columns, arrays))
+
+
+def valid(values):
+    return ~np.isnan(values) if values.dtype.kind == 'f' else np.ones(len(values), dtype=bool)
+
+
+def histogram(values, bins=10, weights=None):
+    # np.histogram without NaN; weights count repeated values, e.g. from a GROUP BY
+    keep = valid(values)
+    return np.histogram(values[keep], bins=bins, weights=None if weights is None else weights[keep])
+
+
+def bin_values(values, edges):
+    # Index of the bin of each value, -1 outside the edges or for NaN
+    index = np.digitize(values, edges) - 1
+    index[(index >= len(edges) - 1) | ~valid(values)] = -1
+    return index
+
+
+def group_mean(keys, values):
+    # Returns (distinct keys, mean of values per key), NaN values skipped
+    keep = valid(values)
+    groups, inverse = np.unique(keys[keep], return_inverse=True)
+    sums = np.bincount(inverse, weights=values[keep], minlength=len(groups))
+    return groups, sums / np.bincount(inverse, minlength=len(groups))
+
+
+def group_percentiles(keys, values, percentiles):
+    # Returns (distinct keys, array of one row per key and one column per
+    # percentile), interpolated like np.percentile. The values are sorted once,
+    # then stably by group, which leaves each group's values in order.
+    keep = valid(values)
+    keys, values = keys[keep], values[keep]
+    groups, inverse = np.unique(keys, return_inverse=True)
+    order = np.argsort(values)
+    ordered = values[order[np.argsort(inverse[order], kind='stable')]]
+    counts = np.bincount(inverse, minlength=len(groups))
+    starts = np.cumsum(counts) - counts
+    positions = starts[:, None] + (counts[:, None] - 1) * (np.asarray(percentiles, dtype=float) / 100)[None, :]
+    lower = np.floor(positions).astype(int)
+    upper = np.ceil(positions).astype(int)
+    fraction = positions - lower
+    return groups, ordered[lower] * (1 - fraction) + ordered[upper] * fraction
+
+
+# Employee snapshot
+# Employees joined with JobTitles, held in memory for the cross-filter
+# dashboard: one NumPy array per numeric column (NULL becomes NaN) and, for
+# gender, job_title and department, a sorted dictionary of the distinct values
+# (NULL last) with one small integer code per row. A filter is a boolean mask
+# over the rows: a range test on a numeric column, or the codes looked up in a
+# table of the allowed values. Each chart counts the rows that pass every
+# filter but the one on its own column, so it still shows the alternatives to
+# its selection. Charts are aggregated with bincount over codes, which needs no
+# sort and no SQL; the snapshot is reloaded once Employees or JobTitles change.
+SNAPSHOT_QUERY = """
+    SELECT e.age, e.years_of_experience, e.salary, e.gender, e.job_title, j.department
+    FROM Employees e
+    LEFT JOIN JobTitles j ON e.job_title = j.job_title
+"""
+SNAPSHOT_NUMBERS = {'age': 'float32', 'years_of_experience': 'float32', 'salary': 'float64'}
+SNAPSHOT_CATEGORIES = ('gender', 'job_title', 'department')
+# INTEGER columns, counted per whole value
+SNAPSHOT_WHOLE = ('age', 'years_of_experience')
+DASHBOARD_DELAY_MS = 50  # redraw once the filters stop changing
+
+
+def encode_categories(chunks, lookup):
+    # Codes in first-seen order renumbered to the sorted dictionary; returns (codes, dictionary)
+    first_seen = list(lookup)
+    dictionary = sorted(first_seen, key=lambda value: (value is None, '' if value is None else str(value)))
+    remap = np.empty(len(first_seen), dtype=np.int64)
+    remap[[lookup[value] for value in dictionary]] = np.arange(len(dictionary))
+    codes = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+    return remap[codes].astype(np.min_scalar_type(max(len(dictionary) - 1, 0))), dictionary
+
+
+class EmployeeSnapshot:
+    # Read-only once loaded, so worker threads and the GUI thread can share it
+    def __init__(self, numbers, codes, dictionaries, key=None):
+        self.numbers = numbers
+        self.codes = codes
+        self.dictionaries = dictionaries
+        self.positions = {column: {value: code for code, value in enumerate(values)} for column, values in dictionaries.items()}
+        self.key = key
+        self.rows = len(next(iter(numbers.values())))
+        # (smallest value, number of values, offset of each row from the smallest with
+        # NaN one past the largest) for bincount
+        self.steps = {}
+        for column in SNAPSHOT_WHOLE:
+            values = numbers[column]
+            present = valid(values)
+            low = int(values[present].min()) if present.any() else 0
+            span = int(values[present].max()) - low + 1 if present.any() else 0
+            steps = np.full(self.rows, span, dtype=np.min_scalar_type(span))
+            steps[present] = values[present] - low
+            self.steps[column] = low, span, steps
+
+    @classmethod
+    def load(cls, conn, cache=None, progress=None):
+        # cache only supplies the key that tells when the snapshot is stale; the
+        # key is taken first, so a write landing during the load makes it stale
+        key = cache.key(conn, SNAPSHOT_QUERY, 'snapshot') if cache is not None else None
+        cursor = conn.execute(SNAPSHOT_QUERY)
+        numbers = {column: [] for column in SNAPSHOT_NUMBERS}
+        codes = {column: [] for column in SNAPSHOT_CATEGORIES}
+        lookups = {column: {} for column in SNAPSHOT_CATEGORIES}
+        loaded = 0
+        while True:
+            rows = cursor.fetchmany(FETCH_CHUNK_ROWS)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            for (column, dtype), values in zip(SNAPSHOT_NUMBERS.items(), columns):
+                numbers[column].append(np.array(values, dtype=dtype))
+            for column, values in zip(SNAPSHOT_CATEGORIES, columns[len(SNAPSHOT_NUMBERS):]):
+                lookup = lookups[column]
+                codes[column].append(np.fromiter((lookup.setdefault(value, len(lookup)) for value in values),
+                                                 dtype=np.int64, count=len(values)))
+            loaded += len(rows)
+            if progress:
+                progress(loaded)
+        numbers = {column: np.concatenate(parts) if parts else np.empty(0, dtype=SNAPSHOT_NUMBERS[column])
+                   for column, parts in numbers.items()}
+        dictionaries = {}
+        for column in SNAPSHOT_CATEGORIES:
+            codes[column], dictionaries[column] = encode_categories(codes[column], lookups[column])
+        return cls(numbers, codes, dictionaries, key)
+
+    def nbytes(self):
+        arrays = itertools.chain(self.numbers.values(), self.codes.values(), (steps for _, _, steps in self.steps.values()))
+        return sum(array.nbytes for array in arrays)
+
+    def labels(self, column):
+        return ["Unknown" if value is None else str(value) for value in self.dictionaries[column]]
+
+    def filter_mask(self, column, selected):
+        # selected is an inclusive (low, high) for a numeric column, either end None
+        # for open, and the values to keep for a category column
+        if column in self.codes:
+            allowed = np.zeros(len(self.dictionaries[column]), dtype=bool)
+            allowed[[self.positions[column][value] for value in selected if value in self.positions[column]]] = True
+            return allowed[self.codes[column]]
+        low, high = selected
+        values = self.numbers[column]
+        keep = np.ones(self.rows, dtype=bool)
+        if low is not None:
+            keep &= values >= low
+        if high is not None:
+            keep &= values <= high
+        return keep
+
+    def mask(self, masks, exclude=None):
+        # Rows passing every filter mask but the one on exclude
+        keep = np.ones(self.rows, dtype=bool)
+        for column, column_mask in masks.items():
+            if column != exclude:
+                keep &= column_mask
+        return keep
+
+    def counts(self, column, keep):
+        # Rows per dictionary value of a category column
+        return np.bincount(self.codes[column][keep], minlength=len(self.dictionaries[column]))
+
+    def means(self, column, value_column, keep):
+        # Mean of value_column per dictionary value of column, NaN for values without rows
+        values = self.numbers[value_column][keep]
+        present = valid(values)
+        codes = self.codes[column][keep][present]
+        sums = np.bincount(codes, weights=values[present], minlength=len(self.dictionaries[column]))
+        counts = np.bincount(codes, minlength=len(self.dictionaries[column]))
+        with np.errstate(invalid='ignore'):
+            return sums / counts
+
+    def value_counts(self, column, keep, weights=None):
+        # Rows (or the sum of the weights column) per whole value of a SNAPSHOT_WHOLE
+        # column; returns (values, totals)
+        low, span, steps = self.steps[column]
+        totals = np.bincount(steps[keep], None if weights is None else self.numbers[weights][keep], minlength=span + 1)
+        return np.arange(low, low + span), totals[:span]
+
+    def dashboard(self, filters):
+        # Data of every dashboard chart, each filtered by the other charts' selections;
+        # filters maps columns to what filter_mask takes
+        masks = {column: self.filter_mask(column, selected) for column, selected in filters.items()}
+        by_department = self.mask(masks, 'department')
+        by_experience = self.mask(masks, 'years_of_experience')
+        with_salary = by_experience & valid(self.numbers['salary'])
+        years, rows = self.value_counts('years_of_experience', with_salary)
+        _, salaries = self.value_counts('years_of_experience', with_salary, 'salary')
+        shown = rows > 0
+        return {
+            'rows': int(np.count_nonzero(self.mask(masks))),
+            'department': self.counts('department', by_department),
+            'gender': self.counts('gender', self.mask(masks, 'gender')),
+            'job_title': self.counts('job_title', self.mask(masks, 'job_title')),
+            'age': self.value_counts('age', self.mask(masks, 'age')),
+            'salary_by_experience': (years[shown], salaries[shown] / rows[shown]),
+            'salary_by_department': self.means('department', 'salary', by_department),
+        }
+
+
+# Facilities map
+# Tile counts and the points of the visible box; see MAP_TILE_QUERY in app.py
+def map_tiles(conn, cache=None):
+    # Returns an array with one row per non-empty tile: count, mean latitude, mean longitude
+    arrays = list(fetch_arrays(conn, MAP_TILE_QUERY, cache=cache).values())
+    return np.column_stack(arrays[2:])
+
+
+def map_points(conn, extent):
+    # Returns (latitudes, longitudes) of the facilities inside extent
+    west, east, south, north = extent
+    first_col = max(int((west + 180) / GRID_CELL_DEGREES), 0)
+    last_col = min(int((east + 180) / GRID_CELL_DEGREES), GRID_COLUMNS - 1)
+    rows = []
+    for row in range(max(int((south + 90) / GRID_CELL_DEGREES), 0), min(int((north + 90) / GRID_CELL_DEGREES), int(180 / GRID_CELL_DEGREES)) + 1):
+        rows += conn.execute(MAP_POINTS_QUERY, (row * GRID_COLUMNS + first_col, row * GRID_COLUMNS + last_col,
+                                                south, north, west, east)).fetchall()
+    points = np.array(rows, dtype=float).reshape(-1, 2)
+    return points[:, 0], points[:, 1]
+
+
+def visible_tiles(tiles, extent):
+    west, east, south, north = extent
+    inside = (tiles[:, 1] >= south) & (tiles[:, 1] <= north) & (tiles[:, 2] >= west) & (tiles[:, 2] <= east)
+    return tiles[inside]
+
+
+# Functional dependencies
+# TANE-style discovery of the minimal functional dependencies X -> A that hold
+# in a query result. Each column is encoded to integer codes once. The partition
+# of an attribute set (rows grouped by equal values) is stripped of single-row
+# classes and kept as two int32 arrays: row numbers and the class of each row.
+# X -> A holds when X and X + A have the same error e = rows - classes. The
+# attribute-set lattice is searched level by level, keeping only candidates that
+# can still give minimal dependencies and dropping keys. The partition products
+# of a level run on a thread pool, since NumPy releases the GIL while sorting.
+DOCS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'docs')
+FD_REPORTS = {
+    'RD_Employees.txt': """
+        SELECT e.id, e.first_name, e.last_name, e.email, e.phone, e.gender, e.age, e.job_title,
+               e.years_of_experience, e.salary, j.department
+        FROM Employees e LEFT JOIN JobTitles j ON j.job_title = e.job_title
+    """,
+    'RD_facility.txt': """
+        SELECT f.registry_id, f.facility_site_name, f.location_address_text, l.location_zip_code, l.locality_name,
+               l.location_address_state_code, c.latitude_measure, c.longitude_measure,
+               c.horizontal_coordinate_reference_system_datum_name, c.horizontal_collection_method_name,
+               f.electronic_address, f.electronic_address_typename
+        FROM Facilities f
+        LEFT JOIN Locations l ON l.registry_id = f.registry_id
+        LEFT JOIN Coordinates c ON c.registry_id = f.registry_id
+    """,
+    'RD_Program.txt': """
+        SELECT p.program_identifier, p.program_full_name, a.program_common_name, a.program_acronym_name,
+               p.interest_type_id, a.program_description, a.electronic_address, a.electronic_address_typename
+        FROM Programs p LEFT JOIN ProgramAttributes a ON a.interest_type_id = p.interest_type_id
+    """,
+}
+
+
+def encode_values(values, seen):
+    # Codes of values, numbered in the order they are first seen across calls
+    seen.update(zip([value for value in dict.fromkeys(values) if value not in seen], itertools.count(len(seen))))
+    return np.fromiter(map(seen.__getitem__, values), dtype=np.int32, count=len(values))
+
+
+def encode_columns(conn, sql, progress=None):
+    # Returns (column names, one int32 array of value codes per column); NULL is a value of its own.
+    # Numeric columns are coded with np.unique at the end, others (text, NULLs) through a dict.
+    cursor = conn.execute(sql)
+    columns = [desc[0] for desc in cursor.description]
+    chunks = [[] for _ in columns]
+    # dict of codes once a column turned out not to be numeric
+    seen = [None for _ in columns]
+    loaded = 0
+    while True:
+        rows = cursor.fetchmany(FETCH_CHUNK_ROWS)
+        if not rows:
+            break
+        for number, values in enumerate(zip(*rows)):
+            if seen[number] is None:
+                array = np.array(values)
+                if array.dtype.kind in 'iuf':
+                    chunks[number].append(array)
+                    continue
+                seen[number] = {}
+                chunks[number] = [encode_values(part.tolist(), seen[number]) for part in chunks[number]]
+            chunks[number].append(encode_values(values, seen[number]))
+        loaded += len(rows)
+        if progress:
+            progress(loaded)
+    codes = []
+    for parts, coded in zip(chunks, seen):
+        if not parts:
+            codes.append(np.empty(0, dtype=np.int32))
+        elif coded is None:
+            codes.append(np.unique(np.concatenate(parts), return_inverse=True)[1].astype(np.int32))
+        else:
+            codes.append(np.concatenate(parts))
+    return columns, codes
+
+
+def stripped_partition(labels):
+    # (rows, classes, error) of the rows grouped by label, single-row classes left out
+    counts = np.bincount(labels)
+    rows = np.flatnonzero(counts[labels] > 1).astype(np.int32)
+    return rows, labels[rows], len(rows) - np.count_nonzero(counts > 1)
+
+
+def partition_product(first, second, size):
+    # Partition of the union of two attribute sets; a row shares a class in it
+    # only if it shares one in both
+    rows, classes, _ = first
+    lookup = np.full(size, -1, dtype=np.int32)
+    lookup[second[0]] = second[1]
+    other = lookup[rows]
+    shared = other >= 0
+    rows, classes, other = rows[shared], classes[shared], other[shared]
+    if not len(rows):
+        return rows, classes, 0
+    span = int(second[1].max()) + 1
+    combined = classes.astype(np.int64) * span + other
+    if (int(classes.max()) + 1) * span <= 4 * len(rows) + 65536:
+        # class numbers are small enough to count them directly, in linear time
+        numbers = combined
+    else:
+        # otherwise number the classes in sorted order
+        order = np.argsort(combined)
+        rows, combined = rows[order], combined[order]
+        numbers = np.empty(len(combined), dtype=np.int64)
+        numbers[0] = 0
+        np.cumsum(combined[1:] != combined[:-1], out=numbers[1:])
+    counts = np.bincount(numbers)
+    keep = counts[numbers] > 1
+    return rows[keep], numbers[keep].astype(np.int32), int(keep.sum()) - np.count_nonzero(counts > 1)
+
+
+def discover_dependencies(codes, workers=None, progress=None):
+    # Returns (minimal dependencies as (frozenset of column numbers, column number), minimal keys)
+    size = len(codes[0]) if codes else 0
+    everything = frozenset(range(len(codes)))
+    # the empty set holds all rows in one class
+    previous = {frozenset(): (np.arange(size, dtype=np.int32), np.zeros(size, dtype=np.int32), max(size - 1, 0))}
+    level = {frozenset([number]): stripped_partition(labels) for number, labels in enumerate(codes)}
+    candidates = {frozenset(): everything}
+    found = {number: [] for number in everything}
+    dependencies, keys = [], []
+    with ThreadPoolExecutor(workers or os.cpu_count() or 1) as pool:
+        depth = 1
+        while level:
+            for attributes in level:
+                # right-hand sides no proper subset has ruled out
+                rhs = everything
+                for number in attributes:
+                    rhs = rhs & candidates.get(attributes - {number}, frozenset())
+                for number in sorted(attributes & rhs):
+                    lhs = attributes - {number}
+                    if previous[lhs][2] == level[attributes][2]:
+                        dependencies.append((lhs, number))
+                        found[number].append(lhs)
+                        rhs = rhs - {number} - (everything - attributes)
+                candidates[attributes] = rhs
+            for attributes in list(level):
+                if not candidates[attributes]:
+                    del level[attributes]
+                elif level[attributes][2] == 0:
+                    # a key, minimal since none of its subsets was one; a
+                    # superset can only give non-minimal dependencies
+                    keys.append(attributes)
+                    for number in sorted(everything - attributes):
+                        if not any(lhs <= attributes for lhs in found[number]):
+                            dependencies.append((attributes, number))
+                            found[number].append(attributes)
+                    del level[attributes]
+            if progress:
+                progress(depth)
+            # next level: join sets that share all but their last column
+            blocks = {}
+            for attributes in sorted(level, key=sorted):
+                ordered = sorted(attributes)
+                blocks.setdefault(tuple(ordered[:-1]), []).append(attributes)
+            joins = []
+            for block in blocks.values():
+                for number, first in enumerate(block):
+                    for second in block[number + 1:]:
+                        union = first | second
+                        if all(union - {column} in level for column in union):
+                            joins.append((union, first, second))
+            products = pool.map(lambda join: partition_product(level[join[1]], level[join[2]], size), joins)
+            previous, level = level, {join[0]: product for join, product in zip(joins, products)}
+            depth += 1
+    return dependencies, keys
+
+
+def format_dependencies(columns, dependencies, keys):
+    # Report in the layout of the docs/RD_*.txt files. The shortest candidate
+    # keys are taken as the primary ones: partial dependencies hang off part of
+    # one, transitive ones are any other dependency of a non-key attribute.
+    shortest = min((len(key) for key in keys), default=0)
+    primary = [key for key in keys if len(key) == shortest]
+    prime = frozenset().union(*primary)
+
+    def line(lhs, number):
+        return f"  {tuple(columns[column] for column in sorted(lhs))!r} → {columns[number]}"
+
+    full, partial, transitive = [], [], []
+    for lhs, number in sorted(dependencies, key=lambda dependency: (dependency[1], len(dependency[0]), sorted(dependency[0]))):
+        if lhs in keys or not lhs:
+            full.append(line(lhs, number))
+        elif number in prime or not any(lhs < key for key in primary):
+            transitive.append(line(lhs, number))
+        else:
+            partial.append(line(lhs, number))
+    keys = ', '.join(repr(tuple(columns[column] for column in sorted(key))) for key in sorted(keys, key=lambda key: (len(key), sorted(key))))
+    return '\n'.join([f"Candidate Keys: {keys or 'none'}", "", "Functional Dependency:"] + (full or ["  none"]) +
+                     ["", "Partial Dependencies:"] + (partial or ["  it has no partial dependency."]) +
+                     ["", "Transitive Dependencies:"] + (transitive or ["  it has no transitive dependency."])) + "\n"
+
+
+def profile_dependencies(conn, reports=None, docs_dir=DOCS_DIR, workers=None, progress=None):
+    # Rewrites docs_dir/<report> for each report with rows; returns {report: summary}
+    summaries = {}
+    for name, sql in (reports or FD_REPORTS).items():
+        start = time.perf_counter()
+        columns, codes = encode_columns(conn, sql, progress)
+        if not len(codes[0]):
+            summaries[name] = {'rows': 0}
+            continue
+        # checked between lattice levels, so a cancel does not wait for the whole search
+        dependencies, keys = discover_dependencies(codes, workers, progress and (lambda depth: progress(len(codes[0]))))
+        with open(os.path.join(docs_dir, name), 'w', encoding='utf-8') as f:
+            f.write(format_dependencies(columns, dependencies, keys))
+        summaries[name] = {'rows': len(codes[0]), 'dependencies': len(dependencies), 'keys': len(keys),
+                           'seconds': round(time.perf_counter() - start, 2)}
+    return summaries
+
+
+# Columnar export
+# Layout of the .dcol format (see Result export in app.py). A block starts with
+# the validity bitmap (np.packbits, 1 = not NULL) followed by
+#   int, float: the int64 / float64 values (0 for NULL)
+#   text, blob: uint32 byte lengths, then the UTF-8 or raw bytes
+# A column with mixed types in a row group is stored as text.
+COLUMNAR_MAGIC = b'DBCOL1\n'
+COLUMNAR_LEVEL = 1  # zlib level; higher levels cost far more time than they save space
+
+
+def encode_block(values):
+    # Returns (type, uncompressed block) for one column of a row group
+    types = set(map(type, values))
+    nulls = type(None) in types
+    types.discard(type(None))
+    if nulls:
+        present = np.fromiter((value is not None for value in values), dtype=bool, count=len(values))
+        values = [0 if value is None else value for value in values] if types <= {int, float} else \
+                 [b'' if value is None else value for value in values]
+    else:
+        present = np.ones(len(values), dtype=bool)
+    bitmap = np.packbits(present).tobytes()
+    if types <= {int}:
+        try:
+            return 'int', bitmap + np.fromiter(values, dtype=np.int64, count=len(values)).tobytes()
+        except OverflowError:
+            types = {str}
+    elif types == {float} or types == {int, float}:
+        return 'float', bitmap + np.fromiter(values, dtype=np.float64, count=len(values)).tobytes()
+    if types == {bytes}:
+        kind, data = 'blob', values
+    elif types == {str} and not nulls:
+        kind, data = 'text', list(map(str.encode, values))
+    else:
+        kind = 'text'
+        data = [value.encode('utf-8') if type(value) is str else
+                value if type(value) is bytes else str(value).encode('utf-8') for value in values]
+    lengths = np.fromiter(map(len, data), dtype=np.uint32, count=len(data))
+    return kind, bitmap + lengths.tobytes() + b''.join(data)
+
+
+def decode_block(kind, block, count):
+    # Inverse of encode_block: numbers as a masked array, text and blobs as an object array with None
+    bitmap_size = (count + 7) // 8
+    present = np.unpackbits(np.frombuffer(block, dtype=np.uint8, count=bitmap_size), count=count).astype(bool)
+    if kind in ('int', 'float'):
+        values = np.frombuffer(block, dtype=np.int64 if kind == 'int' else np.float64, offset=bitmap_size)
+        return np.ma.MaskedArray(values, mask=~present)
+    lengths = np.frombuffer(block, dtype=np.uint32, count=count, offset=bitmap_size)
+    ends = np.cumsum(lengths, dtype=np.int64) + bitmap_size + 4 * count
+    starts = ends - lengths
+    values = np.empty(count, dtype=object)
+    for number, (start, end, valid_value) in enumerate(zip(starts.tolist(), ends.tolist(), present.tolist())):
+        if valid_value:
+            values[number] = block[start:end].decode('utf-8') if kind == 'text' else block[start:end]
+    return values
+
+
+def write_columnar(cursor, f, progress=None):
+    columns = [desc[0] for desc in cursor.description or []]
+    groups = []
+    written = 0
+    f.write(COLUMNAR_MAGIC)
+    while True:
+        rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+        if not rows:
+            break
+        blocks = []
+        for values in zip(*rows):
+            kind, block = encode_block(values)
+            block = zlib.compress(block, COLUMNAR_LEVEL)
+            blocks.append([kind, f.tell(), len(block)])
+            f.write(block)
+        groups.append({'rows': len(rows), 'blocks': blocks})
+        written += len(rows)
+        if progress:
+            progress(written)
+    footer = json.dumps({'columns': columns, 'row_groups': groups}).encode('utf-8')
+    f.write(footer)
+    f.write(struct.pack('<Q', len(footer)))
+    f.write(COLUMNAR_MAGIC)
+    return written
+
+
+def read_columnar(file_path):
+    # Returns (columns, iterator of {column: array} per row group); see decode_block for the arrays
+    with open(file_path, 'rb') as f:
+        if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError(f"{file_path} is not a columnar export")
+        f.seek(-len(COLUMNAR_MAGIC) - 8, os.SEEK_END)
+        footer_size, = struct.unpack('<Q', f.read(8))
+        if f.read() != COLUMNAR_MAGIC:
+            raise ValueError(f"{file_path} is incomplete")
+        f.seek(-len(COLUMNAR_MAGIC) - 8 - footer_size, os.SEEK_END)
+        footer = json.loads(f.read(footer_size))
+    columns = footer['columns']
+
+    def row_groups():
+        with open(file_path, 'rb') as f:
+            for group in footer['row_groups']:
+                arrays = {}
+                for column, (kind, offset, length) in zip(columns, group['blocks']):
+                    f.seek(offset)
+                    arrays[column] = decode_block(kind, zlib.decompress(f.read(length)), group['rows'])
+                yield arrays
+
+    return columns, row_groups()
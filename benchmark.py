@@ -0,0 +1,1184 @@
+import argparse
+import gc
+import heapq
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import app
+import arrays
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+
+STATES = ['AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'FL', 'GA', 'HI', 'ID', 'IL', 'IN', 'IA', 'KS',
+          'KY', 'LA', 'ME', 'MD', 'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ', 'NM', 'NY',
+          'NC', 'ND', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV',
+          'WI', 'WY']
+INTEREST_TYPES = ['STATE MASTER', 'HAZARDOUS WASTE', 'AIR MINOR', 'AIR SYNTHETIC MINOR', 'NPDES NON-MAJOR',
+                  'UNDERGROUND STORAGE TANK', 'TSCA SUBMITTER', 'BROWNFIELDS PROPERTY']
+
+
+def generate_xml(path, facilities, seed=0, changed=0):
+    # The first `changed` facilities get a different name, to simulate a refreshed export
+    rnd = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<FacilitySiteList>\n')
+        for i in range(facilities):
+            registry_id = f"{110000000000 + i}"
+            interest = rnd.choice(INTEREST_TYPES)
+            name = f"RENAMED FACILITY {i}" if i < changed else f"FACILITY {i}"
+            f.write(
+                f'<FacilitySite registryId="{registry_id}">'
+                f'<FacilitySiteName>{name}</FacilitySiteName>'
+                f'<LocationAddressText>{rnd.randint(1, 9999)} MAIN ST</LocationAddressText>'
+                f'<LocalityName>CITY {rnd.randint(1, 500)}</LocalityName>'
+                f'<LocationAddressStateCode>{rnd.choice(STATES)}</LocationAddressStateCode>'
+                f'<LocationZIPCode>{rnd.randint(10000, 99999)}</LocationZIPCode>'
+                f'<LatitudeMeasure>{rnd.uniform(25, 49):.6f}</LatitudeMeasure>'
+                f'<LongitudeMeasure>{rnd.uniform(-124, -67):.6f}</LongitudeMeasure>'
+                f'<HorizontalCollectionMethodName>ADDRESS MATCHING-HOUSE NUMBER</HorizontalCollectionMethodName>'
+                f'<HorizontalCoordinateReferenceSystemDatumName>NAD83</HorizontalCoordinateReferenceSystemDatumName>'
+                f'<GeneralProfileElectronicAddress><ElectronicAddressText>site{i}@example.com</ElectronicAddressText>'
+                f'<ElectronicAddressTypeName>EMAIL</ElectronicAddressTypeName></GeneralProfileElectronicAddress>'
+                f'<Program><ProgramIdentifier>P{i}</ProgramIdentifier>'
+                f'<ProgramFullName>PROGRAM {interest}</ProgramFullName>'
+                f'<ProgramInterestType>{interest}</ProgramInterestType>'
+                f'<ProgramCommonName>{interest.title()}</ProgramCommonName>'
+                f'<ProgramAcronymName>{interest[:3]}</ProgramAcronymName>'
+                f'<ProgramDescription>Synthetic {interest.lower()} program</ProgramDescription>'
+                f'<ProgramProfileElectronicAddress><ElectronicAddressText>program{i}@example.gov</ElectronicAddressText>'
+                f'<ElectronicAddressTypeName>EMAIL</ElectronicAddressTypeName></ProgramProfileElectronicAddress></Program>'
+                f'</FacilitySite>\n'
+            )
+        f.write('</FacilitySiteList>\n')
+
+
+FIRST_NAMES = ['James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez']
+GENDERS = ['Male', 'Female', 'Non-binary']
+JOBS = {
+    'Software Engineer': 'Engineering', 'Data Analyst': 'Engineering', 'DevOps Engineer': 'Engineering',
+    'Accountant': 'Finance', 'Financial Analyst': 'Finance', 'Sales Manager': 'Sales',
+    'Account Executive': 'Sales', 'HR Specialist': 'Human Resources', 'Recruiter': 'Human Resources',
+    'Marketing Manager': 'Marketing', 'Content Strategist': 'Marketing', 'Support Engineer': 'Support',
+}
+
+
+def generate_json(path, employees, seed=0):
+    rnd = random.Random(seed)
+    jobs = list(JOBS)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[\n')
+        for i in range(employees):
+            first, last = rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES)
+            job = rnd.choice(jobs)
+            experience = rnd.randint(0, 40)
+            record = {
+                'id': i + 1,
+                'first_name': first,
+                'last_name': last,
+                'email': f"{first.lower()}.{last.lower()}{i}@example.com",
+                'phone': f"555-{rnd.randint(100, 999)}-{rnd.randint(1000, 9999)}",
+                'gender': rnd.choice(GENDERS),
+                'age': min(22 + experience + rnd.randint(0, 10), 70),
+                'job_title': job,
+                'department': JOBS[job],
+                'years_of_experience': experience,
+                'salary': round(rnd.uniform(40000, 90000) + experience * 1500, 2),
+            }
+            f.write(('' if i == 0 else ',\n') + json.dumps(record))
+        f.write('\n]\n')
+
+
+def create_db(db_path):
+    conn = sqlite3.connect(db_path)
+    app.create_schema(conn)
+    return conn
+
+
+def _run_xml_import(mode, xml_path, db_path, queue, workers=None):
+    conn = create_db(db_path)
+    start = time.perf_counter()
+    if mode == 'parallel':
+        counts = app.parallel_xml(conn, xml_path, workers=workers)
+    elif mode == 'partitioned':
+        counts = app.partitioned_xml(conn, xml_path, workers=workers)
+    elif mode == 'stream':
+        counts = app.stream_xml(conn, xml_path)
+    else:
+        counts = app.load_xml_dom(conn, xml_path)
+    elapsed = time.perf_counter() - start
+    conn.close()
+    queue.put({
+        'mode': mode,
+        'seconds': round(elapsed, 3),
+        'rows': sum(counts.values()),
+        'rows_per_sec': round(sum(counts.values()) / elapsed),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'workers': workers,
+    })
+
+
+def run_isolated(target, *args, **kwargs):
+    # A fresh process per run so peak RSS is not shared between runs
+    queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=target, args=args + (queue,), kwargs=kwargs)
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def generate_xml_file(args):
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    xml_path = os.path.join(workdir, 'EPAXML.xml')
+    generate_xml(xml_path, args.facilities, args.seed)
+    print(f"Generated {args.facilities} facilities ({os.path.getsize(xml_path) / 2**20:.1f} MB)")
+    return workdir, xml_path
+
+
+def bench_xml(args):
+    workdir, xml_path = generate_xml_file(args)
+    results = []
+    for mode in ('dom', 'stream'):
+        result = run_isolated(_run_xml_import, mode, xml_path, os.path.join(workdir, f'{mode}.db'))
+        results.append(result)
+        print(json.dumps(result))
+    return results
+
+
+def _run_json_import(mode, json_path, db_path, queue):
+    conn = create_db(db_path)
+    start = time.perf_counter()
+    first_batch = None
+    if mode == 'stream':
+        first_batch = time.perf_counter() - start if next(app.iter_employee_batches(json_path), None) else None
+        start = time.perf_counter()
+        counts = app.stream_json(conn, json_path)
+    else:
+        counts = app.load_json(conn, json_path)
+    elapsed = time.perf_counter() - start
+    conn.close()
+    queue.put({
+        'mode': mode,
+        'seconds': round(elapsed, 3),
+        'first_batch_seconds': round(first_batch, 3) if first_batch is not None else None,
+        'rows_per_sec': round(counts['Employees'] / elapsed),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    })
+
+
+def bench_json(args):
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    json_path = os.path.join(workdir, 'project.json')
+    generate_json(json_path, args.employees, args.seed)
+    print(f"Generated {args.employees} employees ({os.path.getsize(json_path) / 2**20:.1f} MB)")
+    results = []
+    for mode in ('load', 'stream'):
+        result = run_isolated(_run_json_import, mode, json_path, os.path.join(workdir, f'{mode}.db'))
+        results.append(result)
+        print(json.dumps(result))
+    return results
+
+
+def bench_xml_parallel(args):
+    workdir, xml_path = generate_xml_file(args)
+    results = []
+    baseline = run_isolated(_run_xml_import, 'stream', xml_path, os.path.join(workdir, 'serial.db'))
+    print(json.dumps(baseline))
+    for workers in args.workers:
+        result = run_isolated(_run_xml_import, 'parallel', xml_path,
+                              os.path.join(workdir, f'parallel_{workers}.db'), workers=workers)
+        result['speedup'] = round(baseline['seconds'] / result['seconds'], 2)
+        results.append(result)
+        print(json.dumps(result))
+    return results
+
+
+def parse_rows(xml_path, json_path):
+    rows = app.new_xml_rows()
+    processed_programs = {}
+    for facility in app.iter_facility_sites(xml_path):
+        app.parse_facility_site(facility, rows, processed_programs)
+    job_titles = set()
+    employees = []
+    with open(json_path, encoding='utf-8') as f:
+        for employee in json.load(f):
+            app.parse_employee(employee, job_titles, employees)
+    rows['JobTitles'] = list(job_titles)
+    rows['Employees'] = employees
+    return rows
+
+
+def _run_table_inserts(mode, rows, db_path, queue):
+    conn = create_db(db_path)
+    sql = dict(app.XML_INSERT_SQL, **app.JSON_INSERT_SQL)
+    tables = {}
+    start = time.perf_counter()
+    if mode == 'bulk':
+        with app.bulk_load(conn):
+            for table, table_rows in rows.items():
+                table_start = time.perf_counter()
+                conn.executemany(sql[table], table_rows)
+                tables[table] = time.perf_counter() - table_start
+            conn.commit()
+            rebuild_start = time.perf_counter()
+        rebuild = time.perf_counter() - rebuild_start
+    else:
+        for table, table_rows in rows.items():
+            table_start = time.perf_counter()
+            conn.executemany(sql[table], table_rows)
+            conn.commit()
+            tables[table] = time.perf_counter() - table_start
+        rebuild = 0.0
+    elapsed = time.perf_counter() - start
+    conn.close()
+    queue.put({
+        'mode': mode,
+        'seconds': round(elapsed, 3),
+        'index_rebuild_seconds': round(rebuild, 3),
+        'rows_per_sec': {table: round(len(rows[table]) / seconds) if seconds else None
+                         for table, seconds in tables.items()},
+    })
+
+
+def bench_bulk(args):
+    workdir, xml_path = generate_xml_file(args)
+    json_path = os.path.join(workdir, 'project.json')
+    generate_json(json_path, args.employees, args.seed)
+    rows = parse_rows(xml_path, json_path)
+    results = []
+    for mode in ('default', 'bulk'):
+        result = run_isolated(_run_table_inserts, mode, rows, os.path.join(workdir, f'{mode}.db'))
+        results.append(result)
+        print(json.dumps(result))
+    return results
+
+
+def bench_incremental(args):
+    workdir, xml_path = generate_xml_file(args)
+    changed = int(args.facilities * args.changed)
+    refreshed_path = os.path.join(workdir, 'EPAXML_refreshed.xml')
+    generate_xml(refreshed_path, args.facilities, args.seed, changed=changed)
+    conn = create_db(os.path.join(workdir, 'incremental.db'))
+    app.incremental_xml(conn, xml_path)
+    start = time.perf_counter()
+    counts = app.incremental_xml(conn, refreshed_path)
+    incremental = time.perf_counter() - start
+    conn.close()
+    conn = create_db(os.path.join(workdir, 'full.db'))
+    start = time.perf_counter()
+    app.stream_xml(conn, refreshed_path)
+    full = time.perf_counter() - start
+    conn.close()
+    result = {
+        'facilities': args.facilities,
+        'changed': changed,
+        'upserted': counts['upserted'],
+        'full_reload_seconds': round(full, 3),
+        'incremental_seconds': round(incremental, 3),
+    }
+    print(json.dumps(result))
+    return [result]
+
+
+def bench_indexes(args):
+    workdir, xml_path = generate_xml_file(args)
+    json_path = os.path.join(workdir, 'project.json')
+    generate_json(json_path, args.employees, args.seed)
+    conn = create_db(os.path.join(workdir, 'indexes.db'))
+    app.stream_xml(conn, xml_path)
+    app.stream_json(conn, json_path)
+    # Start from primary keys only, the advisor should find the shipped indexes again
+    for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL").fetchall():
+        conn.execute(f"DROP INDEX {name}")
+    conn.commit()
+    advice = app.create_indexes(conn, app.index_advice(conn, app.builtin_queries()))
+    conn.close()
+    results = []
+    for entry in advice['queries']:
+        before, after = advice['before'][entry['name']], advice['after'][entry['name']]
+        result = {
+            'query': entry['name'],
+            'issues': entry['issues'],
+            'indexes': entry['indexes'],
+            'before_ms': round(before, 2),
+            'after_ms': round(after, 2),
+            'speedup': round(before / after, 2) if after else None,
+        }
+        results.append(result)
+        print(json.dumps(result))
+    return results
+
+
+def bench_cache(args):
+    workdir, xml_path = generate_xml_file(args)
+    json_path = os.path.join(workdir, 'project.json')
+    generate_json(json_path, args.employees, args.seed)
+    conn = create_db(os.path.join(workdir, 'cache.db'))
+    app.stream_xml(conn, xml_path)
+    app.stream_json(conn, json_path)
+    queries = app.builtin_queries()
+    results = []
+    for mode in ('uncached', 'cached'):
+        cache = app.QueryCache() if mode == 'cached' else None
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            for sql in queries.values():
+                app.cached_fetch(conn, cache, sql)
+        elapsed = time.perf_counter() - start
+        result = {
+            'mode': mode,
+            'seconds': round(elapsed, 3),
+            'ms_per_query': round(elapsed * 1000 / (args.rounds * len(queries)), 3),
+        }
+        if cache is not None:
+            result.update(cache.stats())
+            result['hit_rate'] = round(result['hit_rate'], 3)
+        results.append(result)
+        print(json.dumps(result))
+    conn.close()
+    return results
+
+
+def render_seconds(draw):
+    import maps
+    fig = Figure(figsize=(8, 6), dpi=100)
+    axes = fig.add_subplot(111, projection=maps.ccrs.PlateCarree())
+    canvas = FigureCanvasAgg(fig)
+    start = time.perf_counter()
+    draw(axes)
+    canvas.draw()
+    return time.perf_counter() - start
+
+
+def bench_map(args):
+    import maps
+    workdir, xml_path = generate_xml_file(args)
+    conn = create_db(os.path.join(workdir, 'map.db'))
+    app.stream_xml(conn, xml_path)
+    results = []
+
+    def legacy(axes):
+        # the former plot_facilities_scatter: every coordinate through Python lists into one scatter
+        rows = conn.execute("SELECT latitude_measure, longitude_measure FROM Coordinates WHERE latitude_measure IS NOT NULL AND longitude_measure IS NOT NULL").fetchall()
+        axes.scatter([row[1] for row in rows], [row[0] for row in rows], color='blue')
+
+    result = {'view': 'full', 'mode': 'legacy scatter', 'seconds': round(render_seconds(legacy), 3)}
+    results.append(result)
+    print(json.dumps(result))
+    start = time.perf_counter()
+    tiles = arrays.map_tiles(conn)
+    result = {'view': 'full', 'mode': 'tile query', 'seconds': round(time.perf_counter() - start, 3), 'tiles': len(tiles)}
+    results.append(result)
+    print(json.dumps(result))
+    # full extent, a region, a zoomed box and a pan of it
+    for name, extent in (('full', app.MAP_EXTENT), ('region', (-110, -90, 30, 40)),
+                         ('zoomed', (-100, -97, 35, 37)), ('panned', (-99, -96, 35, 37))):
+        described = {}
+
+        def lod(axes):
+            axes.set_extent(extent, crs=maps.ccrs.PlateCarree())
+            described['layer'] = maps.draw_map_layer(axes, tiles, extent, lambda box: arrays.map_points(conn, box))[1]
+
+        result = {'view': name, 'mode': 'level of detail', 'seconds': round(render_seconds(lod), 3),
+                  'layer': described['layer']}
+        results.append(result)
+        print(json.dumps(result))
+    conn.close()
+    return results
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return round(time.perf_counter() - start, 3)
+
+
+def bench_columnar(args):
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    json_path = os.path.join(workdir, 'project.json')
+    generate_json(json_path, args.employees, args.seed)
+    conn = create_db(os.path.join(workdir, 'columnar.db'))
+    app.stream_json(conn, json_path)
+
+    def legacy_histogram():
+        ages = [row[0] for row in conn.execute("SELECT age FROM Employees WHERE age IS NOT NULL").fetchall()]
+        np.histogram(ages, bins=10)
+
+    def legacy_percentiles():
+        # per-row lists grouped in a dict, one np.percentile per group
+        groups = {}
+        for years, salary in conn.execute(app.CHART_QUERIES['salary_by_experience']).fetchall():
+            groups.setdefault(years // 5, []).append(salary)
+        for salaries in groups.values():
+            np.percentile(salaries, [10, 25, 50, 75, 90])
+
+    # The app keeps the arrays in its query cache, so a chart shown again skips the fetch
+    cache = app.QueryCache()
+
+    def columnar_histogram(cache=None):
+        ages, counts = arrays.fetch_arrays(conn, app.CHART_QUERIES['age_histogram'], cache=cache).values()
+        arrays.histogram(ages, bins=10, weights=counts)
+
+    def columnar_percentiles(cache=None):
+        years, salaries = arrays.fetch_arrays(conn, app.CHART_QUERIES['salary_by_experience'], cache=cache).values()
+        arrays.group_percentiles(np.floor(years / 5), salaries, [10, 25, 50, 75, 90])
+
+    results = []
+    for chart, legacy, columnar in (('age_histogram', legacy_histogram, columnar_histogram),
+                                    ('salary_percentiles', legacy_percentiles, columnar_percentiles)):
+        result = {'chart': chart, 'employees': args.employees,
+                  'legacy_seconds': timed(legacy), 'columnar_seconds': timed(columnar)}
+        columnar(cache)
+        result['cached_seconds'] = timed(lambda: columnar(cache))
+        results.append(result)
+        print(json.dumps(result))
+    conn.close()
+    return results
+
+
+DASHBOARD_FROM = "FROM Employees e LEFT JOIN JobTitles j ON e.job_title = j.job_title"
+DASHBOARD_COLUMNS = {'age': 'e.age', 'years_of_experience': 'e.years_of_experience', 'gender': 'e.gender',
+                     'job_title': 'e.job_title', 'department': 'j.department'}
+
+
+def dashboard_where(filters, exclude=None, extra=()):
+    # WHERE clause and parameters of the SQL equivalent of a snapshot mask
+    terms, params = list(extra), []
+    for column, selected in filters.items():
+        if column == exclude:
+            continue
+        if column in arrays.SNAPSHOT_CATEGORIES:
+            terms.append(f"{DASHBOARD_COLUMNS[column]} IN ({', '.join('?' * len(selected))})")
+            params.extend(selected)
+        else:
+            terms.append(f"{DASHBOARD_COLUMNS[column]} BETWEEN ? AND ?")
+            params.extend(selected)
+    return (" WHERE " + " AND ".join(terms) if terms else ""), params
+
+
+def dashboard_sql(conn, filters):
+    # The dashboard's charts as one GROUP BY query each, filtered like EmployeeSnapshot.dashboard
+    def query(select, group, exclude=None, extra=()):
+        where, params = dashboard_where(filters, exclude, extra)
+        return conn.execute(f"SELECT {select} {DASHBOARD_FROM}{where}{group}", params).fetchall()
+
+    return {
+        'rows': query("COUNT(*)", "")[0][0],
+        'department': query("j.department, COUNT(*)", " GROUP BY 1", 'department'),
+        'gender': query("e.gender, COUNT(*)", " GROUP BY 1", 'gender'),
+        'job_title': query("e.job_title, COUNT(*)", " GROUP BY 1", 'job_title'),
+        'age': query("e.age, COUNT(*)", " GROUP BY 1", 'age'),
+        'salary_by_experience': query("e.years_of_experience, AVG(e.salary)", " GROUP BY 1", 'years_of_experience',
+                                      ["e.salary IS NOT NULL", "e.years_of_experience IS NOT NULL"]),
+        'salary_by_department': query("j.department, AVG(e.salary)", " GROUP BY 1", 'department'),
+    }
+
+
+def bench_dashboard(args):
+    # Cross-filter dashboard: every chart recomputed from the in-memory employee
+    # snapshot against the same charts as GROUP BY queries, for a few filter sets
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    json_path = os.path.join(workdir, 'project.json')
+    generate_json(json_path, args.employees, args.seed)
+    conn = create_db(os.path.join(workdir, 'dashboard.db'))
+    with app.bulk_load(conn):
+        app.stream_json(conn, json_path, single_transaction=True)
+    start = time.perf_counter()
+    snapshot = arrays.EmployeeSnapshot.load(conn)
+    print(json.dumps({'stage': 'snapshot load', 'seconds': round(time.perf_counter() - start, 3),
+                      'rows': snapshot.rows, 'mb': round(snapshot.nbytes() / 2**20, 1)}))
+    rnd = random.Random(args.seed)
+    departments = [value for value in snapshot.dictionaries['department'] if value is not None]
+    job_titles = [value for value in snapshot.dictionaries['job_title'] if value is not None]
+    genders = [value for value in snapshot.dictionaries['gender'] if value is not None]
+    filter_sets = {
+        'none': {},
+        'department': {'department': [rnd.choice(departments)]},
+        'department+gender+age': {'department': [rnd.choice(departments)], 'gender': [rnd.choice(genders)],
+                                  'age': (30, 40)},
+        'jobs+experience': {'job_title': rnd.sample(job_titles, 2), 'years_of_experience': (5, 15)},
+    }
+    results = []
+    for name, filters in filter_sets.items():
+        median, best, data = timed_runs(lambda: snapshot.dashboard(filters), args.repeat)
+        sql_median, _, expected = timed_runs(lambda: dashboard_sql(conn, filters), args.repeat)
+        result = {'filters': name, 'employees': args.employees, 'rows': data['rows'],
+                  'snapshot_median_ms': round(median * 1000, 3), 'snapshot_best_ms': round(best * 1000, 3),
+                  'sql_median_ms': round(sql_median * 1000, 1), 'speedup': round(sql_median / median),
+                  'matches': data['rows'] == expected['rows']}
+        results.append(result)
+        print(json.dumps(result))
+    conn.close()
+    return results
+
+
+CHARTS = ['plot_facilities_per_state', 'plot_employee_dept_pie', 'plot_employee_job_pie', 'plot_age_histogram',
+          'plot_salary_vs_exp_line', 'plot_avg_salary_by_job', 'plot_gender_distribution', 'plot_programs_by_interest',
+          'plot_avg_experience_by_department', 'plot_salary_box_by_department', 'plot_salary_percentiles_by_experience']
+
+
+def bench_charts(args):
+    # Click-to-display latency of each chart: first click, click with the query
+    # results cached but the render dropped, and click served from the chart cache
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    import gui
+    workdir, xml_path = generate_xml_file(args)
+    json_path = os.path.join(workdir, 'project.json')
+    generate_json(json_path, args.employees, args.seed)
+    os.chdir(workdir)
+    conn = create_db('project.db')
+    app.stream_xml(conn, xml_path)
+    app.stream_json(conn, json_path)
+    conn.close()
+    qt_app = gui.QApplication.instance() or gui.QApplication([])
+    shown = []
+
+    class ChartBench(gui.DatabaseApp):
+        def show_plot_dialog(self, widget, title, toolbar=False):
+            shown.append(time.perf_counter())
+
+    def click(window, chart):
+        shown.clear()
+        start = time.perf_counter()
+        getattr(window, chart)()
+        while not shown:
+            qt_app.processEvents()
+            time.sleep(0.001)
+        return round(shown[0] - start, 4)
+
+    window = ChartBench()
+    results = []
+    for chart in CHARTS:
+        result = {'chart': chart, 'cold_seconds': click(window, chart)}
+        window.chart_cache.entries.clear()
+        result['rerender_seconds'] = click(window, chart)
+        result['cached_seconds'] = click(window, chart)
+        results.append(result)
+        print(json.dumps(result))
+    window.close()
+    return results
+
+
+def bench_fds(args):
+    # Functional-dependency discovery over the Employees report query, per worker count
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    json_path = os.path.join(workdir, 'project.json')
+    generate_json(json_path, args.employees, args.seed)
+    conn = create_db(os.path.join(workdir, 'fds.db'))
+    app.stream_json(conn, json_path)
+    start = time.perf_counter()
+    columns, codes = arrays.encode_columns(conn, arrays.FD_REPORTS['RD_Employees.txt'])
+    encode_seconds = round(time.perf_counter() - start, 3)
+    results = []
+    for workers in args.workers:
+        start = time.perf_counter()
+        dependencies, keys = arrays.discover_dependencies(codes, workers)
+        result = {'employees': args.employees, 'columns': len(columns), 'workers': workers,
+                  'encode_seconds': encode_seconds, 'discover_seconds': round(time.perf_counter() - start, 3),
+                  'dependencies': len(dependencies), 'keys': len(keys)}
+        results.append(result)
+        print(json.dumps(result))
+    conn.close()
+    return results
+
+
+EXPORT_TEMPLATE_ROWS = 100000
+
+
+def _run_export(fmt, db_path, file_path, queue):
+    conn = sqlite3.connect(db_path)
+    stats = app.export_result(conn, 'SELECT * FROM Employees', file_path, fmt)
+    conn.close()
+    queue.put({
+        'format': fmt,
+        'rows': stats['rows'],
+        'seconds': round(stats['seconds'], 3),
+        'mb': round(stats['bytes'] / 2**20, 1),
+        'mb_per_sec': round(stats['bytes'] / 2**20 / stats['seconds'], 1),
+        'rows_per_sec': round(stats['rows'] / stats['seconds']),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    })
+
+
+def _build_export_db(db_path, json_path, rows, queue):
+    # The template employees, copied in SQL up to rows
+    template = min(rows, EXPORT_TEMPLATE_ROWS)
+    conn = create_db(db_path)
+    with app.bulk_load(conn):
+        app.stream_json(conn, json_path, single_transaction=True)
+        conn.execute('''
+            WITH RECURSIVE copies(k) AS (SELECT 1 UNION ALL SELECT k + 1 FROM copies WHERE (k + 1) * ? < ?)
+            INSERT INTO Employees
+            SELECT id + k * ?, first_name, last_name, replace(email, '@', '.' || k || '@'), phone, gender, age,
+                   job_title, years_of_experience, salary
+            FROM copies, Employees
+            WHERE id + k * ? <= ?
+        ''', (template, rows, template, template, rows))
+        conn.commit()
+    conn.close()
+    queue.put(rows)
+
+
+def bench_export(args):
+    # SELECT * FROM Employees streamed to CSV and to the columnar format. The
+    # generated JSON seeds EXPORT_TEMPLATE_ROWS employees, which are copied in
+    # SQL up to --rows; generating and importing 10M records would take longer
+    # than the exports themselves. The database is built in its own process so
+    # its memory does not show up in the peak RSS of the exports.
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    json_path = os.path.join(workdir, 'project.json')
+    generate_json(json_path, min(args.rows, EXPORT_TEMPLATE_ROWS), args.seed)
+    db_path = os.path.join(workdir, 'export.db')
+    run_isolated(_build_export_db, db_path, json_path, args.rows)
+    results = []
+    for fmt in app.EXPORT_FORMATS:
+        file_path = os.path.join(workdir, 'employees' + ('.csv' if fmt == 'csv' else app.COLUMNAR_EXTENSION))
+        result = run_isolated(_run_export, fmt, db_path, file_path)
+        os.remove(file_path)
+        results.append(result)
+        print(json.dumps(result))
+    return results
+
+
+def bench_startup(args):
+    # Process start to ready, for the command line and for the window. 'eager
+    # imports' is what every start paid when app.py imported the GUI stack up front.
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    db_path = os.path.join(workdir, 'startup.db')
+    create_db(db_path).close()
+    root = os.path.dirname(os.path.abspath(app.__file__))
+    commands = {
+        'cli query': [sys.executable, os.path.join(root, 'app.py'), '--db', db_path, 'query', 'SELECT 1'],
+        'gui window': [sys.executable, '-c', f"import sys; sys.path.insert(0, {root!r}); import gui; "
+                                             f"qt = gui.QApplication([]); window = gui.DatabaseApp({db_path!r}); "
+                                             f"window.show(); qt.processEvents()"],
+        'eager imports': [sys.executable, '-c', "import numpy, PyQt6.QtWidgets, matplotlib.backends.backend_qtagg, "
+                                                "cartopy.crs, cartopy.feature"],
+    }
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get('QT_QPA_PLATFORM', 'offscreen'))
+    results = []
+    for mode, command in commands.items():
+        times = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            subprocess.run(command, check=True, env=env, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            times.append(time.perf_counter() - start)
+        times.sort()
+        result = {'mode': mode, 'runs': args.runs, 'best_seconds': round(times[0], 3),
+                  'median_seconds': round(times[len(times) // 2], 3)}
+        results.append(result)
+        print(json.dumps(result))
+    return results
+
+
+def bench_spatial(args):
+    # Radius, nearest-neighbour and box lookups through the R*Tree against the
+    # scan they replace: every coordinate read into Python and measured with trig
+    workdir, xml_path = generate_xml_file(args)
+    conn = create_db(os.path.join(workdir, 'spatial.db'))
+    start = time.perf_counter()
+    app.stream_xml(conn, xml_path)
+    print(json.dumps({'stage': 'import with spatial index', 'seconds': round(time.perf_counter() - start, 3)}))
+    start = time.perf_counter()
+    app.rebuild_spatial_index(conn)
+    print(json.dumps({'stage': 'spatial index rebuild', 'seconds': round(time.perf_counter() - start, 3)}))
+    rnd = random.Random(args.seed)
+    points = [(rnd.uniform(25, 49), rnd.uniform(-124, -67)) for _ in range(args.lookups)]
+
+    def scan(lat, lon):
+        rows = conn.execute("SELECT registry_id, latitude_measure, longitude_measure FROM Coordinates "
+                            "WHERE latitude_measure IS NOT NULL AND longitude_measure IS NOT NULL").fetchall()
+        return [(app.haversine_km(lat, lon, a, b), registry_id) for registry_id, a, b in rows]
+
+    def box(lat, lon):
+        return app.facilities_in_box(conn, (lon - 0.25, lon + 0.25, lat - 0.25, lat + 0.25))
+
+    lookups = {
+        'radius': (lambda lat, lon: app.facilities_within(conn, lat, lon, args.radius),
+                   lambda lat, lon: sorted(found for found in scan(lat, lon) if found[0] <= args.radius)),
+        'nearest': (lambda lat, lon: app.nearest_facilities(conn, lat, lon, args.k),
+                    lambda lat, lon: heapq.nsmallest(args.k, scan(lat, lon))),
+        'box': (box, None),
+    }
+    results = []
+    for name, (indexed, scanned) in lookups.items():
+        times, found = [], 0
+        for lat, lon in points:
+            start = time.perf_counter()
+            found += len(indexed(lat, lon))
+            times.append(time.perf_counter() - start)
+        result = {'lookup': name, 'facilities': args.facilities, 'lookups': len(points),
+                  'avg_found': round(found / len(points), 1),
+                  'rtree_median_ms': round(statistics.median(times) * 1000, 3),
+                  'rtree_max_ms': round(max(times) * 1000, 3)}
+        if scanned is not None:
+            # a few points are enough, each scan reads the whole table
+            times = []
+            for lat, lon in points[:args.scans]:
+                start = time.perf_counter()
+                scanned(lat, lon)
+                times.append(time.perf_counter() - start)
+            result['scan_median_ms'] = round(statistics.median(times) * 1000, 1)
+            result['speedup'] = round(result['scan_median_ms'] / result['rtree_median_ms'])
+        results.append(result)
+        print(json.dumps(result))
+    conn.close()
+    return results
+
+
+def bench_search(args):
+    # Search-as-you-type through the FTS5 indexes against the LIKE '%...%' scan it replaces
+    workdir, xml_path = generate_xml_file(args)
+    conn = create_db(os.path.join(workdir, 'search.db'))
+    with app.bulk_load(conn):
+        app.stream_xml(conn, xml_path, single_transaction=True)
+    start = time.perf_counter()
+    app.rebuild_search_index(conn)
+    print(json.dumps({'stage': 'search index rebuild', 'seconds': round(time.perf_counter() - start, 3)}))
+    rnd = random.Random(args.seed)
+    target = f"FACILITY {rnd.randrange(args.facilities)}"
+    # each keystroke of a facility name, a street and a program description
+    typed = [target[:end] for end in range(1, len(target) + 1)] + ['main st', 'hazardous', 'synthetic air']
+
+    def like_scan(text):
+        pattern = f"%{text}%"
+        rows = conn.execute("SELECT registry_id FROM Facilities WHERE facility_site_name LIKE ? "
+                            "OR location_address_text LIKE ? LIMIT ?", (pattern, pattern, app.SEARCH_RESULT_LIMIT)).fetchall()
+        rows += conn.execute("SELECT interest_type_id FROM ProgramAttributes WHERE program_description LIKE ?",
+                             (pattern,)).fetchall()
+        return rows
+
+    results = []
+    for text in typed:
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            found, ranked = app.search_facilities(conn, text)
+            times.append(time.perf_counter() - start)
+        result = {'query': text, 'facilities': args.facilities, 'found': len(found), 'ranked': ranked,
+                  'fts_median_ms': round(statistics.median(times) * 1000, 3)}
+        start = time.perf_counter()
+        like_scan(text)
+        result['like_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        results.append(result)
+        print(json.dumps(result))
+    conn.close()
+    return results
+
+
+def bench_shards(args):
+    # Import into the region shards and fan-out aggregation over them, against
+    # the single database: serial import and each aggregate as one query
+    workdir, xml_path = generate_xml_file(args)
+    serial_db = os.path.join(workdir, 'serial.db')
+    baseline = run_isolated(_run_xml_import, 'stream', xml_path, serial_db)
+    print(json.dumps(baseline))
+    results = []
+    for workers in args.workers:
+        result = run_isolated(_run_xml_import, 'partitioned', xml_path,
+                              os.path.join(workdir, f'partitioned_{workers}.db'), workers=workers)
+        result['speedup'] = round(baseline['seconds'] / result['seconds'], 2)
+        results.append(result)
+        print(json.dumps(result))
+    conn = sqlite3.connect(serial_db)
+    sharded_db = os.path.join(workdir, f'partitioned_{args.workers[-1]}.db')
+    for name, (partial_sql, merge_sql) in app.SHARD_AGGREGATES.items():
+
+        def single():
+            cursor = conn.execute(partial_sql)
+            return app.merge_partials([([column[0] for column in cursor.description], cursor.fetchall())], merge_sql)
+
+        single_median, _, expected = timed_runs(single, args.repeat)
+        for workers in args.workers:
+            median, best, (columns, rows) = timed_runs(lambda: app.shard_aggregate(sharded_db, name, workers), args.repeat)
+            result = {'aggregate': name, 'facilities': args.facilities, 'workers': workers,
+                      'median_seconds': median, 'best_seconds': best, 'single_db_seconds': single_median,
+                      'speedup': round(single_median / median, 2), 'matches': rows == expected[1]}
+            results.append(result)
+            print(json.dumps(result))
+    conn.close()
+    return results
+
+
+def find_parse_facility_site(facility, rows, processed_programs, program_interest_types):
+    # The find()-based parser that XML_MAPPING replaced, kept for the xml-extract scenario
+    registry_id = facility.get('registryId')
+    try:
+        if not registry_id:
+            logging.error("Missing facility_id (registryId) in XML record.")
+            return
+        logging.debug(f"Processing facility with registryId={registry_id}")
+        lat_text = facility.find('LatitudeMeasure').text if facility.find('LatitudeMeasure') is not None else None
+        lon_text = facility.find('LongitudeMeasure').text if facility.find('LongitudeMeasure') is not None else None
+        if lat_text and not app.is_number(lat_text, allow_float=True):
+            logging.error(f"Invalid latitude for registryId={registry_id}")
+            return
+        if lon_text and not app.is_number(lon_text, allow_float=True):
+            logging.error(f"Invalid longitude for registryId={registry_id}")
+            return
+        facility_addr = facility.find('GeneralProfileElectronicAddress')
+        electronicfacility_text = facility_addr.find('ElectronicAddressText').text if facility_addr is not None and facility_addr.find('ElectronicAddressText') is not None else None
+        electronicfacility_type = facility_addr.find('ElectronicAddressTypeName').text if facility_addr is not None and facility_addr.find('ElectronicAddressTypeName') is not None else None
+        rows['Facilities'].append((registry_id, facility.find('FacilitySiteName').text if facility.find('FacilitySiteName') is not None else None, facility.find('LocationAddressText').text if facility.find('LocationAddressText') is not None else None, electronicfacility_text, electronicfacility_type))
+        rows['Coordinates'].append((registry_id, float(lat_text) if lat_text else None, float(lon_text) if lon_text else None, facility.find('HorizontalCoordinateReferenceSystemDatumName').text if facility.find('HorizontalCoordinateReferenceSystemDatumName') is not None else None, facility.find('HorizontalCollectionMethodName').text if facility.find('HorizontalCollectionMethodName') is not None else None))
+        rows['Locations'].append((registry_id, facility.find('LocationZIPCode').text if facility.find('LocationZIPCode') is not None else None, facility.find('LocalityName').text if facility.find('LocalityName') is not None else None, facility.find('LocationAddressStateCode').text if facility.find('LocationAddressStateCode') is not None else None))
+        program = facility.find('Program' )
+        if program is not None:
+            program_identifier = program.find('ProgramIdentifier').text if program.find('ProgramIdentifier' ) is not None else None
+            if program_identifier is None:
+                logging.error(f"Missing program_identifier for registryId={registry_id}")
+                return
+            program_full_name = program.find('ProgramFullName' ).text if program.find('ProgramFullName' ) is not None else None
+            program_key = (program_identifier, program_full_name)
+            if program_key not in processed_programs:
+                program_interest = program.find('ProgramInterestType' )
+                interest_type_id = None
+                if program_interest is not None and program_interest.text:
+                    if program_interest.text not in program_interest_types:
+                        program_interest_types[program_interest.text] = program_interest.text
+                    interest_type_id = program_interest_types[program_interest.text]
+                rows['Programs'].append((program_identifier, program_full_name, interest_type_id))
+                profile_addr = program.find('ProgramProfileElectronicAddress' )
+                electronic_text = profile_addr.find('ElectronicAddressText' ).text if profile_addr is not None and profile_addr.find('ElectronicAddressText' ) is not None else None
+                electronic_type = profile_addr.find('ElectronicAddressTypeName' ).text if profile_addr is not None and profile_addr.find('ElectronicAddressTypeName' ) is not None else None
+                rows['ProgramAttributes'].append((interest_type_id, program.find('ProgramCommonName' ).text if program.find('ProgramCommonName' ) is not None else None, program.find('ProgramAcronymName' ).text if program.find('ProgramAcronymName' ) is not None else None, program.find('ProgramDescription' ).text if program.find('ProgramDescription' ) is not None else None, electronic_text, electronic_type))
+                processed_programs[program_key] = None
+            rows['FacilityPrograms'].append((registry_id, program_identifier, program_full_name))
+    except Exception as e:
+        logging.error(f"Error processing facility registryId={registry_id}: {str(e)}")
+
+
+def bench_xml_extract(args):
+    # Per-facility cost of turning parsed FacilitySite elements into rows: the
+    # XML_MAPPING extractor against the find()-based parser it replaced,
+    # on the same elements so the XML parse itself is left out
+    workdir, xml_path = generate_xml_file(args)
+    facilities = list(app.ET.parse(xml_path).getroot().iter('FacilitySite'))
+    # otherwise the cyclic GC passes over the whole tree swamp the difference
+    gc.freeze()
+
+    def mapped():
+        rows = app.new_xml_rows()
+        processed_programs = {}
+        for facility in facilities:
+            app.parse_facility_site(facility, rows, processed_programs)
+        return rows
+
+    def find_based():
+        rows = app.new_xml_rows()
+        processed_programs = {}
+        program_interest_types = {}
+        for facility in facilities:
+            find_parse_facility_site(facility, rows, processed_programs, program_interest_types)
+        return rows
+
+    # the two alternate within each round, so drift in the machine's speed hits both
+    parsers = {'find': find_based, 'mapping': mapped}
+    times = {name: [] for name in parsers}
+    rows = {}
+    for _ in range(args.repeat):
+        for name, parse in parsers.items():
+            start = time.perf_counter()
+            rows[name] = parse()
+            times[name].append(time.perf_counter() - start)
+    results = []
+    for name in parsers:
+        median = statistics.median(times[name])
+        results.append({'parser': name, 'facilities': len(facilities), 'median_seconds': round(median, 6),
+                        'us_per_facility': round(median / len(facilities) * 1e6, 2)})
+    results[1]['speedup'] = round(results[0]['median_seconds'] / results[1]['median_seconds'], 2)
+    # NaN coordinates would compare unequal, so the rows are compared as text
+    results[1]['matches'] = repr(rows['find']) == repr(rows['mapping'])
+    gc.unfreeze()
+    for result in results:
+        print(json.dumps(result))
+    return results
+
+
+def bench_generate(args):
+    # Keep the datasets, e.g. to load them in the app or to rerun a scenario on the same input
+    os.makedirs(args.dir, exist_ok=True)
+    results = []
+    for name, generate, count in (('EPAXML.xml', generate_xml, args.facilities),
+                                  ('project.json', generate_json, args.employees)):
+        path = os.path.join(args.dir, name)
+        start = time.perf_counter()
+        generate(path, count, args.seed)
+        result = {'file': path, 'records': count, 'seed': args.seed,
+                  'seconds': round(time.perf_counter() - start, 3), 'mb': round(os.path.getsize(path) / 2**20, 1)}
+        results.append(result)
+        print(json.dumps(result))
+    return results
+
+
+def timed_runs(fn, repeat):
+    # Median and best of `repeat` calls, and the last result
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = fn()
+        times.append(time.perf_counter() - start)
+    return round(statistics.median(times), 6), round(min(times), 6), value
+
+
+def bench_suite(args):
+    # One pass over every stage on the same seeded data: import, each view, each chart query and the map
+    import maps
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    xml_path = os.path.join(workdir, 'EPAXML.xml')
+    json_path = os.path.join(workdir, 'project.json')
+    db_path = os.path.join(workdir, 'suite.db')
+    results = []
+
+    def emit(stage, name, **values):
+        result = {'stage': stage, 'name': name, **values}
+        results.append(result)
+        print(json.dumps(result))
+
+    for name, generate, path, count in (('xml', generate_xml, xml_path, args.facilities),
+                                        ('json', generate_json, json_path, args.employees)):
+        start = time.perf_counter()
+        generate(path, count, args.seed)
+        emit('generate', name, records=count, seconds=round(time.perf_counter() - start, 3),
+             mb=round(os.path.getsize(path) / 2**20, 1))
+    # Both imports go into the one database the later stages read
+    for name, target, path in (('xml', _run_xml_import, xml_path), ('json', _run_json_import, json_path)):
+        result = run_isolated(target, 'stream', path, db_path)
+        emit('import', name, seconds=result['seconds'], rows_per_sec=result['rows_per_sec'],
+             peak_rss_mb=result['peak_rss_mb'])
+
+    conn = sqlite3.connect(db_path)
+
+    def fetch(sql):
+        return lambda: conn.execute(sql).fetchall()
+
+    for name in app.SUMMARY_QUERIES:
+        median, best, rows = timed_runs(fetch(app.view_query(name)), args.repeat)
+        emit('view', name, seconds=median, best_seconds=best, rows=len(rows))
+    app.enable_summaries(conn)
+    for name in app.SUMMARY_QUERIES:
+        median, best, rows = timed_runs(fetch(app.view_query(name, True)), args.repeat)
+        emit('summary', name, seconds=median, best_seconds=best, rows=len(rows))
+    app.disable_summaries(conn)
+    for name, sql in app.CHART_QUERIES.items():
+        median, best, rows = timed_runs(fetch(sql), args.repeat)
+        emit('chart', name, seconds=median, best_seconds=best, rows=len(rows))
+
+    median, best, tiles = timed_runs(lambda: arrays.map_tiles(conn), args.repeat)
+    emit('map', 'tiles', seconds=median, best_seconds=best, tiles=len(tiles))
+    for name, extent in (('full', app.MAP_EXTENT), ('zoomed', (-100, -97, 35, 37))):
+        described = {}
+
+        def lod(axes):
+            axes.set_extent(extent, crs=maps.ccrs.PlateCarree())
+            described['layer'] = maps.draw_map_layer(axes, tiles, extent, lambda box: arrays.map_points(conn, box))[1]
+
+        times = sorted(render_seconds(lod) for _ in range(args.repeat))
+        emit('map', name, seconds=round(statistics.median(times), 6), best_seconds=round(times[0], 6),
+             layer=described['layer'])
+    conn.close()
+    return results
+
+
+def run_metadata(args):
+    # Enough to tell two result files apart and to rerun either of them
+    root = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'scenario': args.scenario,
+        'args': {key: value for key, value in vars(args).items() if key not in ('scenario', 'output')},
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+# Fields that name a result rather than measure it, so the same result can be found in another run
+RESULT_KEYS = ('stage', 'name', 'mode', 'view', 'chart', 'query', 'lookup', 'format', 'workers')
+
+
+def result_key(result):
+    return tuple((key, result[key]) for key in RESULT_KEYS if key in result)
+
+
+def bench_compare(args):
+    # Timings of a result file against a baseline; any *seconds field slower by more than the threshold is a regression
+    runs = []
+    for path in (args.baseline, args.current):
+        with open(path, encoding='utf-8') as f:
+            runs.append(json.load(f))
+    baseline, current = runs
+    if baseline['meta']['scenario'] != current['meta']['scenario']:
+        print(f"Different scenarios: {baseline['meta']['scenario']} and {current['meta']['scenario']}")
+        return 2
+    old_results = {result_key(result): result for result in baseline['results']}
+    regressions = 0
+    for result in current['results']:
+        old = old_results.get(result_key(result))
+        if old is None:
+            continue
+        for field, seconds in result.items():
+            if not field.endswith('seconds') or not isinstance(seconds, (int, float)):
+                continue
+            old_seconds = old.get(field)
+            if not isinstance(old_seconds, (int, float)) or not old_seconds:
+                continue
+            ratio = seconds / old_seconds
+            # Sub-millisecond timings are mostly noise
+            regressed = ratio > 1 + args.threshold and seconds - old_seconds > args.min_seconds
+            regressions += regressed
+            label = ' '.join(str(value) for _, value in result_key(result))
+            print(f"{'REGRESSION' if regressed else 'ok':<10} {label} {field}: {old_seconds} -> {seconds} ({ratio:.2f}x)")
+    print(f"{regressions} regression(s), baseline {baseline['meta']['commit']}, current {current['meta']['commit']}")
+    return 1 if regressions else 0
+
+
+SCENARIOS = {
+    'xml': bench_xml,
+    'xml-parallel': bench_xml_parallel,
+    'bulk': bench_bulk,
+    'json': bench_json,
+    'incremental': bench_incremental,
+    'indexes': bench_indexes,
+    'cache': bench_cache,
+    'map': bench_map,
+    'columnar': bench_columnar,
+    'charts': bench_charts,
+    'fds': bench_fds,
+    'startup': bench_startup,
+    'export': bench_export,
+    'spatial': bench_spatial,
+    'search': bench_search,
+    'shards': bench_shards,
+    'dashboard': bench_dashboard,
+    'xml-extract': bench_xml_extract,
+    'suite': bench_suite,
+    'generate': bench_generate,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for the database app")
+    parser.add_argument('--output', help="also write the results and the run's metadata to this JSON file")
+    sub = parser.add_subparsers(dest='scenario', required=True)
+    xml_parser = sub.add_parser('xml', help="DOM vs streaming XML import")
+    xml_parser.add_argument('--facilities', type=int, default=1000000)
+    xml_parser.add_argument('--seed', type=int, default=0)
+    parallel_parser = sub.add_parser('xml-parallel', help="Serial vs multi-process XML import")
+    parallel_parser.add_argument('--facilities', type=int, default=1000000)
+    parallel_parser.add_argument('--seed', type=int, default=0)
+    parallel_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    bulk_parser = sub.add_parser('bulk', help="Per-table insert rate with default vs bulk-load settings")
+    bulk_parser.add_argument('--facilities', type=int, default=200000)
+    bulk_parser.add_argument('--employees', type=int, default=200000)
+    bulk_parser.add_argument('--seed', type=int, default=0)
+    json_parser = sub.add_parser('json', help="Whole-file vs streaming JSON import")
+    json_parser.add_argument('--employees', type=int, default=1000000)
+    json_parser.add_argument('--seed', type=int, default=0)
+    incremental_parser = sub.add_parser('incremental', help="Delta refresh vs full reload of the XML")
+    incremental_parser.add_argument('--facilities', type=int, default=200000)
+    incremental_parser.add_argument('--changed', type=float, default=0.01, help="fraction of changed facilities")
+    incremental_parser.add_argument('--seed', type=int, default=0)
+    indexes_parser = sub.add_parser('indexes', help="Built-in query timings before and after the advised indexes")
+    indexes_parser.add_argument('--facilities', type=int, default=200000)
+    indexes_parser.add_argument('--employees', type=int, default=200000)
+    indexes_parser.add_argument('--seed', type=int, default=0)
+    cache_parser = sub.add_parser('cache', help="Repeated built-in queries with and without the result cache")
+    cache_parser.add_argument('--facilities', type=int, default=200000)
+    cache_parser.add_argument('--employees', type=int, default=200000)
+    cache_parser.add_argument('--rounds', type=int, default=10)
+    cache_parser.add_argument('--seed', type=int, default=0)
+    map_parser = sub.add_parser('map', help="Facilities map render time, full scatter vs level of detail")
+    map_parser.add_argument('--facilities', type=int, default=1000000)
+    map_parser.add_argument('--seed', type=int, default=0)
+    columnar_parser = sub.add_parser('columnar', help="Per-row Python lists vs NumPy columnar fetch for chart data")
+    columnar_parser.add_argument('--employees', type=int, default=1000000)
+    columnar_parser.add_argument('--seed', type=int, default=0)
+    charts_parser = sub.add_parser('charts', help="Click-to-display latency per chart, with and without the render cache")
+    charts_parser.add_argument('--facilities', type=int, default=100000)
+    charts_parser.add_argument('--employees', type=int, default=200000)
+    charts_parser.add_argument('--seed', type=int, default=0)
+    fds_parser = sub.add_parser('fds', help="Functional-dependency discovery time on Employees")
+    fds_parser.add_argument('--employees', type=int, default=1000000)
+    fds_parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    fds_parser.add_argument('--seed', type=int, default=0)
+    startup_parser = sub.add_parser('startup', help="Cold-start time of the command line and the window")
+    startup_parser.add_argument('--runs', type=int, default=5)
+    export_parser = sub.add_parser('export', help="Streaming export of Employees to CSV and columnar files")
+    export_parser.add_argument('--rows', type=int, default=10000000)
+    export_parser.add_argument('--seed', type=int, default=0)
+    spatial_parser = sub.add_parser('spatial', help="R*Tree radius, nearest and box lookups vs a full scan")
+    spatial_parser.add_argument('--facilities', type=int, default=1000000)
+    spatial_parser.add_argument('--lookups', type=int, default=1000)
+    spatial_parser.add_argument('--scans', type=int, default=5)
+    spatial_parser.add_argument('--radius', type=float, default=25, help="km")
+    spatial_parser.add_argument('--k', type=int, default=10)
+    spatial_parser.add_argument('--seed', type=int, default=0)
+    search_parser = sub.add_parser('search', help="FTS5 search as you type vs LIKE scans")
+    search_parser.add_argument('--facilities', type=int, default=1000000)
+    search_parser.add_argument('--repeat', type=int, default=5)
+    search_parser.add_argument('--seed', type=int, default=0)
+    shards_parser = sub.add_parser('shards', help="Region-partitioned import and fan-out aggregates vs one database")
+    shards_parser.add_argument('--facilities', type=int, default=1000000)
+    shards_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    shards_parser.add_argument('--repeat', type=int, default=5)
+    shards_parser.add_argument('--seed', type=int, default=0)
+    dashboard_parser = sub.add_parser('dashboard', help="Cross-filter charts from the employee snapshot vs GROUP BY queries")
+    dashboard_parser.add_argument('--employees', type=int, default=1000000)
+    dashboard_parser.add_argument('--repeat', type=int, default=5)
+    dashboard_parser.add_argument('--seed', type=int, default=0)
+    extract_parser = sub.add_parser('xml-extract', help="Per-facility row extraction, XML_MAPPING vs find() calls")
+    extract_parser.add_argument('--facilities', type=int, default=50000)
+    extract_parser.add_argument('--repeat', type=int, default=5)
+    extract_parser.add_argument('--seed', type=int, default=0)
+    suite_parser = sub.add_parser('suite', help="Import, each view, each chart query and the map on one dataset")
+    suite_parser.add_argument('--facilities', type=int, default=100000)
+    suite_parser.add_argument('--employees', type=int, default=100000)
+    suite_parser.add_argument('--repeat', type=int, default=3)
+    suite_parser.add_argument('--seed', type=int, default=0)
+    generate_parser = sub.add_parser('generate', help="Write the synthetic XML and JSON datasets to a directory")
+    generate_parser.add_argument('--facilities', type=int, default=100000)
+    generate_parser.add_argument('--employees', type=int, default=100000)
+    generate_parser.add_argument('--seed', type=int, default=0)
+    generate_parser.add_argument('--dir', default='.')
+    compare_parser = sub.add_parser('compare', help="Compare the timings of two --output files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help="allowed slowdown, as a fraction")
+    compare_parser.add_argument('--min-seconds', type=float, default=0.001)
+    args = parser.parse_args(argv)
+    # The former parser kept for xml-extract logs every record at DEBUG; at INFO
+    # neither parser logs per record, and errors.log stays small
+    logging.getLogger().setLevel(logging.INFO)
+    if args.scenario == 'compare':
+        return bench_compare(args)
+    results = SCENARIOS[args.scenario](args)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'meta': run_metadata(args), 'results': results}, f, indent=1)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1558 @@
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
+import numpy as np
+from PyQt6.QtGui import QImage, QPixmap
+from PyQt6.QtCore import Qt, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal, QAbstractTableModel, QModelIndex
+from PyQt6.QtWidgets import (
+    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QFileDialog,
+    QMessageBox, QTabWidget, QLabel, QTableView, QDialog, QTextEdit,
+    QScrollArea, QComboBox, QCheckBox, QProgressDialog, QSpinBox, QDoubleSpinBox, QFormLayout, QLineEdit,
+    QTableWidget, QTableWidgetItem
+)
+
+from app import (
+    CHART_QUERIES, COLUMNAR_EXTENSION, DML_MESSAGES, JSON_INSERT_SQL, MAP_EXTENT, QUERY_MAX_ROWS, QUERY_TIME_LIMIT,
+    SEARCH_COLUMNS, SEARCH_DELAY_MS, SEARCH_RANK_ROWS, SEARCH_RESULT_LIMIT, SHARD_REGIONS, SPATIAL_COLUMNS,
+    SPATIAL_RESULT_LIMIT, SUMMARY_TABLES, XML_INSERT_SQL, ChartCache, ChartExporter, ConnectionPool, QueryCache,
+    QueryProfiler, builtin_queries, cached_fetch, clear_slow_queries, create_indexes, create_schema,
+    disable_summaries, dml_tables, enable_summaries, execute_sql, export_result, facilities_in_box,
+    facilities_within, facility_location, format_index_advice, format_query_profiles, format_shard_aggregates,
+    import_file, incremental_json, incremental_xml, index_advice, load_json, load_xml_dom, log_query,
+    logged_queries, nearest_facilities, parallel_xml, partition_database, partitioned_xml, profiled,
+    rebuild_summaries, render_png, search_facilities, shard_aggregates, shard_dir, slow_queries, stream_json,
+    stream_xml, summaries_enabled, view_query, watch_query
+)
+from arrays import (
+    DASHBOARD_DELAY_MS, DOCS_DIR, EmployeeSnapshot, bin_values, fetch_arrays, group_percentiles, histogram,
+    map_tiles, profile_dependencies
+)
+
+
+# Background tasks
+class TaskCancelled(Exception):
+    pass
+
+
+class TaskSignals(QObject):
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+
+class Task(QRunnable):
+    # Runs fn(conn, progress) on a pool thread with a reader from the connection
+    # pool, or with the writer when write is set.
+    # progress(rows) emits a signal and raises TaskCancelled once cancel() was called.
+    def __init__(self, pool, fn, write=False):
+        super().__init__()
+        self.pool = pool
+        self.fn = fn
+        self.write = write
+        self.signals = TaskSignals()
+        self.conn = None
+        # other connections (or result models) fn works on, interrupted on cancel as well
+        self.extra_connections = []
+        self.cancel_requested = threading.Event()
+
+    def cancel(self):
+        self.cancel_requested.set()
+        for conn in [self.conn] + self.extra_connections:
+            if conn is not None:
+                try:
+                    conn.interrupt()
+                except sqlite3.ProgrammingError:
+                    pass
+
+    def progress(self, rows):
+        if self.cancel_requested.is_set():
+            raise TaskCancelled()
+        self.signals.progress.emit(rows)
+
+    def run(self):
+        try:
+            with self.pool.writer() if self.write else self.pool.reader() as conn:
+                self.conn = conn
+                try:
+                    if self.cancel_requested.is_set():
+                        raise TaskCancelled()
+                    result = self.fn(conn, self.progress)
+                finally:
+                    self.conn = None
+        except Exception as e:
+            if self.cancel_requested.is_set():
+                self.signals.cancelled.emit()
+            else:
+                logging.error(f"Error in background task: {str(e)}")
+                self.signals.failed.emit(str(e))
+        else:
+            if self.cancel_requested.is_set():
+                self.signals.cancelled.emit()
+            else:
+                self.signals.finished.emit(result)
+
+
+# Lazy result model for the Views and SQL Query tabs
+class QueryResultModel(QAbstractTableModel):
+    # Pulls rows from the cursor in pages as the view scrolls. Only the
+    # MAX_PAGES most recently used pages are kept in memory; an evicted page is
+    # written to a private temporary database and read back from it by rowid,
+    # so scrolling back costs the same at any depth and shows the rows of the
+    # same run. Sorting re-runs the query with ORDER BY.
+    # With a QueryCache, results that were read to the end without evicting a
+    # page are stored there and later served from memory. With a QueryProfiler,
+    # each run is profiled up to its first page. Reads after the first page run
+    # on the GUI thread while scrolling, so they have the time limit as well.
+    PAGE_SIZE = 500
+    MAX_PAGES = 20
+    WRAPPABLE = ('SELECT', 'WITH', 'VALUES')
+
+    # limited(message) is emitted when reading stops early: at max_rows, or when
+    # a page read on the GUI thread runs into the time limit.
+    limited = pyqtSignal(str)
+
+    def __init__(self, pool, query, headers=None, parent=None, cache=None, profiler=None, timeout=None,
+                 max_rows=None):
+        super().__init__(parent)
+        self.query = query.strip().rstrip(';')
+        self.headers = headers
+        self.cache = cache
+        self.profiler = profiler
+        # seconds per statement and per page read, and rows shown at most; None for no limit
+        self.timeout = timeout
+        self.max_rows = max_rows
+        # why the result is incomplete, None while it is not
+        self.incomplete = None
+        # profile of the last run, None when it came from the cache
+        self.profile = None
+        self.cache_key = None
+        # all rows, when served from the cache
+        self.result = None
+        self.evicted = False
+        # A reader from the pool, taken in prepare() and given back in close().
+        # prepare() runs on a worker thread, everything else on the GUI thread.
+        self.pool = pool
+        self.conn = None
+        # the writer while a statement runs on it
+        self.writer = None
+        self.wrappable = self.query.split()[0].upper() in self.WRAPPABLE
+        self.order = None
+        self.cursor = None
+        self.columns = []
+        self.pages = OrderedDict()
+        # evicted pages of a cursor result, by page number in spill's `pages` table
+        self.spill = None
+        self.spilled = set()
+        self.loaded = 0
+        self.exhausted = True
+
+    def sorted_query(self):
+        if self.order is None:
+            return self.query
+        column, descending = self.order
+        return f"SELECT * FROM ({self.query}) ORDER BY {column + 1} {'DESC' if descending else 'ASC'}"
+
+    def prepare(self):
+        # Executes the query and reads the first page; returns False when there is nothing to show
+        self.close_cursor()
+        self.result = None
+        self.profile = None
+        if not self.wrappable:
+            return self.run_statement()
+        if self.conn is None:
+            self.conn = self.pool.acquire()
+        self.cache_key = self.cache.key(self.conn, self.sorted_query()) if self.cache else None
+        cached = self.cache.get(self.cache_key) if self.cache_key else None
+        if cached is not None:
+            self.columns, self.result = cached
+            self.read_first_page()
+            return True
+        # profiled up to the first page, what the dialog waits for
+        with profiled(self.profiler, self.conn, self.sorted_query(), self.timeout) as profile:
+            self.cursor = self.conn.cursor()
+            self.cursor.execute(self.sorted_query())
+            if self.cursor.description is None:
+                if self.conn.in_transaction:
+                    self.conn.commit()
+                return False
+            self.columns = [desc[0] for desc in self.cursor.description]
+            self.read_first_page()
+            profile['rows'] = self.loaded
+        self.profile = profile if self.profiler is not None else None
+        return True
+
+    def run_statement(self):
+        # DDL, PRAGMA and the like run on the writer. Their result is read in
+        # full (they are never paged out anyway), so the writer is free again
+        # while the dialog is open.
+        with self.pool.writer() as conn:
+            self.writer = conn
+            try:
+                with profiled(self.profiler, conn, self.query, self.timeout) as profile:
+                    cursor = conn.execute(self.query)
+                    if cursor.description is None:
+                        if conn.in_transaction:
+                            conn.commit()
+                        return False
+                    self.columns = [desc[0] for desc in cursor.description]
+                    self.result = cursor.fetchmany(self.max_rows + 1) if self.max_rows else cursor.fetchall()
+                    cursor.close()
+                    if conn.in_transaction:
+                        conn.commit()
+                    self.read_first_page()
+                    profile['rows'] = len(self.result)
+            finally:
+                self.writer = None
+        self.profile = profile if self.profiler is not None else None
+        return True
+
+    def read_first_page(self):
+        self.close_spill()
+        self.pages = OrderedDict()
+        self.loaded = 0
+        self.exhausted = False
+        self.evicted = False
+        self.incomplete = None
+        self.read_page()
+
+    def fetch_rows(self):
+        if self.result is not None:
+            rows = self.result[self.loaded:self.loaded + self.PAGE_SIZE]
+        else:
+            rows = self.cursor.fetchmany(self.PAGE_SIZE)
+        if len(rows) < self.PAGE_SIZE:
+            self.exhausted = True
+        if self.max_rows and self.loaded + len(rows) >= self.max_rows:
+            if self.loaded + len(rows) > self.max_rows or not self.exhausted and self.has_more():
+                self.stop(f"Incomplete result: showing the first {self.max_rows:,} rows (max rows)")
+            rows = rows[:self.max_rows - self.loaded]
+            self.exhausted = True
+        return rows
+
+    def has_more(self):
+        if self.result is not None:
+            return len(self.result) > self.max_rows
+        return self.cursor.fetchone() is not None
+
+    def stop(self, message):
+        self.incomplete = message
+        self.exhausted = True
+        self.close_cursor()
+        self.limited.emit(message)
+
+    def read_page(self):
+        rows = self.fetch_rows()
+        if rows:
+            self.store_page(self.loaded // self.PAGE_SIZE, rows)
+            self.loaded += len(rows)
+        self.cache_result()
+        return rows
+
+    def cache_result(self):
+        if self.exhausted and self.cache_key and self.result is None and not self.evicted and not self.incomplete:
+            rows = [row for number in sorted(self.pages) for row in self.pages[number]]
+            self.cache.put(self.cache_key, self.columns, rows)
+
+    def store_page(self, number, rows):
+        self.pages[number] = rows
+        self.pages.move_to_end(number)
+        while self.wrappable and len(self.pages) > self.MAX_PAGES:
+            evicted, evicted_rows = self.pages.popitem(last=False)
+            self.evicted = True
+            if self.result is None and evicted not in self.spilled:
+                self.spill_page(evicted, evicted_rows)
+
+    def spill_page(self, number, rows):
+        # Row i of the result is stored with rowid i
+        columns = ', '.join(f'c{i}' for i in range(len(self.columns)))
+        try:
+            if self.spill is None:
+                # '' opens a temporary database on disk, deleted when it is closed
+                self.spill = sqlite3.connect('', check_same_thread=False)
+                self.spill.execute("PRAGMA journal_mode = OFF")
+                self.spill.execute("PRAGMA synchronous = OFF")
+                self.spill.execute(f"CREATE TABLE pages ({columns})")
+            start = number * self.PAGE_SIZE
+            self.spill.executemany(f"INSERT INTO pages (rowid, {columns}) VALUES (?{', ?' * len(self.columns)})",
+                                   [(start + offset, *row) for offset, row in enumerate(rows)])
+            self.spill.commit()
+        except sqlite3.Error as e:
+            # the page then shows blank when scrolled back to
+            logging.error(f"Error spilling result page {number}: {str(e)}")
+            return
+        self.spilled.add(number)
+
+    def close_spill(self):
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+        self.spilled = set()
+
+    def page(self, number):
+        if number in self.pages:
+            self.pages.move_to_end(number)
+            return self.pages[number]
+        if self.result is not None:
+            rows = self.result[number * self.PAGE_SIZE:(number + 1) * self.PAGE_SIZE]
+            self.store_page(number, rows)
+            return rows
+        if number not in self.spilled:
+            return []
+        start = number * self.PAGE_SIZE
+        try:
+            rows = self.spill.execute("SELECT * FROM pages WHERE rowid >= ? AND rowid < ? ORDER BY rowid",
+                                      (start, start + self.PAGE_SIZE)).fetchall()
+        except sqlite3.Error as e:
+            # shown blank and read again when scrolled back to
+            logging.error(f"Error reading result page {number}: {str(e)}")
+            return [('',) * len(self.columns)] * self.PAGE_SIZE
+        self.store_page(number, rows)
+        return rows
+
+    def interrupt(self):
+        conn = self.writer or self.conn
+        if conn is not None:
+            conn.interrupt()
+
+    def close_cursor(self):
+        # An unfinished statement would keep its read lock after the connection is closed
+        if self.cursor is not None:
+            self.cursor.close()
+            self.cursor = None
+
+    def close(self):
+        self.close_cursor()
+        self.close_spill()
+        if self.conn is not None:
+            self.pool.release(self.conn)
+            self.conn = None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        start = self.loaded
+        try:
+            with watch_query(self.conn, self.timeout):
+                rows = self.fetch_rows()
+        except sqlite3.Error as e:
+            logging.error(f"Error reading query result: {str(e)}")
+            self.stop(f"Incomplete result: {e}")
+            return
+        if rows:
+            self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+            self.store_page(start // self.PAGE_SIZE, rows)
+            self.loaded += len(rows)
+            self.endInsertRows()
+        self.cache_result()
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            return Qt.AlignmentFlag.AlignCenter
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        rows = self.page(index.row() // self.PAGE_SIZE)
+        offset = index.row() % self.PAGE_SIZE
+        if offset >= len(rows):
+            # an evicted page that could not be spilled comes back empty
+            return None
+        return str(rows[offset][index.column()])
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            headers = self.headers or self.columns
+            return headers[section] if section < len(headers) else self.columns[section]
+        return str(section + 1)
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        if not self.wrappable or not self.columns:
+            return
+        new_order = None if column < 0 else (column, order == Qt.SortOrder.DescendingOrder)
+        if new_order == self.order:
+            return
+        self.beginResetModel()
+        self.order = new_order
+        try:
+            self.prepare()
+        except sqlite3.Error as e:
+            logging.error(f"Error sorting query result: {str(e)}")
+            self.pages = OrderedDict()
+            self.loaded = 0
+            self.stop(f"Sorting stopped: {e}")
+        self.endResetModel()
+
+
+class MplCanvas:
+    # Figure of one chart. Charts are shown as rendered PNGs, so this needs no Qt
+    # canvas, and matplotlib is only imported once the first chart is drawn.
+    def __init__(self, parent=None, width=5, height=4, dpi=100):
+        from matplotlib.figure import Figure
+        self.fig = Figure(figsize=(width, height), dpi=dpi)
+        self.axes = self.fig.add_subplot(111)
+
+
+class EmployeeDashboard(QDialog):
+    # Cross-filter charts over an EmployeeSnapshot; every filter change recomputes
+    # all charts from the snapshot's arrays, without a query
+    def __init__(self, snapshot, parent=None):
+        super().__init__(parent)
+        self.snapshot = snapshot
+        self.setWindowTitle("Employee Dashboard")
+        self.resize(1200, 800)
+
+        self.categories = {}
+        filters_layout = QFormLayout()
+        for column, title in (('department', "Department:"), ('gender', "Gender:"), ('job_title', "Job title:")):
+            box = QComboBox()
+            box.addItem("All", -1)
+            for code, label in enumerate(snapshot.labels(column)):
+                box.addItem(label, code)
+            box.currentIndexChanged.connect(self.schedule)
+            self.categories[column] = box
+            filters_layout.addRow(title, box)
+        self.ranges = {}
+        for column, title in (('age', "Age:"), ('years_of_experience', "Years of experience:")):
+            low, span, _ = snapshot.steps[column]
+            boxes = []
+            row = QHBoxLayout()
+            for value in (low, low + max(span - 1, 0)):
+                box = QSpinBox()
+                box.setRange(low, low + max(span - 1, 0))
+                box.setValue(value)
+                box.valueChanged.connect(self.schedule)
+                boxes.append(box)
+                row.addWidget(box)
+            self.ranges[column] = boxes
+            filters_layout.addRow(title, row)
+        btn_reset = QPushButton("Reset Filters")
+        btn_reset.clicked.connect(self.reset)
+        filters_layout.addRow(btn_reset)
+
+        self.chart = QLabel()
+        self.chart.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        scroll_area = QScrollArea()
+        scroll_area.setWidget(self.chart)
+        scroll_area.setWidgetResizable(True)
+        self.status = QLabel()
+
+        layout = QVBoxLayout()
+        layout.addLayout(filters_layout)
+        layout.addWidget(scroll_area, 1)
+        layout.addWidget(self.status)
+        self.setLayout(layout)
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(DASHBOARD_DELAY_MS)
+        self.timer.timeout.connect(self.refresh)
+
+        # one figure redrawn in place and shown from the Agg buffer, laid out once:
+        # re-encoding a PNG and tight_layout would take longer than the filtering
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        self.figure = Figure(figsize=(12, 7), dpi=100 * self.devicePixelRatioF())
+        self.axes = self.figure.subplots(2, 3)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.laid_out = False
+        self.refresh()
+
+    def schedule(self):
+        self.timer.start()
+
+    def reset(self):
+        for box in self.categories.values():
+            box.blockSignals(True)
+            box.setCurrentIndex(0)
+            box.blockSignals(False)
+        for low, high in self.ranges.values():
+            for box, value in ((low, low.minimum()), (high, high.maximum())):
+                box.blockSignals(True)
+                box.setValue(value)
+                box.blockSignals(False)
+        self.refresh()
+
+    def filters(self):
+        # Only the filters narrowing the data; a full range also keeps the rows without a value
+        filters = {}
+        for column, box in self.categories.items():
+            if box.currentData() >= 0:
+                filters[column] = [self.snapshot.dictionaries[column][box.currentData()]]
+        for column, (low, high) in self.ranges.items():
+            if low.value() > low.minimum() or high.value() < high.maximum():
+                filters[column] = (low.value(), high.value())
+        return filters
+
+    def refresh(self):
+        filters = self.filters()
+        start = time.perf_counter()
+        data = self.snapshot.dashboard(filters)
+        filtered = time.perf_counter() - start
+
+        start = time.perf_counter()
+        axes = self.axes
+        for ax in axes.flat:
+            ax.clear()
+
+        def colors(column):
+            # the selected value stands out, the others are greyed
+            selected = self.categories[column].currentData()
+            return ['C0' if selected < 0 or code == selected else 'lightgray'
+                    for code in range(len(self.snapshot.dictionaries[column]))]
+
+        departments = self.snapshot.labels('department')
+        axes[0, 0].barh(departments, data['department'], color=colors('department'))
+        axes[0, 0].set_title("Employees by Department")
+        axes[0, 1].bar(self.snapshot.labels('gender'), data['gender'], color=colors('gender'))
+        axes[0, 1].set_title("Employees by Gender")
+        axes[0, 2].barh(self.snapshot.labels('job_title'), data['job_title'], color=colors('job_title'))
+        axes[0, 2].set_title("Employees by Job Title")
+        axes[0, 2].tick_params(axis='y', labelsize=7)
+        ages, counts = data['age']
+        low, high = (box.value() for box in self.ranges['age'])
+        axes[1, 0].bar(ages, counts, width=1, color=['C0' if low <= age <= high else 'lightgray' for age in ages])
+        axes[1, 0].set_title("Age Distribution")
+        years, salaries = data['salary_by_experience']
+        low, high = (box.value() for box in self.ranges['years_of_experience'])
+        axes[1, 1].plot(years, salaries, color='lightgray')
+        inside = (years >= low) & (years <= high)
+        axes[1, 1].plot(years[inside], salaries[inside], marker='o', markersize=3)
+        axes[1, 1].set_title("Avg Salary by Years of Experience")
+        axes[1, 2].barh(departments, np.nan_to_num(data['salary_by_department']), color=colors('department'))
+        axes[1, 2].set_title("Avg Salary by Department")
+        if not self.laid_out:
+            self.figure.tight_layout()
+            self.laid_out = True
+        self.canvas.draw()
+        width, height = self.canvas.get_width_height(physical=True)
+        image = QImage(self.canvas.buffer_rgba(), width, height, QImage.Format.Format_RGBA8888).copy()
+        drawn = time.perf_counter() - start
+
+        pixmap = QPixmap.fromImage(image)
+        pixmap.setDevicePixelRatio(self.devicePixelRatioF())
+        self.chart.setPixmap(pixmap)
+        self.status.setText(f"{data['rows']:,} of {self.snapshot.rows:,} employees, "
+                            f"filtered in {filtered * 1000:.1f} ms, drawn in {drawn * 1000:.0f} ms")
+
+
+class DatabaseApp(QMainWindow):
+    def __init__(self, db_path='project.db'):
+        super().__init__()
+        self.setWindowTitle("Database Management System")
+        self.setGeometry(400, 250, 500, 300)
+        
+        # connect to DataBase: the pool's writer creates it and switches it to WAL;
+        # self.conn is a read-only connection for quick reads on the GUI thread
+        self.db_path = db_path
+        self.pool = ConnectionPool(db_path)
+        self.create_tables()
+        self.conn = self.pool.open_reader(check_same_thread=True)
+        # background tasks, each with a connection from the pool
+        self.tasks = set()
+        self.query_cache = QueryCache()
+        self.chart_cache = ChartCache(self.query_cache)
+        self.employee_snapshot = None
+        self.profiler = QueryProfiler(pool=self.pool)
+        self.chart_exporter = ChartExporter()
+
+        # tabs
+        self.tabs = QTabWidget(self)
+        self.setCentralWidget(self.tabs)
+
+        # upload tab
+        upload_tab = QWidget()
+        upload_layout = QVBoxLayout()
+        upload_layout.addWidget(QLabel("Upload your data files here:"))
+        btn_xml = QPushButton("Upload XML")
+        btn_xml.clicked.connect(self.upload_xml)
+        btn_json = QPushButton("Upload JSON")
+        btn_json.clicked.connect(self.upload_json)
+        self.xml_mode = QComboBox()
+        self.xml_mode.addItem("Streaming (low memory)", stream_xml)
+        self.xml_mode.addItem("Parallel (all cores)", parallel_xml)
+        self.xml_mode.addItem("Whole document", load_xml_dom)
+        self.xml_mode.addItem("Incremental (changed records only)", incremental_xml)
+        self.xml_mode.addItem("Partitioned (one file per region, all cores)", partitioned_xml)
+        self.json_mode = QComboBox()
+        self.json_mode.addItem("Streaming (low memory)", stream_json)
+        self.json_mode.addItem("Whole file", load_json)
+        self.json_mode.addItem("Incremental (changed records only)", incremental_json)
+        self.bulk_mode = QCheckBox("Bulk load (fast settings, one transaction per file)")
+        upload_layout.addSpacing(10)
+        upload_layout.addWidget(QLabel("XML import mode:"))
+        upload_layout.addWidget(self.xml_mode)
+        upload_layout.addWidget(btn_xml)
+        upload_layout.addSpacing(10)
+        upload_layout.addWidget(QLabel("JSON import mode:"))
+        upload_layout.addWidget(self.json_mode)
+        upload_layout.addWidget(btn_json)
+        upload_layout.addSpacing(10)
+        upload_layout.addWidget(self.bulk_mode)
+        upload_layout.addStretch()
+        upload_tab.setLayout(upload_layout)
+        self.tabs.addTab(upload_tab, "Upload Files")
+
+        # view tab
+        views_tab = QWidget()
+        views_layout = QVBoxLayout()
+        views_layout.addWidget(QLabel("View pre-defined data summaries:"))
+        btn_view1 = QPushButton("Show Facilities by State")
+        btn_view1.clicked.connect(lambda: self.show_view('FacilitiesByState', ['State', 'FacilityCount']))
+        btn_view2 = QPushButton("Show Avg Salary by Job")
+        btn_view2.clicked.connect(lambda: self.show_view('View_AvgSalaryByJob', ['Job Title', 'Avg Salary', 'Employee Count']))
+        btn_view3 = QPushButton("Show Programs by Interest Type")
+        btn_view3.clicked.connect(lambda: self.show_view('CountProgramsByInterestType', ['Interest Type ID', 'Program Count', 'Program Common Name']))
+        views_layout.addSpacing(10)
+        views_layout.addWidget(btn_view1)
+        views_layout.addWidget(btn_view2)
+        views_layout.addWidget(btn_view3)
+        self.use_summaries = QCheckBox("Use materialized summaries (kept current by triggers)")
+        self.use_summaries.setChecked(summaries_enabled(self.conn))
+        self.use_summaries.toggled.connect(self.toggle_summaries)
+        btn_rebuild = QPushButton("Rebuild Summaries")
+        btn_rebuild.clicked.connect(self.rebuild_summaries)
+        views_layout.addSpacing(10)
+        views_layout.addWidget(self.use_summaries)
+        views_layout.addWidget(btn_rebuild)
+        btn_partition = QPushButton("Partition by Region")
+        btn_partition.clicked.connect(self.partition_database)
+        btn_shards = QPushButton("Aggregate over Region Shards")
+        btn_shards.clicked.connect(self.run_shard_aggregates)
+        views_layout.addSpacing(10)
+        views_layout.addWidget(btn_partition)
+        views_layout.addWidget(btn_shards)
+        views_layout.addStretch()
+        views_tab.setLayout(views_layout)
+        self.tabs.addTab(views_tab, "Views")
+
+        # SQL tab
+        sql_tab = QWidget()
+        sql_layout = QVBoxLayout()
+        sql_layout.addWidget(QLabel("Run custom SQL queries:"))
+        self.sql_entry = QTextEdit()
+        sql_layout.addWidget(self.sql_entry)
+        btn_run = QPushButton("Run Query")
+        btn_run.clicked.connect(self.run_sql_query)
+        # 0 turns a limit off
+        self.time_limit = QSpinBox()
+        self.time_limit.setRange(0, 3600)
+        self.time_limit.setValue(QUERY_TIME_LIMIT)
+        self.time_limit.setSuffix(" s")
+        self.time_limit.setSpecialValueText("No limit")
+        self.max_rows = QSpinBox()
+        self.max_rows.setRange(0, 100000000)
+        self.max_rows.setSingleStep(10000)
+        self.max_rows.setValue(QUERY_MAX_ROWS)
+        self.max_rows.setGroupSeparatorShown(True)
+        self.max_rows.setSpecialValueText("No limit")
+        btn_advisor = QPushButton("Index Advisor")
+        btn_advisor.clicked.connect(self.run_index_advisor)
+        btn_cache = QPushButton("Query Cache Stats")
+        btn_cache.clicked.connect(self.show_cache_stats)
+        btn_dependencies = QPushButton("Profile Dependencies")
+        btn_dependencies.clicked.connect(self.run_dependency_profile)
+        btn_profiler = QPushButton("Query Profiler")
+        btn_profiler.clicked.connect(self.show_query_profiler)
+        sql_layout.addWidget(QLabel("Time limit per query:"))
+        sql_layout.addWidget(self.time_limit)
+        sql_layout.addWidget(QLabel("Max rows shown:"))
+        sql_layout.addWidget(self.max_rows)
+        sql_layout.addSpacing(10)
+        sql_layout.addWidget(btn_run)
+        sql_layout.addWidget(btn_advisor)
+        sql_layout.addWidget(btn_cache)
+        sql_layout.addWidget(btn_profiler)
+        sql_layout.addWidget(btn_dependencies)
+        sql_layout.addStretch()
+        sql_tab.setLayout(sql_layout)
+        self.tabs.addTab(sql_tab, "SQL Query")
+        
+        vis_tab = QWidget()
+        vis_layout = QVBoxLayout()
+        vis_layout.addWidget(QLabel("Visualize data:"))
+        btn_chart2 = QPushButton("Avg Salary by Job Title")
+        btn_chart2.clicked.connect(self.plot_avg_salary_by_job)
+        btn_chart3 = QPushButton("Employees by Gender")
+        btn_chart3.clicked.connect(self.plot_gender_distribution)
+        btn_programs = QPushButton("Programs by InterestType")
+        btn_programs.clicked.connect(self.plot_programs_by_interest)
+        btn_avg_exp_by_dept = QPushButton("Avg Experience by Department")
+        btn_avg_exp_by_dept.clicked.connect(self.plot_avg_experience_by_department)
+        btn_facilities_per_state = QPushButton("Facilities per State (Bar)")
+        btn_facilities_per_state.clicked.connect(self.plot_facilities_per_state)
+        btn_employee_dept_pie = QPushButton("Employee Dept Distribution (Pie)")
+        btn_employee_dept_pie.clicked.connect(self.plot_employee_dept_pie)
+        btn_employee_job_pie = QPushButton("Employee job Distribution (Pie)")
+        btn_employee_job_pie.clicked.connect(self.plot_employee_job_pie)
+        btn_age_histogram = QPushButton("Age Distribution (Histogram)")
+        btn_age_histogram.clicked.connect(self.plot_age_histogram)
+        btn_salary_vs_exp_line = QPushButton("Salary vs Experience (Line)")
+        btn_salary_vs_exp_line.clicked.connect(self.plot_salary_vs_exp_line)
+        btn_facilities_map = QPushButton("Facilities on Map")
+        btn_facilities_map.clicked.connect(self.plot_facilities_scatter)
+        btn_salary_box = QPushButton("Salary by Department (Box)")
+        btn_salary_box.clicked.connect(self.plot_salary_box_by_department)
+        btn_salary_percentiles = QPushButton("Salary Percentiles by Experience")
+        btn_salary_percentiles.clicked.connect(self.plot_salary_percentiles_by_experience)
+        btn_dashboard = QPushButton("Employee Dashboard (Cross-Filter)")
+        btn_dashboard.clicked.connect(self.show_employee_dashboard)
+        self.export_charts = QCheckBox("Save charts as PNG files")
+        
+        
+        vis_layout.addSpacing(10)
+        vis_layout.addWidget(btn_chart2)
+        vis_layout.addWidget(btn_chart3)
+        vis_layout.addWidget(btn_programs)
+        vis_layout.addWidget(btn_avg_exp_by_dept)        
+        vis_layout.addWidget(btn_facilities_per_state)
+        vis_layout.addWidget(btn_employee_dept_pie)
+        vis_layout.addWidget(btn_employee_job_pie)
+        vis_layout.addWidget(btn_age_histogram)
+        vis_layout.addWidget(btn_salary_vs_exp_line)
+        vis_layout.addWidget(btn_facilities_map)
+        vis_layout.addWidget(btn_salary_box)
+        vis_layout.addWidget(btn_salary_percentiles)
+        vis_layout.addWidget(btn_dashboard)
+        vis_layout.addSpacing(10)
+        vis_layout.addWidget(self.export_charts)
+        vis_layout.addStretch()
+        vis_tab.setLayout(vis_layout)
+        self.tabs.addTab(vis_tab, "Visualization")
+
+        # spatial search tab
+        spatial_tab = QWidget()
+        spatial_layout = QVBoxLayout()
+        spatial_layout.addWidget(QLabel("Find facilities by location:"))
+        self.spatial_mode = QComboBox()
+        self.spatial_mode.addItem("Within a radius", 'radius')
+        self.spatial_mode.addItem("Nearest facilities", 'nearest')
+        self.spatial_mode.addItem("In a bounding box", 'box')
+        self.spatial_mode.currentIndexChanged.connect(self.update_spatial_inputs)
+        # an empty registry ID searches around the latitude and longitude
+        self.spatial_facility = QLineEdit()
+        self.spatial_facility.setPlaceholderText("Registry ID (optional)")
+        self.spatial_lat = self.coordinate_box(-90, 90, 38.9)
+        self.spatial_lon = self.coordinate_box(-180, 180, -77.0)
+        self.spatial_radius = QDoubleSpinBox()
+        self.spatial_radius.setRange(0.1, 20000)
+        self.spatial_radius.setValue(25)
+        self.spatial_radius.setSuffix(" km")
+        self.spatial_k = QSpinBox()
+        self.spatial_k.setRange(1, SPATIAL_RESULT_LIMIT)
+        self.spatial_k.setValue(10)
+        west, east, south, north = MAP_EXTENT
+        self.spatial_box = [self.coordinate_box(-180, 180, west), self.coordinate_box(-180, 180, east),
+                            self.coordinate_box(-90, 90, south), self.coordinate_box(-90, 90, north)]
+        form = QFormLayout()
+        form.addRow("Search:", self.spatial_mode)
+        form.addRow("Around facility:", self.spatial_facility)
+        form.addRow("Latitude:", self.spatial_lat)
+        form.addRow("Longitude:", self.spatial_lon)
+        form.addRow("Radius:", self.spatial_radius)
+        form.addRow("Facilities:", self.spatial_k)
+        for label, box in zip(("West:", "East:", "South:", "North:"), self.spatial_box):
+            form.addRow(label, box)
+        btn_spatial = QPushButton("Search")
+        btn_spatial.clicked.connect(self.run_spatial_search)
+        spatial_layout.addLayout(form)
+        spatial_layout.addWidget(btn_spatial)
+        spatial_layout.addStretch()
+        spatial_tab.setLayout(spatial_layout)
+        self.tabs.addTab(spatial_tab, "Spatial Search")
+        self.update_spatial_inputs()
+
+        # full-text search tab, searches as you type
+        search_tab = QWidget()
+        search_layout = QVBoxLayout()
+        search_layout.addWidget(QLabel("Search facility names, addresses and program descriptions:"))
+        self.search_entry = QLineEdit()
+        self.search_entry.setPlaceholderText("e.g. refinery main st")
+        self.search_entry.textChanged.connect(lambda text: self.search_timer.start())
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.run_search)
+        self.search_task = None
+        self.search_status = QLabel("")
+        self.search_results = QTableWidget(0, len(SEARCH_COLUMNS))
+        self.search_results.setHorizontalHeaderLabels(SEARCH_COLUMNS)
+        self.search_results.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.search_results.horizontalHeader().setStretchLastSection(True)
+        search_layout.addWidget(self.search_entry)
+        search_layout.addWidget(self.search_status)
+        search_layout.addWidget(self.search_results)
+        search_tab.setLayout(search_layout)
+        self.tabs.addTab(search_tab, "Search")
+
+
+        # help
+        
+
+    def create_tables(self):
+        with self.pool.writer() as conn:
+            create_schema(conn)
+
+    def run_task(self, label, fn, on_done, error_message="Error", parent=None, write=False):
+        # Runs fn(conn, progress) on the thread pool; on_done gets its result on the GUI thread.
+        # conn is a read-only snapshot unless write is set, then it is the writer.
+        # The progress dialog belongs to parent (default: the main window).
+        parent = parent or self
+        task = Task(self.pool, fn, write)
+        dialog = QProgressDialog(label, "Cancel", 0, 0, parent)
+        dialog.setWindowTitle("Please wait")
+        dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        dialog.setMinimumDuration(500)
+        dialog.canceled.connect(task.cancel)
+
+        def finish():
+            self.tasks.discard(task)
+            dialog.canceled.disconnect(task.cancel)
+            dialog.close()
+            dialog.deleteLater()
+
+        def done(result):
+            finish()
+            on_done(result)
+
+        def failed(message):
+            finish()
+            QMessageBox.critical(parent, "Error", f"{error_message}: {message}", QMessageBox.StandardButton.Ok)
+
+        def cancelled():
+            finish()
+            self.statusBar().showMessage(f"{label} cancelled", 5000)
+
+        task.signals.progress.connect(lambda rows: dialog.setLabelText(f"{label}\n{rows:,} rows processed"))
+        task.signals.finished.connect(done)
+        task.signals.failed.connect(failed)
+        task.signals.cancelled.connect(cancelled)
+        self.tasks.add(task)
+        QThreadPool.globalInstance().start(task)
+        return task
+
+    def run_query(self, query, on_rows):
+        self.run_task("Running query...", lambda conn, progress: cached_fetch(conn, self.query_cache, query, self.profiler), on_rows)
+
+    def run_arrays(self, query, on_arrays, dtypes=None):
+        self.run_task("Running query...",
+                      lambda conn, progress: fetch_arrays(conn, query, dtypes, self.query_cache, progress, self.profiler), on_arrays)
+
+    def invalidating(self, fn, tables=None):
+        # Wraps a task that writes to tables (None: any table) so cached results are dropped once it ends
+        def run(conn, progress):
+            try:
+                return fn(conn, progress)
+            finally:
+                self.query_cache.invalidate(tables)
+        return run
+
+    def upload_xml(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Open XML", "", "XML Files (*.xml)")
+        if not file_path:
+            return
+        self.run_import("Importing XML...", self.xml_mode.currentData(), file_path, "XML file processed successfully!",
+                        "Error processing XML", list(XML_INSERT_SQL) + ['ImportHashes'])
+
+    def upload_json(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Open JSON", "", "JSON Files (*.json)")
+        if not file_path:
+            return
+        self.run_import("Importing JSON...", self.json_mode.currentData(), file_path, "JSON file processed successfully!",
+                        "Error processing JSON", list(JSON_INSERT_SQL) + ['ImportHashes'])
+
+    def run_import(self, label, loader, file_path, message, error_message, tables):
+        bulk = self.bulk_mode.isChecked()
+
+        self.run_task(label, self.invalidating(lambda conn, progress: import_file(conn, loader, file_path, bulk, progress), tables),
+                      lambda counts: QMessageBox.information(self, "Success", message, QMessageBox.Icon.Information),
+                      error_message, write=True)
+
+    def show_table_dialog(self, title, model):
+        dialog = QDialog(self)
+        dialog.setWindowTitle(title)
+        dialog.resize(700, 500)
+
+        layout = QVBoxLayout()
+        table = QTableView()
+        table.setModel(model)
+        table.horizontalHeader().setStretchLastSection(True)
+        table.setStyleSheet("QTableView { border: 1px solid #ccc; }")
+        # Sorting re-queries with ORDER BY, so only start sorting on a header click
+        table.horizontalHeader().setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        table.setSortingEnabled(model.wrappable)
+
+        btn_export = QPushButton("Export...")
+        btn_export.setToolTip("Write the whole result, in the current order, to a CSV or columnar file")
+        btn_export.setEnabled(model.wrappable)
+        btn_export.clicked.connect(lambda: self.export_query(model.sorted_query(), dialog))
+
+        # why the rows shown are not the whole result, if they are not
+        status = QLabel(model.incomplete or "")
+        status.setStyleSheet("color: #b00000;")
+        status.setVisible(bool(model.incomplete))
+
+        def show_limited(message):
+            status.setText(message)
+            status.setVisible(True)
+
+        model.limited.connect(show_limited)
+
+        layout.addWidget(table)
+        layout.addWidget(status)
+        layout.addWidget(btn_export, alignment=Qt.AlignmentFlag.AlignRight)
+        dialog.setLayout(layout)
+        dialog.exec()
+        model.limited.disconnect(show_limited)
+        model.close()
+
+    def export_query(self, query, parent):
+        # Re-runs the query on the thread pool and streams it to the file, so results of any size fit
+        file_path, selected = QFileDialog.getSaveFileName(
+            parent, "Export Result", "", f"CSV Files (*.csv);;Columnar Files (*{COLUMNAR_EXTENSION})")
+        if not file_path:
+            return
+        fmt = 'columnar' if selected.startswith("Columnar") else 'csv'
+        if not os.path.splitext(file_path)[1]:
+            file_path += COLUMNAR_EXTENSION if fmt == 'columnar' else '.csv'
+
+        def exported(stats):
+            QMessageBox.information(parent, "Export", f"{stats['rows']:,} rows written to {file_path} "
+                                    f"({stats['bytes'] / 2**20:.1f} MB in {stats['seconds']:.1f} s)")
+
+        self.run_task("Exporting...", lambda conn, progress: export_result(conn, query, file_path, fmt, progress),
+                      exported, "Error exporting", parent)
+
+    def run_model(self, title, model, error_message="Error", show_empty=True):
+        # Runs the query and reads its first page on the thread pool, then shows the dialog
+        def opened(has_result):
+            if has_result and (show_empty or model.loaded):
+                self.show_table_dialog(title, model)
+            else:
+                model.close()
+
+        task = self.run_task("Running query...", lambda conn, progress: model.prepare(), opened, error_message)
+        task.extra_connections.append(model)
+        task.signals.failed.connect(lambda message: model.close())
+        task.signals.cancelled.connect(model.close)
+        return task
+
+    def show_view(self, view_name, columns):
+        query = view_query(view_name, self.use_summaries.isChecked())
+        self.run_model(view_name, QueryResultModel(self.pool, query, columns, cache=self.query_cache,
+                                                        profiler=self.profiler))
+
+    def toggle_summaries(self, enabled):
+        if enabled:
+            self.run_task("Building summaries...", self.invalidating(lambda conn, progress: enable_summaries(conn), SUMMARY_TABLES),
+                          lambda _: self.statusBar().showMessage("Summaries enabled", 5000), write=True)
+        else:
+            self.run_task("Removing summaries...", self.invalidating(lambda conn, progress: disable_summaries(conn), SUMMARY_TABLES),
+                          lambda _: self.statusBar().showMessage("Summaries disabled", 5000), write=True)
+
+    def rebuild_summaries(self):
+        if not self.use_summaries.isChecked():
+            QMessageBox.warning(self, "Warning", "Materialized summaries are not enabled.", QMessageBox.StandardButton.Ok)
+            return
+        self.run_task("Rebuilding summaries...", self.invalidating(lambda conn, progress: rebuild_summaries(conn), SUMMARY_TABLES),
+                      lambda _: self.statusBar().showMessage("Summaries rebuilt", 5000), write=True)
+
+    def partition_database(self):
+        self.run_task("Partitioning by region...", lambda conn, progress: partition_database(conn, progress=progress),
+                      lambda counts: self.statusBar().showMessage(
+                          f"{counts['Facilities']:,} facilities split into {len(SHARD_REGIONS)} shards", 5000),
+                      "Error partitioning database", write=True)
+
+    def run_shard_aggregates(self):
+        # the shards are separate files, read by worker processes rather than the connection pool
+        self.run_task("Aggregating over region shards...", lambda conn, progress: shard_aggregates(self.db_path),
+                      self.show_shard_aggregates, "Error aggregating over shards")
+
+    def show_shard_aggregates(self, results):
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Region Shard Aggregates")
+        dialog.resize(700, 550)
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(f"Each aggregate ran on the {len(SHARD_REGIONS)} shards in {shard_dir(self.db_path)} "
+                                f"in parallel and the partial results were merged."))
+        report = QTextEdit()
+        report.setReadOnly(True)
+        report.setLineWrapMode(QTextEdit.LineWrapMode.NoWrap)
+        report.setFontFamily("monospace")
+        report.setPlainText(format_shard_aggregates(results))
+        layout.addWidget(report)
+        dialog.setLayout(layout)
+        dialog.exec()
+
+    def run_sql_query(self):
+        query = self.sql_entry.toPlainText().strip()
+        if not query:
+            QMessageBox.warning(self, "Warning", "Please enter a SQL query.", QMessageBox.StandardButton.Ok)
+            return
+        timeout = self.time_limit.value() or None
+        if query.split()[0].upper() in DML_MESSAGES:
+            self.run_task("Running query...",
+                          self.invalidating(lambda conn, progress: execute_sql(conn, query, self.profiler, timeout),
+                                            dml_tables(query)),
+                          self.show_sql_result, "Error executing query", write=True)
+        else:
+            model = QueryResultModel(self.pool, query, cache=self.query_cache, profiler=self.profiler, timeout=timeout,
+                                     max_rows=self.max_rows.value() or None)
+            task = self.run_model("SQL Query Result", model, "Error executing query", show_empty=False)
+            task.signals.finished.connect(lambda has_result: self.show_profile_status(model.profile))
+            # Only read-only statements are logged, the index advisor replays them
+            if model.wrappable:
+                task.signals.finished.connect(lambda has_result: self.pool.defer(lambda conn: log_query(conn, query)))
+            else:
+                # DDL, PRAGMA and the like may change any table
+                task.signals.finished.connect(lambda has_result: self.query_cache.invalidate())
+
+    def show_profile_status(self, profile):
+        if profile is not None:
+            self.statusBar().showMessage(f"{profile['rows']:,} rows in {profile['seconds']:.3f} s, "
+                                         f"{profile['vm_steps']:,} VM steps", 10000)
+
+    def show_query_profiler(self):
+        self.run_task("Reading slow-query log...", lambda conn, progress: slow_queries(conn), self.show_query_profiles,
+                      "Error reading slow-query log")
+
+    def show_query_profiles(self, offenders):
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Query Profiler")
+        dialog.resize(900, 550)
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(f"Queries taking {self.profiler.threshold} s or more are kept in the slow-query log."))
+        report = QTextEdit()
+        report.setReadOnly(True)
+        report.setLineWrapMode(QTextEdit.LineWrapMode.NoWrap)
+        report.setFontFamily("monospace")
+        report.setPlainText(format_query_profiles(offenders, self.profiler.recent_profiles()))
+        layout.addWidget(report)
+        btn_clear = QPushButton("Clear Slow-Query Log")
+        btn_clear.setEnabled(bool(offenders))
+        btn_clear.clicked.connect(dialog.accept)
+        layout.addWidget(btn_clear)
+        dialog.setLayout(layout)
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            self.pool.defer(clear_slow_queries)
+            self.statusBar().showMessage("Slow-query log cleared", 5000)
+
+    def show_sql_result(self, result):
+        statement, columns, rows = result
+        QMessageBox.information(self, "Success", DML_MESSAGES[statement], QMessageBox.StandardButton.Ok)
+
+    def show_cache_stats(self):
+        stats = self.query_cache.stats()
+        charts = self.chart_cache.stats()
+        pool = self.pool.stats()
+        QMessageBox.information(self, "Query Cache",
+                                f"Hits: {stats['hits']:,}\nMisses: {stats['misses']:,}\n"
+                                f"Hit rate: {stats['hit_rate']:.1%}\nEntries: {stats['entries']:,}\n"
+                                f"Memory: {stats['bytes'] / 2**20:.1f} MB of {stats['budget'] / 2**20:.0f} MB\n\n"
+                                f"Rendered charts: {charts['entries']:,} ({charts['bytes'] / 2**20:.1f} MB), "
+                                f"{charts['hits']:,} shown from cache\n\n"
+                                f"Readers: {pool['in_use']} in use, {pool['idle']} idle of {pool['size']} "
+                                f"(peak {pool['peak_in_use']})\n"
+                                f"Reads: {pool['reads']:,}, {pool['read_waits']:,} waited "
+                                f"({pool['read_wait_seconds']:.2f} s)\n"
+                                f"Writes: {pool['writes']:,}, {pool['write_waits']:,} waited "
+                                f"({pool['write_wait_seconds']:.2f} s)",
+                                QMessageBox.StandardButton.Ok)
+
+    def run_dependency_profile(self):
+        self.run_task("Discovering functional dependencies...", lambda conn, progress: profile_dependencies(conn, progress=progress),
+                      self.show_dependency_profile, "Error profiling dependencies")
+
+    def show_dependency_profile(self, summaries):
+        lines = []
+        for name, summary in summaries.items():
+            if summary['rows']:
+                lines.append(f"{name}: {summary['dependencies']:,} minimal dependencies, {summary['keys']:,} candidate keys "
+                             f"over {summary['rows']:,} rows ({summary['seconds']:.2f} s)")
+            else:
+                lines.append(f"{name}: no rows, report left unchanged")
+        QMessageBox.information(self, "Functional Dependencies", f"Reports written to {DOCS_DIR}\n\n" + "\n".join(lines),
+                                QMessageBox.StandardButton.Ok)
+
+    def run_index_advisor(self):
+        queries = builtin_queries()
+        queries.update(logged_queries(self.conn))
+        self.run_task("Analyzing query plans...", lambda conn, progress: index_advice(conn, queries, progress),
+                      self.show_index_advice, "Error analyzing queries")
+
+    def show_index_advice(self, advice):
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Index Advisor")
+        dialog.resize(800, 500)
+        layout = QVBoxLayout()
+        report = QTextEdit()
+        report.setReadOnly(True)
+        report.setLineWrapMode(QTextEdit.LineWrapMode.NoWrap)
+        report.setFontFamily("monospace")
+        report.setPlainText(format_index_advice(advice))
+        layout.addWidget(report)
+        if advice['indexes'] and advice['after'] is None:
+            btn_create = QPushButton("Create Suggested Indexes")
+            btn_create.clicked.connect(dialog.accept)
+            layout.addWidget(btn_create)
+        dialog.setLayout(layout)
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            self.run_task("Creating indexes...", lambda conn, progress: create_indexes(conn, advice, progress),
+                          self.show_index_advice, "Error creating indexes", write=True)
+
+    def plot_facilities_per_state(self):
+        query = view_query('FacilitiesByState', self.use_summaries.isChecked())
+        self.plot_chart('facilities_per_state', [query], partial(self.run_query, query), self.draw_facilities_per_state)
+
+    def draw_facilities_per_state(self, data, key):
+        if not data:
+            QMessageBox.warning(self, "No Data", "No data available for Facilities per State.")
+            return
+        states, counts = zip(*data)
+
+        canvas = MplCanvas(self, width=8, height=4)
+        canvas.axes.bar(states, counts)
+        canvas.axes.set_title("Facilities per State")
+        canvas.axes.set_ylabel("Count")
+        canvas.axes.set_xticks(range(len(states)))
+        canvas.axes.set_xticklabels(states, rotation=90, ha='center' , fontsize=8)
+        canvas.fig.tight_layout()
+        self.show_chart(canvas, "Facilities per State", key)
+
+    def plot_employee_dept_pie(self):
+        query = CHART_QUERIES['employee_dept_pie']
+        self.plot_chart('employee_dept_distribution', [query], partial(self.run_query, query), self.draw_employee_dept_pie)
+
+    def draw_employee_dept_pie(self, data, key):
+        if not data:
+            QMessageBox.warning(self, "No Data", "No data available for Employee Dept Distribution.")
+            return
+        depts, counts = zip(*data)
+
+        canvas = MplCanvas(self, width=5, height=4)
+        canvas.axes.pie(counts, labels=depts, autopct='%1.1f%%')
+        canvas.axes.set_title("Employee Dept Distribution")
+        self.show_chart(canvas, "Employee Dept Distribution", key)
+    
+    def plot_employee_job_pie(self):
+        query = CHART_QUERIES['employee_job_pie']
+        self.plot_chart('employee_job_distribution', [query], partial(self.run_query, query), self.draw_employee_job_pie)
+
+    def draw_employee_job_pie(self, data, key):
+        if not data:
+            QMessageBox.warning(self, "No Data", "No data available for Employee Dept Distribution.")
+            return
+        jobs, counts = zip(*data)
+
+        canvas = MplCanvas(self, width=5, height=4)
+        canvas.axes.pie(counts, labels=jobs, autopct='%1.1f%%')
+        canvas.axes.set_title("Employee job Distribution")
+        self.show_chart(canvas, "Employee job Distribution", key)
+
+    def plot_age_histogram(self):
+        query = CHART_QUERIES['age_histogram']
+        self.plot_chart('age_distribution', [query], partial(self.run_arrays, query), self.draw_age_histogram)
+
+    def draw_age_histogram(self, arrays, key):
+        ages, counts = arrays.values()
+        if not len(ages):
+            QMessageBox.warning(self, "No Data", "No data available for Age Distribution.")
+            return
+        # binned from one row per distinct age
+        frequencies, edges = histogram(ages, bins=10, weights=counts)
+
+        canvas = MplCanvas(self, width=6, height=4)
+        canvas.axes.hist(edges[:-1], bins=edges, weights=frequencies, edgecolor='black')
+        canvas.axes.set_title("Age Distribution of Employees")
+        canvas.axes.set_xlabel("Age")
+        canvas.axes.set_ylabel("Frequency")
+        self.show_chart(canvas, "Age Distribution", key)
+
+    def plot_salary_vs_exp_line(self):
+        query = CHART_QUERIES['salary_vs_exp_line']
+        self.plot_chart('salary_vs_experience', [query], partial(self.run_arrays, query), self.draw_salary_vs_exp_line)
+
+    def draw_salary_vs_exp_line(self, arrays, key):
+        years, salaries = arrays.values()
+        if not len(years):
+            QMessageBox.warning(self, "No Data", "No data available for Salary vs Experience.")
+            return
+
+        canvas = MplCanvas(self, width=6, height=4)
+        canvas.axes.plot(years, salaries, marker='o')
+        canvas.axes.set_title("Salary vs Years of Experience")
+        canvas.axes.set_xlabel("Years of Experience")
+        canvas.axes.set_ylabel("Salary")
+        self.show_chart(canvas, "Salary vs Experience (Line)", key)
+        
+    def plot_avg_salary_by_job(self):
+        query = view_query('View_AvgSalaryByJob', self.use_summaries.isChecked())
+        query = f"SELECT job_title, avg_salary FROM ({query})"
+        self.plot_chart('avg_salary_by_job', [query], partial(self.run_query, query), self.draw_avg_salary_by_job)
+
+    def draw_avg_salary_by_job(self, data, key):
+        if not data:
+            QMessageBox.warning(self, "No Data", "No data available for Average Salary by Job.")
+            return
+        jobs, avg_salaries = zip(*data)
+
+        canvas = MplCanvas(self, width=5, height=4)
+        canvas.axes.barh(jobs, avg_salaries)
+        canvas.axes.set_yticks(range(len(jobs)))
+        canvas.axes.set_yticklabels(jobs, rotation=45 , fontsize=7)
+        canvas.fig.tight_layout() 
+        canvas.axes.set_title("Average Salary by Job Title")
+        canvas.axes.set_xlabel("Salary")
+
+        self.show_chart(canvas, "Avg Salary by Job", key)
+
+    def plot_gender_distribution(self):
+        query = CHART_QUERIES['gender_distribution']
+        self.plot_chart('gender_distribution', [query], partial(self.run_query, query), self.draw_gender_distribution)
+
+    def draw_gender_distribution(self, data, key):
+        if not data:
+            QMessageBox.warning(self, "No Data", "No data available for Gender Distribution.")
+            return
+        labels, values = zip(*data)
+
+        canvas = MplCanvas(self, width=5, height=4)
+        canvas.axes.pie(values, labels=labels, autopct='%1.1f%%')
+        canvas.axes.set_title("Employees by Gender")
+
+        self.show_chart(canvas, "Employees by Gender", key)
+
+
+    def plot_programs_by_interest(self):
+        query = CHART_QUERIES['programs_by_interest']
+        self.plot_chart('programs_by_interest', [query], partial(self.run_query, query), self.draw_programs_by_interest)
+
+    def draw_programs_by_interest(self, data, key):
+        if not data:
+            QMessageBox.warning(self, "No Data", "No data available for Programs by InterestType.")
+            return
+        interests, counts = zip(*data)
+
+        canvas = MplCanvas(self, width=6, height=4)
+        canvas.axes.bar(interests, counts)
+        canvas.axes.set_title("Programs by InterestType")
+        canvas.axes.set_ylabel("Count")
+        canvas.axes.set_xticks(range(len(interests)))
+        canvas.axes.set_xticklabels(interests, rotation=45, ha='center' , fontsize=8)
+        canvas.fig.tight_layout() 
+        
+        self.show_chart(canvas, "Programs by InterestType", key)
+
+    def plot_avg_experience_by_department(self):
+        query = CHART_QUERIES['avg_experience_by_department']
+        self.plot_chart('avg_experience_by_department', [query], partial(self.run_query, query), self.draw_avg_experience_by_department)
+
+    def draw_avg_experience_by_department(self, rows, key):
+        if not rows:
+            QMessageBox.information(self, "No Data", "No department data found.")
+            return
+
+        depts, avgs = zip(*rows)
+
+        canvas = MplCanvas(self, width=6, height=4)
+        canvas.axes.bar(depts, avgs)
+        canvas.axes.set_title("Avg Experience by Department")
+        canvas.axes.set_ylabel("Years of Experience")
+
+        self.show_chart(canvas, "Avg Experience by Department", key)
+
+    def plot_salary_box_by_department(self):
+        def fetch(conn, progress):
+            arrays = fetch_arrays(conn, CHART_QUERIES['salary_by_department'], cache=self.query_cache, progress=progress,
+                                  profiler=self.profiler)
+            return arrays, [row[0] for row in cached_fetch(conn, self.query_cache, CHART_QUERIES['departments'], self.profiler)]
+
+        self.plot_chart('salary_by_department', [CHART_QUERIES['salary_by_department'], CHART_QUERIES['departments']],
+                        partial(self.run_task, "Running query...", fetch), self.draw_salary_box_by_department)
+
+    def draw_salary_box_by_department(self, data, key):
+        arrays, names = data
+        codes, salaries = arrays.values()
+        if not len(salaries):
+            QMessageBox.warning(self, "No Data", "No data available for Salary by Department.")
+            return
+        # whiskers at the 5th and 95th percentiles
+        groups, stats = group_percentiles(codes, salaries, [5, 25, 50, 75, 95])
+        boxes = [{'label': names[int(group)], 'whislo': p[0], 'q1': p[1], 'med': p[2], 'q3': p[3], 'whishi': p[4], 'fliers': []}
+                 for group, p in zip(groups, stats)]
+
+        canvas = MplCanvas(self, width=7, height=4)
+        canvas.axes.bxp(boxes, showfliers=False)
+        canvas.axes.set_title("Salary by Department (5th-95th percentile whiskers)")
+        canvas.axes.set_ylabel("Salary")
+        canvas.axes.tick_params(axis='x', rotation=45, labelsize=8)
+        canvas.fig.tight_layout()
+
+        self.show_chart(canvas, "Salary by Department", key)
+
+    def plot_salary_percentiles_by_experience(self):
+        query = CHART_QUERIES['salary_by_experience']
+        self.plot_chart('salary_percentiles_by_experience', [query], partial(self.run_arrays, query), self.draw_salary_percentiles_by_experience)
+
+    def draw_salary_percentiles_by_experience(self, arrays, key):
+        years, salaries = arrays.values()
+        if not len(years):
+            QMessageBox.warning(self, "No Data", "No data available for Salary Percentiles by Experience.")
+            return
+        # bands of 5 years of experience
+        edges = np.arange(0, np.nanmax(years) + 6, 5)
+        bands = bin_values(years, edges)
+        in_band = bands >= 0
+        groups, stats = group_percentiles(bands[in_band], salaries[in_band], [10, 25, 50, 75, 90])
+        labels = [f"{int(edges[band])}-{int(edges[band + 1]) - 1}" for band in groups]
+        x = np.arange(len(groups))
+
+        canvas = MplCanvas(self, width=6, height=4)
+        canvas.axes.fill_between(x, stats[:, 0], stats[:, 4], alpha=0.2, label="10th-90th percentile")
+        canvas.axes.fill_between(x, stats[:, 1], stats[:, 3], alpha=0.4, label="25th-75th percentile")
+        canvas.axes.plot(x, stats[:, 2], marker='o', label="Median")
+        canvas.axes.set_xticks(x)
+        canvas.axes.set_xticklabels(labels)
+        canvas.axes.set_title("Salary Percentiles by Years of Experience")
+        canvas.axes.set_xlabel("Years of Experience")
+        canvas.axes.set_ylabel("Salary")
+        canvas.axes.legend()
+        canvas.fig.tight_layout()
+
+        self.show_chart(canvas, "Salary Percentiles by Experience", key)
+
+    def show_employee_dashboard(self):
+        # The snapshot is loaded with the first dashboard and again once Employees or JobTitles changed
+        snapshot = self.employee_snapshot
+        with self.query_cache.lock:
+            current = snapshot is not None and self.query_cache.current(snapshot.key)
+        if current:
+            self.open_employee_dashboard(snapshot)
+            return
+        self.run_task("Loading employees...", lambda conn, progress: EmployeeSnapshot.load(conn, self.query_cache, progress),
+                      self.open_employee_dashboard, "Error loading employees")
+
+    def open_employee_dashboard(self, snapshot):
+        self.employee_snapshot = snapshot
+        if not snapshot.rows:
+            QMessageBox.warning(self, "No Data", "No data available for the Employee Dashboard.")
+            return
+        EmployeeDashboard(snapshot, self).exec()
+
+    def plot_chart(self, chart, queries, fetch, draw):
+        # Shows the stored render of chart while the data of its queries is unchanged;
+        # otherwise fetch(on_done) runs the queries and draw(data, key) draws the chart
+        key = self.chart_cache.key(self.conn, chart, queries)
+        cached = self.chart_cache.get(key)
+        if cached is None:
+            fetch(lambda data: draw(data, key))
+            return
+        title, png = cached
+        self.export_chart(chart, png)
+        self.show_chart_image(title, png)
+
+    def show_chart(self, canvas, title, key):
+        # One render at the screen's pixel density serves the dialog, the cache and the export
+        png = render_png(canvas.fig, canvas.fig.dpi * self.devicePixelRatioF())
+        self.chart_cache.put(key, title, png)
+        self.export_chart(key[0], png)
+        self.show_chart_image(title, png)
+
+    def export_chart(self, chart, png):
+        if self.export_charts.isChecked():
+            self.chart_exporter.export(f"{chart}.png", png)
+
+    def show_chart_image(self, title, png):
+        pixmap = QPixmap()
+        pixmap.loadFromData(png, 'PNG')
+        pixmap.setDevicePixelRatio(self.devicePixelRatioF())
+        label = QLabel()
+        label.setPixmap(pixmap)
+        label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.show_plot_dialog(label, title)
+
+    def show_plot_dialog(self, widget, title, toolbar=False):
+        dialog = QDialog(self)
+        dialog.setWindowTitle(title)
+        layout = QVBoxLayout()
+        if toolbar:
+            from maps import NavigationToolbar
+            layout.addWidget(NavigationToolbar(widget, dialog))
+        scroll_area = QScrollArea()
+        scroll_area.setWidget(widget)
+        scroll_area.setWidgetResizable(True)
+        layout.addWidget(scroll_area)
+        dialog.setLayout(layout)
+        dialog.resize(700, 500)
+        dialog.exec()
+    
+    def plot_facilities_scatter(self):
+        # cartopy and the Qt matplotlib backend load with the first map
+        import maps
+        self.run_task("Loading map...", lambda conn, progress: (map_tiles(conn, self.query_cache), maps.map_features()),
+                      self.draw_facilities_scatter)
+
+    def draw_facilities_scatter(self, data):
+        tiles, features = data
+        if not len(tiles):
+            QMessageBox.warning(self, "No Data", "No valid coordinate data available for Facilities.")
+            return
+
+        import maps
+        canvas = maps.MapCanvas(self.pool, tiles, features)
+        canvas.fig.tight_layout()
+        if self.export_charts.isChecked():
+            self.chart_exporter.export("facilities_scatter.png", render_png(canvas.fig))
+        self.show_plot_dialog(canvas, "Facilities on Map", toolbar=True)
+        canvas.close_connection()
+
+    def coordinate_box(self, low, high, value):
+        box = QDoubleSpinBox()
+        box.setRange(low, high)
+        box.setDecimals(6)
+        box.setValue(value)
+        return box
+
+    def update_spatial_inputs(self):
+        mode = self.spatial_mode.currentData()
+        for widget in (self.spatial_facility, self.spatial_lat, self.spatial_lon):
+            widget.setEnabled(mode != 'box')
+        self.spatial_radius.setEnabled(mode == 'radius')
+        self.spatial_k.setEnabled(mode == 'nearest')
+        for box in self.spatial_box:
+            box.setEnabled(mode == 'box')
+
+    def run_spatial_search(self):
+        mode = self.spatial_mode.currentData()
+        registry_id = self.spatial_facility.text().strip()
+        center = (self.spatial_lat.value(), self.spatial_lon.value())
+        radius, k = self.spatial_radius.value(), self.spatial_k.value()
+        extent = tuple(box.value() for box in self.spatial_box)
+
+        def search(conn, progress):
+            start = time.perf_counter()
+            if mode == 'box':
+                rows = facilities_in_box(conn, extent)
+                described = "in the box"
+            else:
+                location = center
+                if registry_id:
+                    location = facility_location(conn, registry_id)
+                    if location is None:
+                        raise ValueError(f"Facility {registry_id} has no coordinates.")
+                place = registry_id or f"{location[0]:.4f}, {location[1]:.4f}"
+                if mode == 'radius':
+                    rows = facilities_within(conn, *location, radius)
+                    described = f"within {radius:g} km of {place}"
+                else:
+                    rows = nearest_facilities(conn, *location, k)
+                    described = f"nearest to {place}"
+            return rows, described, time.perf_counter() - start
+
+        self.run_task("Searching...", search, self.show_spatial_results, "Error searching facilities")
+
+    def show_spatial_results(self, result):
+        rows, described, seconds = result
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Spatial Search")
+        dialog.resize(900, 500)
+        layout = QVBoxLayout()
+        found = f"{len(rows):,} facilities {described} ({seconds * 1000:.1f} ms)"
+        if len(rows) == SPATIAL_RESULT_LIMIT:
+            found += f", showing the first {SPATIAL_RESULT_LIMIT:,}"
+        layout.addWidget(QLabel(found))
+        table = QTableWidget(len(rows), len(SPATIAL_COLUMNS))
+        table.setHorizontalHeaderLabels(SPATIAL_COLUMNS)
+        for row_number, row in enumerate(rows):
+            for column, value in enumerate(row):
+                table.setItem(row_number, column, QTableWidgetItem("" if value is None else str(value)))
+        table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(table)
+        dialog.setLayout(layout)
+        dialog.exec()
+
+    def run_search(self):
+        # Only the latest search is shown; the one still running for older text is cancelled
+        text = self.search_entry.text()
+        if self.search_task is not None:
+            self.search_task.cancel()
+            self.search_task = None
+        if not text.strip():
+            self.search_results.setRowCount(0)
+            self.search_status.setText("")
+            return
+
+        def search(conn, progress):
+            start = time.perf_counter()
+            rows, ranked = search_facilities(conn, text)
+            return rows, ranked, time.perf_counter() - start
+
+        task = Task(self.pool, search)
+
+        def finish():
+            self.tasks.discard(task)
+            if self.search_task is task:
+                self.search_task = None
+
+        def done(result):
+            if self.search_task is task:
+                self.show_search_results(*result)
+            finish()
+
+        def failed(message):
+            if self.search_task is task:
+                self.search_status.setText(f"Search failed: {message}")
+            finish()
+
+        task.signals.finished.connect(done)
+        task.signals.failed.connect(failed)
+        task.signals.cancelled.connect(finish)
+        self.search_task = task
+        self.tasks.add(task)
+        QThreadPool.globalInstance().start(task)
+
+    def show_search_results(self, rows, ranked, seconds):
+        self.search_results.setRowCount(len(rows))
+        for row_number, row in enumerate(rows):
+            for column, value in enumerate(row):
+                self.search_results.setItem(row_number, column, QTableWidgetItem("" if value is None else str(value)))
+        if not ranked:
+            more = f", more than {SEARCH_RANK_ROWS:,} matches: type more to rank them"
+        elif len(rows) == SEARCH_RESULT_LIMIT:
+            more = f", the best {SEARCH_RESULT_LIMIT} shown"
+        else:
+            more = ""
+        self.search_status.setText(f"Found {len(rows):,}{more} ({seconds * 1000:.1f} ms)")
+
+    def closeEvent(self, event):
+        for task in list(self.tasks):
+            task.cancel()
+        QThreadPool.globalInstance().waitForDone()
+        self.chart_exporter.flush()
+        self.conn.close()
+        self.pool.close()
+        event.accept()
+
+
+def run(db_path='project.db'):
+    app = QApplication(sys.argv)
+    app.setStyle('Fusion')
+    window = DatabaseApp(db_path)
+    window.show()
+    return app.exec()
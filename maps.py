@@ -0,0 +1,107 @@
+# Facilities map drawing. Imported with the first map, so neither the window
+# nor the command line pays for loading cartopy.
+import logging
+import math
+
+import numpy as np
+import cartopy.crs as ccrs
+import cartopy.feature as cfeature
+from PyQt6.QtCore import QTimer
+from matplotlib.figure import Figure
+from matplotlib.colors import LogNorm
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
+
+from app import GRID_CELL_DEGREES, MAP_DENSITY_BINS, MAP_EXTENT, MAP_POINT_LIMIT, MAP_TILE_CELLS
+from arrays import map_points, visible_tiles
+
+
+# Natural Earth layers drawn under the facilities, if they can be loaded
+MAP_FEATURES = [('cultural', 'admin_1_states_provinces_lakes'), ('physical', 'coastline')]
+map_feature_geometries = None
+
+
+def map_features():
+    # Loaded once; Natural Earth data is downloaded on first use, so this may fail offline
+    global map_feature_geometries
+    if map_feature_geometries is None:
+        try:
+            map_feature_geometries = [list(cfeature.NaturalEarthFeature(category, name, '50m').geometries())
+                                      for category, name in MAP_FEATURES]
+        except Exception as e:
+            logging.warning(f"Map features unavailable: {str(e)}")
+            map_feature_geometries = []
+    return map_feature_geometries
+
+
+def draw_map_layer(axes, tiles, extent, fetch_points):
+    # Draws the level of detail that fits extent; returns (artist, description)
+    tiles = visible_tiles(tiles, extent)
+    if tiles[:, 0].sum() <= MAP_POINT_LIMIT:
+        lats, lons = fetch_points(extent)
+        artist = axes.scatter(lons, lats, s=4, color='blue', transform=ccrs.PlateCarree())
+        return artist, f"{len(lats):,} facilities"
+    west, east, south, north = extent
+    tile = GRID_CELL_DEGREES * MAP_TILE_CELLS
+    step = tile * max(1, math.ceil((east - west) / tile / MAP_DENSITY_BINS))
+    lon_edges = np.arange(math.floor((west + 180) / step) * step - 180, east + step, step)
+    lat_edges = np.arange(math.floor((south + 90) / step) * step - 90, north + step, step)
+    counts, _, _ = np.histogram2d(tiles[:, 1], tiles[:, 2], bins=(lat_edges, lon_edges), weights=tiles[:, 0])
+    artist = axes.pcolormesh(lon_edges, lat_edges, np.ma.masked_equal(counts, 0), norm=LogNorm(), cmap='viridis',
+                             transform=ccrs.PlateCarree())
+    return artist, f"{int(tiles[:, 0].sum()):,} facilities (density)"
+
+
+class MapCanvas(FigureCanvas):
+    # Facilities map, redrawn at the level of detail of the visible box after each pan or zoom
+    def __init__(self, pool, tiles, features=(), width=8, height=6, dpi=100):
+        self.fig = Figure(figsize=(width, height), dpi=dpi)
+        self.axes = self.fig.add_subplot(111, projection=ccrs.PlateCarree())
+        super().__init__(self.fig)
+        # a reader from the pool until close_connection()
+        self.pool = pool
+        self.conn = pool.acquire()
+        self.tiles = tiles
+        self.layer = None
+        # (extent, latitudes, longitudes) of the last fetch
+        self.points = None
+        for geometries in features:
+            self.axes.add_geometries(geometries, ccrs.PlateCarree(), facecolor='none', edgecolor='gray', linewidth=0.4)
+        self.axes.set_extent(MAP_EXTENT, crs=ccrs.PlateCarree())
+        self.axes.set_autoscale_on(False)
+        self.axes.gridlines(draw_labels=True, linewidth=0.2)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(150)
+        self.timer.timeout.connect(self.render)
+        self.axes.callbacks.connect('xlim_changed', lambda axes: self.timer.start())
+        self.axes.callbacks.connect('ylim_changed', lambda axes: self.timer.start())
+        self.render()
+
+    def extent(self):
+        west, east = self.axes.get_xlim()
+        south, north = self.axes.get_ylim()
+        return west, east, south, north
+
+    def fetch_points(self, extent):
+        # Zooming into the box fetched last filters the points already loaded
+        west, east, south, north = extent
+        if self.points is not None:
+            (last_west, last_east, last_south, last_north), lats, lons = self.points
+            if last_west <= west and east <= last_east and last_south <= south and north <= last_north:
+                inside = (lats >= south) & (lats <= north) & (lons >= west) & (lons <= east)
+                return lats[inside], lons[inside]
+        lats, lons = map_points(self.conn, extent)
+        self.points = (extent, lats, lons)
+        return lats, lons
+
+    def render(self):
+        if self.layer is not None:
+            self.layer.remove()
+        self.layer, description = draw_map_layer(self.axes, self.tiles, self.extent(), self.fetch_points)
+        self.axes.set_title(f"Facilities on Map: {description}")
+        self.draw_idle()
+
+    def close_connection(self):
+        self.timer.stop()
+        self.pool.release(self.conn)
@@ -0,0 +1,97 @@
+import sqlite3
+
+import pytest
+
+import app
+import benchmark
+
+TABLES = ('Facilities', 'Coordinates', 'Locations', 'Programs', 'ProgramAttributes', 'FacilityPrograms')
+SUMMARY_VIEWS = ('FacilitiesByState', 'View_AvgSalaryByJob', 'CountProgramsByInterestType')
+
+
+def table_rows(conn, tables=TABLES):
+    return {table: sorted(conn.execute(f"SELECT * FROM {table}").fetchall(), key=repr) for table in tables}
+
+
+def assert_summaries_match(conn):
+    for view in SUMMARY_VIEWS:
+        plain = sorted(conn.execute(app.view_query(view)).fetchall(), key=repr)
+        materialized = sorted(conn.execute(app.view_query(view, materialized=True)).fetchall(), key=repr)
+        assert len(materialized) == len(plain), view
+        for row, expected in zip(materialized, plain):
+            # averages are summed in a different order
+            assert row == pytest.approx(expected, rel=1e-9), view
+
+
+@pytest.fixture
+def xml_path(tmp_path):
+    path = tmp_path / 'EPAXML.xml'
+    benchmark.generate_xml(path, 500, seed=1)
+    return path
+
+
+@pytest.fixture
+def json_path(tmp_path):
+    path = tmp_path / 'project.json'
+    benchmark.generate_json(path, 500, seed=1)
+    return path
+
+
+@pytest.mark.parametrize('mode', ['dom', 'parallel', 'incremental', 'partitioned'])
+def test_xml_modes_match_streaming(tmp_path, conn, xml_path, mode):
+    app.stream_xml(conn, xml_path)
+    other = sqlite3.connect(tmp_path / f'{mode}.db')
+    app.create_schema(other)
+    app.import_file(other, app.XML_MODES[mode], xml_path)
+    # the incremental mode upserts, so the last ProgramAttributes of an interest type wins
+    tables = [table for table in TABLES if mode != 'incremental' or table != 'ProgramAttributes']
+    assert table_rows(other, tables) == table_rows(conn, tables)
+    other.close()
+
+
+@pytest.mark.parametrize('bulk', [False, True])
+def test_json_modes_match(tmp_path, conn, json_path, bulk):
+    app.import_file(conn, app.load_json, json_path, bulk)
+    other = sqlite3.connect(tmp_path / 'streaming.db')
+    app.create_schema(other)
+    app.import_file(other, app.stream_json, json_path, bulk)
+    assert table_rows(other, ('JobTitles', 'Employees')) == table_rows(conn, ('JobTitles', 'Employees'))
+    other.close()
+
+
+def test_dom_import_rolls_back_failed_insert(conn, xml_path):
+    conn.execute("CREATE TRIGGER fail_coordinates BEFORE INSERT ON Coordinates BEGIN SELECT RAISE(ABORT, 'fail'); END")
+    conn.commit()
+    with pytest.raises(sqlite3.IntegrityError):
+        app.import_file(conn, app.load_xml_dom, xml_path)
+    assert conn.execute("SELECT COUNT(*) FROM Facilities").fetchone()[0] == 0
+
+
+def test_malformed_json_record_fails_fast(tmp_path):
+    path = tmp_path / 'bad.json'
+    path.write_text('[{"id": 1, "age": bogus}, ' + ', '.join('{"id": %d}' % i for i in range(2, 10000)) + ']')
+    with pytest.raises(ValueError):
+        list(app.iter_json_records(path, read_size=64))
+
+
+def test_incremental_refresh_with_summaries(tmp_path, conn, xml_path, json_path):
+    # The refresh upserts into tables whose summary triggers seed rows of their own
+    app.enable_summaries(conn)
+    conn.commit()
+    app.incremental_xml(conn, xml_path)
+    app.incremental_json(conn, json_path)
+    refreshed_xml = tmp_path / 'refreshed.xml'
+    benchmark.generate_xml(refreshed_xml, 400, seed=2, changed=100)
+    refreshed_json = tmp_path / 'refreshed.json'
+    benchmark.generate_json(refreshed_json, 400, seed=2)
+    counts = app.incremental_xml(conn, refreshed_xml)
+    assert counts['tombstoned'] == 100
+    assert conn.execute("SELECT COUNT(*) FROM ImportHashes WHERE entity = 'facility' AND deleted = 1").fetchone()[0] == 100
+    app.incremental_json(conn, refreshed_json)
+    assert_summaries_match(conn)
+    full = sqlite3.connect(tmp_path / 'full.db')
+    app.create_schema(full)
+    app.stream_xml(full, refreshed_xml)
+    assert table_rows(conn, ('Facilities', 'Coordinates', 'Locations')) == \
+        table_rows(full, ('Facilities', 'Coordinates', 'Locations'))
+    full.close()